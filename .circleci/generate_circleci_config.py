@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
 """This script is used to create the circle config file so that we can stay
 DRY."""
+import argparse
+import json
 import os
 import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from jinja2 import Template
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tests.image_extractor import load_docs  # noqa: E402
+from tests.image_extractor import manifest_images  # noqa: E402
+
 # When adding a new version, look up the most
 # recent patch version on Dockerhub
 # This should match what is in tests/__init__.py
@@ -21,30 +30,97 @@ kube_versions = [
 ci_remote_docker_version = "20.10.18"
 # https://circleci.com/developer/machine/image/ubuntu-2204
 machine_image_version = "ubuntu-2204:2022.10.2"
+# The number of trivy-scan-docker jobs that the images are spread over.
+trivy_scan_shards = 8
+# Compressed image sizes in bytes, used to balance the trivy scan shards.
+# Update them with --update-image-sizes.
+image_sizes_path = Path(__file__).parent / "docker-image-sizes.json"
+
+
+def render_images(path, kube_version):
+    """Return the images in a render of the chart for kube_version."""
+    output = subprocess.check_output(
+        [
+            "helm",
+            "template",
+            ".",
+            "-f",
+            "tests/enable_all_features.yaml",
+            "--kube-version",
+            kube_version,
+        ],
+        cwd=path,
+        stderr=subprocess.DEVNULL,
+    )
+    return manifest_images(load_docs(output))
 
 
 def list_docker_images(path):
-    command = f"cd {path} && helm template . -f tests/enable_all_features.yaml 2>/dev/null | awk '/image: / {{print $2}}' | sed 's/\"//g' | sort -u"
-    docker_images_output = subprocess.check_output(command, shell=True)
-    docker_image_list = docker_images_output.decode("utf-8").strip().split("\n")
+    """Return the images used with any of the kube versions, rendering each
+    version in parallel."""
+    with ThreadPoolExecutor() as executor:
+        renders = executor.map(lambda v: render_images(path, v), kube_versions)
+        return sorted({image for images in renders for image in images})
+
 
-    return sorted(set(docker_image_list))
+def shard_images(docker_images, image_sizes, shards):
+    """Spread the images over shards so that each shard has about the same
+    total size, largest images first. Images of unknown size count as the
+    median size."""
+    known = sorted(
+        image_sizes[image] for image in docker_images if image in image_sizes
+    )
+    default_size = known[len(known) // 2] if known else 1
+    sizes = {image: image_sizes.get(image, default_size) for image in docker_images}
+    plan = [{"size": 0, "images": []} for _ in range(min(shards, len(docker_images)))]
+    for image in sorted(docker_images, key=lambda image: (-sizes[image], image)):
+        shard = min(plan, key=lambda shard: shard["size"])
+        shard["images"].append(image)
+        shard["size"] += sizes[image]
+    return [sorted(shard["images"]) for shard in plan]
+
+
+def update_image_sizes(docker_images):
+    """Look up the size of every image in its registry and save them."""
+    from tests.chart_tests.image_verifier import RegistryClient
+
+    client = RegistryClient()
+    with ThreadPoolExecutor(16) as executor:
+        sizes = dict(zip(docker_images, executor.map(client.image_size, docker_images)))
+    image_sizes_path.write_text(json.dumps(sizes, indent=2, sort_keys=True) + "\n")
+    return sizes
 
 
 def main():
     """Render the Jinja2 template file."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--update-image-sizes",
+        action="store_true",
+        help=f"look up image sizes in their registries and save them to {image_sizes_path.name}",
+    )
+    # pre-commit passes the changed files, which are not used.
+    parser.add_argument("filenames", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
     project_directory = Path(__file__).parent.parent
     circle_directory = os.path.dirname(os.path.realpath(__file__))
     config_template_path = os.path.join(circle_directory, "config.yml.j2")
     config_path = os.path.join(circle_directory, "config.yml")
 
     docker_images = list_docker_images(str(project_directory))
+    if args.update_image_sizes:
+        image_sizes = update_image_sizes(docker_images)
+    elif image_sizes_path.exists():
+        image_sizes = json.loads(image_sizes_path.read_text())
+    else:
+        image_sizes = {}
 
     templated_file_content = Path(config_template_path).read_text()
     template = Template(templated_file_content)
     config = template.render(
         kube_versions=kube_versions,
-        docker_images=docker_images,
+        docker_image_shards=shard_images(docker_images, image_sizes, trivy_scan_shards),
         machine_image_version=machine_image_version,
         remote_docker_version=ci_remote_docker_version,
     )
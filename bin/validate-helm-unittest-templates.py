@@ -1,53 +1,71 @@
 #!/usr/bin/env python3
-"""Validate that all referenced templates in helm unittest files exist."""
-
-from pathlib import Path, PosixPath
-import yaml
-import sys
+"""Validate that all referenced templates in helm unittest files exist, and
+that they render.
 
+Checks the given helm-unittest files, or every charts/*/tests/*_test.yaml.
+The exit code is 1 if a file could not be parsed or a template is missing
+or fails to render. See tests/chart_tests/helm_unittest_validator.py.
+"""
 
-this_script = Path(__file__)
-git_root = this_script.resolve().parent.parent
+import argparse
+import sys
+from pathlib import Path
 
+git_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(git_root))
 
-def validate_test_file(file: PosixPath) -> None:
-    """Validate that each template file referenced in the given helm unittest
-    file exists on disk."""
-    with open(file) as f:
-        try:
-            for test_suite in yaml.safe_load_all(f):
-                validate_test_suite(test_suite, file)
-        except yaml.scanner.ScannerError as err:
-            sys.stderr.write(f"ERROR: {file} could not be parsed\n{err}\n")
-        except KeyboardInterrupt:
-            sys.exit(1)
+from tests.chart_tests.helm_unittest_validator import json_report  # noqa: E402
+from tests.chart_tests.helm_unittest_validator import junit_report  # noqa: E402
+from tests.chart_tests.helm_unittest_validator import unittest_files  # noqa: E402
+from tests.chart_tests.helm_unittest_validator import validate  # noqa: E402
 
 
-def validate_test_suite(test_suite: dict, file: PosixPath) -> None:
-    """Validate all templates within a given test suite."""
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "files",
+        nargs="*",
+        type=Path,
+        help="helm-unittest files to check. Default: charts/*/tests/*_test.yaml",
+    )
+    parser.add_argument(
+        "--no-render", action="store_true", help="only check that templates exist"
+    )
+    parser.add_argument(
+        "--kube-version", default="1.21.0", help="kube version to render with"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="concurrent renders. Default: number of CPUs"
+    )
+    parser.add_argument("--json", type=Path, help="write a JSON report to this file")
+    parser.add_argument("--junit", type=Path, help="write a JUnit report to this file")
+    args = parser.parse_args()
 
-    for template_file in test_suite["templates"]:
-        validate_template_file(Path(file.parent.parent) / "templates" / template_file)
+    files = [
+        f.resolve() for f in args.files if f.name.endswith("_test.yaml")
+    ] or unittest_files()
+    checks = validate(
+        files,
+        render=not args.no_render,
+        kube_version=args.kube_version,
+        max_workers=args.workers,
+    )
+    for path, report in ((args.json, json_report), (args.junit, junit_report)):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(report(checks) + "\n")
 
-    for test in test_suite["tests"]:
-        if "template" in test:
-            validate_template_file(
-                Path(file.parent.parent) / "templates" / test["template"]
+    failures = [check for check in checks if check.failed]
+    for check in checks:
+        if check.status != "ok":
+            print(
+                f"{check.status.upper()}: {check.file} {check.template}: {check.message}"
             )
-
-
-def validate_template_file(file: PosixPath) -> None:
-    """Validate that the template file exists."""
-    if not file.exists():
-        print(f"Missing: {file}")
-
-
-def validate_all_unittest_files() -> None:
-    """Find all helm unittest files in the repo and validate all template files
-    found within them."""
-    for test_file in git_root.glob("charts/*/tests/*_test.yaml"):
-        validate_test_file(test_file)
+    print(
+        f"Checked {len(checks)} templates in {len(files)} files, {len(failures)} failed"
+    )
+    return 1 if failures else 0
 
 
 if __name__ == "__main__":
-    validate_all_unittest_files()
+    sys.exit(main())
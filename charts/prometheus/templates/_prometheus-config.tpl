@@ -0,0 +1,864 @@
+{{/*
+The Prometheus config. With sharding enabled, each shard gets a copy of it
+from "prometheus.shardConfig", and the federating Prometheus gets one from
+"prometheus.federationConfig".
+*/}}
+{{- define "prometheus.config" -}}
+# https://prometheus.io/docs/prometheus/latest/configuration/configuration/
+global:
+  scrape_interval: 30s
+  evaluation_interval: 30s
+  {{ if .Values.external_labels }}external_labels: {{ .Values.external_labels | toYaml | nindent 4 }}{{ end }}
+
+{{- with .Values.tsdb.outOfOrderTimeWindow }}
+storage:
+  tsdb:
+    out_of_order_time_window: {{ . }}
+{{- end }}
+
+# https://prometheus.io/docs/prometheus/latest/configuration/configuration/#remote_write
+{{ with include "prometheus.remoteWrite" . }}remote_write: {{ . | nindent 2 }}{{ end }}
+
+# Configure Alertmanager
+alerting:
+  alertmanagers:
+    - kubernetes_sd_configs:
+        - role: pod
+          namespaces:
+            names:
+              - {{ .Release.Namespace }}
+      tls_config:
+        ca_file: /var/run/secrets/kubernetes.io/serviceaccount/ca.crt
+      bearer_token_file: /var/run/secrets/kubernetes.io/serviceaccount/token
+      relabel_configs:
+      - source_labels: [__meta_kubernetes_pod_label_component]
+        regex: alertmanager
+        action: keep
+      - source_labels: [__meta_kubernetes_namespace]
+        regex: {{ .Release.Namespace }}
+        action: keep
+      - source_labels: [__meta_kubernetes_pod_container_port_name]
+        regex: alertmanager
+        action: keep
+
+# Configure built in alerting rules
+rule_files:
+  - "/etc/prometheus/alerts.d/*.yaml"
+
+# Configure targets to scrape
+scrape_configs:
+  - job_name: prometheus
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "prometheus") }}{{ . | nindent 4 }}{{ end }}
+    static_configs:
+      - targets: ["localhost:9090"]
+
+  - job_name: 'kubernetes-apiservers'
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "kubernetes-apiservers") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: endpoints
+    scheme: https
+    tls_config:
+      ca_file: /var/run/secrets/kubernetes.io/serviceaccount/ca.crt
+    bearer_token_file: /var/run/secrets/kubernetes.io/serviceaccount/token
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_namespace, __meta_kubernetes_service_name, __meta_kubernetes_endpoint_port_name]
+        action: keep
+        regex: default;kubernetes;https
+
+  - job_name: core-dns
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "core-dns") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: pod
+        namespaces:
+          names:
+            - kube-system
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_pod_container_name]
+        action: keep
+        regex: "^coredns"
+      - source_labels: [__meta_kubernetes_pod_container_port_number]
+        action: keep
+        regex: "^9153"
+
+  - job_name: kube-dns
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "kube-dns") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: pod
+        namespaces:
+          names:
+            - kube-system
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_pod_container_name]
+        action: keep
+        regex: "^sidecar|^kubedns"
+      - source_labels: [__meta_kubernetes_pod_container_port_number]
+        action: keep
+        regex: "^1005[45]"
+
+  - job_name: nginx
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "nginx") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: endpoints
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-nginx"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+
+  - job_name: elasticsearch
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "elasticsearch") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: service
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-elasticsearch-exporter"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+
+  # - job_name: registry
+  #   kubernetes_sd_configs:
+  #     - role: service
+  #       namespaces:
+  #         names:
+  #           - {{ .Release.Namespace }}
+  #   relabel_configs:
+  #     - source_labels: [__meta_kubernetes_service_name]
+  #       action: keep
+  #       regex: "^{{ .Release.Name }}-registry"
+  #     - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+  #       action: keep
+  #       regex: true
+  #     - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+  #       action: replace
+  #       regex: ([^:]+)(?::\d+)?;(\d+)
+  #       replacement: $1:$2
+  #       target_label: __address__
+
+  {{- if .Values.global.veleroEnabled }}
+  - job_name: velero
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "velero") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 30s
+    kubernetes_sd_configs:
+      - role: service
+        namespaces:
+          names:
+            - velero
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "velero"
+      - source_labels: [__address__]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+  {{- end }}
+
+  {{- if .Values.global.prometheusPostgresExporterEnabled }}
+  - job_name: postgresql-exporter
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "postgresql-exporter") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 60s
+    scrape_timeout: 30s
+    kubernetes_sd_configs:
+      - role: service
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-postgresql-exporter"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+  {{- end }}
+
+
+  - job_name: kube-state
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "kube-state") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 10s # Faster scrape to power dashboards
+    kubernetes_sd_configs:
+      - role: service
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-kube-state"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+
+      {{- if not .Values.global.singleNamespace }}
+        # This allows us to collect all the metrics we want in the cloud environment
+        # does not limit to just the astronomer release namespace
+      - source_labels: [__meta_kubernetes_endpoint_address_target_kind, __meta_kubernetes_endpoint_address_target_name]
+        separator: ;
+        regex: Node;(.*)
+        target_label: node
+        replacement: ${1}
+        action: replace
+      - source_labels: [__meta_kubernetes_endpoint_address_target_kind, __meta_kubernetes_endpoint_address_target_name]
+        separator: ;
+        regex: Pod;(.*)
+        target_label: pod
+        replacement: ${1}
+        action: replace
+      - source_labels: [__meta_kubernetes_namespace]
+        separator: ;
+        regex: (.*)
+        target_label: namespace
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_service_name]
+        separator: ;
+        regex: (.*)
+        target_label: service
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_pod_name]
+        separator: ;
+        regex: (.*)
+        target_label: pod
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_service_name]
+        separator: ;
+        regex: (.*)
+        target_label: job
+        replacement: ${1}
+        action: replace
+      - separator: ;
+        regex: (.*)
+        target_label: endpoint
+        replacement: http-metrics
+        action: replace
+      - separator: ;
+        regex: (pod|service|endpoint|namespace)
+        replacement: $1
+        action: labeldrop
+    metric_relabel_configs:
+      # Pods have this label twice
+      - regex: 'label_kubernetes_executor'
+        action: labeldrop
+      - regex: 'label_kubernetes_pod_operator'
+        action: labeldrop
+      # Required for multi-namespace mode
+      - source_labels: [namespace]
+        {{- if .Values.global.namespaceFreeFormEntry }}
+        # use default regex pattern (.*) when namespaceFreeFormEntry is enabled
+        {{- else}}
+        regex: "^{{ .Release.Namespace }}-(.*$)"
+        replacement: "$1"
+        {{- end}}
+        target_label: release
+    {{- else}}
+    # this drops node metrics that we want in the cloud, but maybe shouldn't be scraping
+    # if we are in a shared cluster in enterprise
+    metric_relabel_configs:
+      # Only keep metrics that start with platforms namespace (includes airflow children)
+      - action: keep
+        source_labels: [namespace]
+        regex: "^{{ .Release.Namespace }}.*"
+      - source_labels: [deployment]
+        regex: "([-a-z0-9]*[a-z0-9])-.*?"
+        replacement: "$1"
+        target_label: release
+      # Required for single-namespace mode
+      - source_labels: [pod]
+        regex: "([-a-z0-9]*[a-z0-9])-.*?"
+        replacement: "$1"
+        target_label: release
+      {{- end}}
+
+  - job_name: fluentd
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "fluentd") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 30s
+    kubernetes_sd_configs:
+      - role: pod
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_pod_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-fluentd-.*"
+      - source_labels: [__meta_kubernetes_pod_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_pod_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+    metric_relabel_configs:
+      - source_labels: [__name__]
+        regex: 'fluentd_tail_file_.*'
+        action: drop
+
+  {{- if .Values.global.nodeExporterEnabled }}
+  - job_name: node-exporter
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "node-exporter") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 30s
+    kubernetes_sd_configs:
+      - role: pod
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_pod_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-prometheus-node-exporter-.*"
+      - source_labels: [__meta_kubernetes_namespace]
+        separator: ;
+        regex: (.*)
+        target_label: namespace
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_pod_name]
+        separator: ;
+        regex: (.*)
+        target_label: pod
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_pod_node_name]
+        separator: ;
+        regex: (.*)
+        target_label: instance
+        replacement: $1
+        action: replace
+  {{- end }}
+
+  - job_name: airflow
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "airflow") }}{{ . | nindent 4 }}{{ end }}
+    scrape_interval: 10s # Faster scrape to power dashboards
+    kubernetes_sd_configs:
+      - role: service
+      {{- if .Values.global.singleNamespace }}
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+      {{- end }}
+    relabel_configs:
+      - action: labelmap
+        regex: __meta_kubernetes_service_label_(.+)
+      - source_labels: [__meta_kubernetes_service_annotation_astronomer_io_platform_release]
+        action: keep
+        regex: ^{{ .Release.Name }}$
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+    metric_relabel_configs:
+      - source_labels: [instance]
+        regex: "([-a-z0-9]*[a-z0-9])-.*?"
+        replacement: "$1"
+        target_label: deployment
+      {{- if .Values.airflowMetrics.allowList }}
+        # Only keep the allowed metrics
+      - source_labels: [__name__]
+        regex: {{ join "|" .Values.airflowMetrics.allowList | quote }}
+        action: keep
+      {{- else }}
+        # Drop metrics that are task or dag specific
+      - source_labels: [__name__]
+        regex: 'airflow_task_instance_created_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_task_removed_from_dag_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_task_restored_to_dag_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_duration_success_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_duration_failed_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_dependency_check_.*_count'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_dependency_check_.*_sum'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_schedule_delay_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_duration_success_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dagrun_duration_failed_.*'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dag_processing_last_duration_.*_count'
+        action: drop
+      - source_labels: [__name__]
+        regex: 'airflow_dag_processing_last_duration_.*_sum'
+        action: drop
+      {{- end }}
+
+  {{- if not .Values.global.singleNamespace }}
+  - job_name: kubernetes-nodes
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "kubernetes-nodes") }}{{ . | nindent 4 }}{{ end }}
+    scheme: https
+    tls_config:
+      ca_file: /var/run/secrets/kubernetes.io/serviceaccount/ca.crt
+    bearer_token_file: /var/run/secrets/kubernetes.io/serviceaccount/token
+    kubernetes_sd_configs:
+      - role: node
+    relabel_configs:
+      - action: labelmap
+        regex: __meta_kubernetes_node_label_(.+)
+      - target_label: __address__
+        replacement: kubernetes.default.svc:443
+      - source_labels: [__meta_kubernetes_node_name]
+        regex: (.+)
+        target_label: __metrics_path__
+        replacement: /api/v1/nodes/${1}/proxy/metrics
+
+  - job_name: kubernetes-nodes-cadvisor
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "kubernetes-nodes-cadvisor") }}{{ . | nindent 4 }}{{ end }}
+    scheme: https
+    tls_config:
+      ca_file: /var/run/secrets/kubernetes.io/serviceaccount/ca.crt
+    bearer_token_file: /var/run/secrets/kubernetes.io/serviceaccount/token
+    kubernetes_sd_configs:
+      - role: node
+    relabel_configs:
+      - action: labelmap
+        regex: __meta_kubernetes_node_label_(.+)
+      - target_label: __address__
+        replacement: kubernetes.default.svc:443
+      - source_labels: [__meta_kubernetes_node_name]
+        regex: (.+)
+        target_label: __metrics_path__
+        replacement: /api/v1/nodes/${1}/proxy/metrics/cadvisor
+      - source_labels: [__metrics_path__]
+        separator: ;
+        regex: (.*)
+        target_label: metrics_path
+        replacement: $1
+        action: replace
+
+      - source_labels: [__meta_kubernetes_endpoint_address_target_kind, __meta_kubernetes_endpoint_address_target_name]
+        separator: ;
+        regex: Pod;(.*)
+        target_label: pod
+        replacement: ${1}
+        action: replace
+      - source_labels: [__meta_kubernetes_namespace]
+        separator: ;
+        regex: (.*)
+        target_label: namespace
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_service_name]
+        separator: ;
+        regex: (.*)
+        target_label: service
+        replacement: $1
+        action: replace
+      - source_labels: [__meta_kubernetes_pod_name]
+        separator: ;
+        regex: (.*)
+        target_label: pod
+        replacement: $1
+        action: replace
+      - source_labels: [__metrics_path__]
+        separator: ;
+        regex: (.*)
+        target_label: metrics_path
+        replacement: $1
+        action: replace
+    metric_relabel_configs:
+      - source_labels: [__name__]
+        separator: ;
+        regex: container_(network_tcp_usage_total|network_udp_usage_total|tasks_state|cpu_load_average_10s)
+        replacement: $1
+        action: drop
+
+        # For versions of cAdvisor that no longer include label pod_name
+      - source_labels: [pod]
+        regex: (.*)
+        target_label: pod_name
+        replacement: $1
+        action: replace
+
+        # For versions of cAdvisor that no longer include label container_name
+      - source_labels: [container]
+        regex: "^(.*)$"
+        replacement: "$1"
+        target_label: container_name
+        action: replace
+
+      - action: replace
+        source_labels: [id]
+        regex: '^/system\.slice/(.+)\.service$'
+        target_label: systemd_service_name
+        replacement: '${1}'
+
+        # Drop some unnecessary labels.
+      - regex: "^name"
+        action: labeldrop
+
+        # Add deployment name via container_name
+      - source_labels: [pod_name]
+        regex: "(^[-a-z0-9-]*)-[^-]*-[^-]*-[^-]*?"
+        replacement: "$1"
+        target_label: deployment
+
+        # This will patch up most metrics
+      - source_labels: [container_name]
+        regex: "^(.*)$"
+        replacement: "$1"
+        target_label: component_name
+
+      - source_labels: [pod_name]
+        regex: "^.*-.*-(.*)$"
+        replacement: "$1"
+        target_label: component_instance
+
+        # Network level metrics are exposed at the POD level
+        # Deployment (others) format
+      - source_labels: [__name__, container_name, pod_name]
+        regex: "container_network_.*;(.*)-(.*)-([0-9a-z]{5,10}-[0-9a-z]{5})$"
+        replacement: "$1"
+        target_label: deployment
+      - source_labels: [__name__, container_name, pod_name]
+        regex: "container_network_.*;(.*)-(.*)-([0-9a-z]{5,10}-[0-9a-z]{5})$"
+        replacement: "$2"
+        target_label: component_name
+      - source_labels: [__name__, container_name, pod_name]
+        regex: "container_network_.*;(.*)-(.*)-([0-9a-z]{5,10}-[0-9a-z]{5})$"
+        replacement: "$3"
+        target_label: component_instance
+        # StatefulSet (workers) format
+      - source_labels: [__name__, pod_name]
+        regex: "^container_network_.*;(.*)-(.*)-([0-9]+)$"
+        replacement: "$2"
+        target_label: component_name
+      - source_labels: [__name__, pod_name]
+        regex: "^container_network_.*;(.*)-(.*)-([0-9]+)$"
+        replacement: "$3"
+        target_label: component_instance
+
+  {{- end }}
+
+
+  {{- if .Values.global.blackboxExporterEnabled }}
+  # Will probe the endpoints listed under targets looking for a 2XX HTTP response
+  - job_name: 'blackbox HTTP'
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "blackbox HTTP") }}{{ . | nindent 4 }}{{ end }}
+    metrics_path: /probe
+    params:
+      module: [http_2xx]  # Look for a HTTP 200 response.
+    # TODO: change this static config to be driving by service annotations. This works for now
+    static_configs:
+      - targets:
+      {{- if .Values.astroHTTPTargets.commander}}
+        - http://{{.Release.Name}}-commander.{{.Release.Namespace}}:8880/healthz
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.houston}}
+        - http://{{.Release.Name}}-houston.{{.Release.Namespace}}:8871/v1/healthz
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.registry}}
+        - http://{{.Release.Name}}-registry.{{.Release.Namespace}}:5000
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.cliInstall}}
+        - http://{{.Release.Name}}-cli-install.{{.Release.Namespace}}
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.grafana}}
+        - http://{{.Release.Name}}-grafana.{{.Release.Namespace}}:3000/api/health
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.kibana}}
+        - http://{{.Release.Name}}-kibana.{{.Release.Namespace}}:5601
+      {{- end }}
+      {{- if .Values.astroHTTPTargets.elasticsearch}}
+        - http://{{.Release.Name}}-elasticsearch.{{.Release.Namespace}}:9200/_cluster/health?local=true
+      {{- end }}
+
+
+        {{- if .Values.global.baseDomain }}
+        - https://app.{{ .Values.global.baseDomain }}
+        - https://houston.{{ .Values.global.baseDomain }}/v1/healthz
+        - https://registry.{{ .Values.global.baseDomain }}
+        - https://install.{{ .Values.global.baseDomain }}
+        {{- end}}
+      {{- range .Values.httpTargets }}
+        - {{ . }}
+      {{- end }}
+    relabel_configs:
+      - source_labels: [__address__]
+        target_label: __param_target
+      - source_labels: [__param_target]
+        target_label: instance
+      - target_label: __address__
+        replacement: {{.Release.Name}}-prometheus-blackbox-exporter.{{.Release.Namespace}}:9115  # The blackbox exporter's real hostname:port.
+
+
+  {{- if .Values.tcpProbe.enabled}}
+  # Only testing for ability to open a TCP connection.
+  - job_name: 'blackbox TCP'
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "blackbox TCP") }}{{ . | nindent 4 }}{{ end }}
+    metrics_path: /probe
+    params:
+      module: [tcp_connect]  # Try tcp handshake on a port
+    static_configs:
+      - targets:
+        {{- if .Values.tcpProbe.probePGProxy}}
+        - pg-sqlproxy-gcloud-sqlproxy.{{.Release.Namespace}}:5432
+        {{- end }}
+        {{- if .Values.tcpProbe.probeTiller}}
+        - tiller-deploy.kube-system:44134 # TCP Probe
+        {{- end }}
+    relabel_configs:
+      - source_labels: [__address__]
+        target_label: __param_target
+      - source_labels: [__param_target]
+        target_label: instance
+      - target_label: __address__
+        replacement: {{.Release.Name}}-prometheus-blackbox-exporter.{{.Release.Namespace}}:9115  # The blackbox exporter's real hostname:port.
+    {{- end }}
+
+  # Tests that DNS in cluster is working.
+  # target should be your cluster DNS service IP
+  - job_name: 'blackbox DNS'
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "blackbox DNS") }}{{ . | nindent 4 }}{{ end }}
+    metrics_path: /probe
+    params:
+      module: [dns_int]
+    static_configs:
+      - targets:
+        {{- range .Values.dnsTargets }}
+        - {{ . }}
+        {{- end }}
+    relabel_configs:
+      - source_labels: [__address__]
+        target_label: __param_target
+      - source_labels: [__param_target]
+        target_label: instance
+      - target_label: __address__
+        replacement: {{.Release.Name}}-prometheus-blackbox-exporter.{{.Release.Namespace}}:9115
+    {{- end }}
+
+  - job_name: houston-api
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "houston-api") }}{{ . | nindent 4 }}{{ end }}
+    metrics_path: /v1/metrics
+    kubernetes_sd_configs:
+      - role: endpoints
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    # Prefix all houston metrics with 'houston_'
+    metric_relabel_configs:
+      - source_labels: [__name__]
+        target_label: __name__
+        replacement: "houston_${1}"
+    # Select only ready endpoints for collecting houston metrics
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-houston"
+      - source_labels: [__meta_kubernetes_endpoint_ready]
+        action: keep
+        regex: "^true"
+
+  - job_name: nats_server
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "nats_server") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: endpoints
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-nats"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+
+  - job_name: stan_server
+    {{- with include "prometheus.scrapeLimits" (dict "Values" .Values "job" "stan_server") }}{{ . | nindent 4 }}{{ end }}
+    kubernetes_sd_configs:
+      - role: endpoints
+        namespaces:
+          names:
+            - {{ .Release.Namespace }}
+    relabel_configs:
+      - source_labels: [__meta_kubernetes_service_name]
+        action: keep
+        regex: "^{{ .Release.Name }}-stan"
+      - source_labels: [__meta_kubernetes_service_annotation_prometheus_io_scrape]
+        action: keep
+        regex: true
+      - source_labels: [__address__, __meta_kubernetes_service_annotation_prometheus_io_port]
+        action: replace
+        regex: ([^:]+)(?::\d+)?;(\d+)
+        replacement: $1:$2
+        target_label: __address__
+{{- end }}
+
+{{/*
+The remote_write endpoints: remote_write as given, then every endpoint in
+remoteWrite.endpoints, then the long-term store. Endpoints get the default
+queue_config from remoteWrite.queueConfig, and with recordedSeriesOnly only
+send the series of recording rules, whose names have a colon.
+*/}}
+{{- define "prometheus.remoteWrite" -}}
+{{- $endpoints := list }}
+{{- range .Values.remote_write }}
+{{- $endpoints = append $endpoints . }}
+{{- end }}
+{{- $configured := .Values.remoteWrite.endpoints | default list }}
+{{- if .Values.remoteWrite.longTermStore.enabled }}
+{{- $configured = append $configured (merge (dict "name" "long-term-store" "url" (include "prometheus.longTermStore.url" .)) .Values.remoteWrite.longTermStore.remoteWrite) }}
+{{- end }}
+{{- range $configured }}
+{{- $relabel := list }}
+{{- if .recordedSeriesOnly }}
+{{- $relabel = append $relabel (dict "source_labels" (list "__name__") "regex" ".+:.+" "action" "keep") }}
+{{- end }}
+{{- $relabel = concat $relabel (.writeRelabelConfigs | default list) }}
+{{- $endpoint := dict "url" .url "queue_config" (merge (dict) (.queueConfig | default dict) $.Values.remoteWrite.queueConfig) }}
+{{- with .name }}
+{{- $_ := set $endpoint "name" . }}
+{{- end }}
+{{- with $relabel }}
+{{- $_ := set $endpoint "write_relabel_configs" . }}
+{{- end }}
+{{- $endpoints = append $endpoints (merge $endpoint (.extra | default dict)) }}
+{{- end }}
+{{- with $endpoints }}
+{{- toYaml . }}
+{{- end }}
+{{- end }}
+
+{{/*
+The scrape limits of a job, from scrapeLimits.jobs and scrapeLimits.default.
+Takes a dict with the Values and the job name.
+*/}}
+{{- define "prometheus.scrapeLimits" -}}
+{{- $job := get .Values.scrapeLimits.jobs .job | default dict }}
+{{- $default := .Values.scrapeLimits.default | default dict }}
+{{- $lines := list }}
+{{- range $key := list "sample_limit" "label_limit" "label_name_length_limit" "label_value_length_limit" "target_limit" }}
+{{- /* merge would replace a job's 0 with the default */}}
+{{- if hasKey $job $key }}
+{{- $lines = append $lines (printf "%s: %d" $key (int (index $job $key))) }}
+{{- else if hasKey $default $key }}
+{{- $lines = append $lines (printf "%s: %d" $key (int (index $default $key))) }}
+{{- end }}
+{{- end }}
+{{- join "\n" $lines }}
+{{- end }}
+
+{{/*
+The config of one shard: the jobs in sharding.jobs with their targets split
+between shards by a hash of __address__, and on shard 0 every other job.
+Shards evaluate the per-deployment rules and send alerts and remote_write
+themselves, since only they have the raw series. Their series get a shard
+external label so that series from different shards do not collide.
+Takes a dict with the parsed config, the shard ordinal and the Values.
+*/}}
+{{- define "prometheus.shardConfig" -}}
+{{- $shards := int .Values.sharding.shards }}
+{{- $jobs := list }}
+{{- range .config.scrape_configs }}
+{{- if has .job_name $.Values.sharding.jobs }}
+{{- $hashmod := list
+  (dict "source_labels" (list "__address__") "modulus" $shards "target_label" "__tmp_hashmod" "action" "hashmod")
+  (dict "source_labels" (list "__tmp_hashmod") "regex" (printf "^%d$" $.shard) "action" "keep") }}
+{{- $jobs = append $jobs (merge (dict "relabel_configs" (concat (.relabel_configs | default list) $hashmod)) .) }}
+{{- else if eq $.shard 0 }}
+{{- $jobs = append $jobs . }}
+{{- end }}
+{{- end }}
+{{- $global := deepCopy .config.global }}
+{{- $labels := deepCopy ($global.external_labels | default dict) }}
+{{- $_ := set $labels "shard" (toString .shard) }}
+{{- $_ := set $global "external_labels" $labels }}
+{{- $shardConfig := dict "global" $global "scrape_configs" $jobs }}
+{{- range $key := list "storage" "remote_write" "alerting" "rule_files" }}
+{{- with index $.config $key }}
+{{- $_ := set $shardConfig $key . }}
+{{- end }}
+{{- end }}
+{{- toYaml $shardConfig }}
+{{- end }}
+
+{{/*
+The config of the federating Prometheus: the global settings, alerting and
+rule files from "prometheus.config", and a job that federates the series
+matching sharding.federation.match from every shard through its Service.
+The platform rules run here. remote_write only sends the series without a
+shard label, since the shards send their own.
+*/}}
+{{- define "prometheus.federationConfig" -}}
+{{- $parsed := include "prometheus.config" . | fromYaml }}
+{{- $config := pick $parsed "global" "alerting" "rule_files" }}
+{{- with $parsed.remote_write }}
+{{- $drop := dict "source_labels" (list "shard") "regex" ".+" "action" "drop" }}
+{{- $endpoints := list }}
+{{- range . }}
+{{- $endpoints = append $endpoints (merge (dict "write_relabel_configs" (prepend (.write_relabel_configs | default list) $drop)) .) }}
+{{- end }}
+{{- $_ := set $config "remote_write" $endpoints }}
+{{- end }}
+{{- $targets := list }}
+{{- range $shard := until (int .Values.sharding.shards) }}
+{{- $targets = append $targets (printf "%s-%d.%s:%d" (include "prometheus.fullname" $) $shard $.Release.Namespace (int $.Values.ports.http)) }}
+{{- end }}
+{{- $self := dict "job_name" "prometheus-federation" "static_configs" (list (dict "targets" (list (printf "localhost:%d" (int .Values.ports.http))))) }}
+{{- $federate := dict
+  "job_name" "federate"
+  "scrape_interval" .Values.sharding.federation.scrapeInterval
+  "honor_labels" true
+  "metrics_path" "/federate"
+  "params" (dict "match[]" .Values.sharding.federation.match)
+  "static_configs" (list (dict "targets" $targets)) }}
+{{- $_ := set $config "scrape_configs" (list $self $federate) }}
+{{- toYaml $config }}
+{{- end }}
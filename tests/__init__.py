@@ -14,19 +14,25 @@ supported_k8s_versions = ["1.21.0", "1.22.0", "1.23.0", "1.24.0"]
 def get_containers_by_name(doc, include_init_containers=False):
     """Given a single doc, return all the containers by name.
 
-    doc must be a valid spec for a pod manager. (EG: ds, sts)
+    doc must be a valid spec for a pod manager. (EG: ds, sts, cronjob)
     """
 
-    c_by_name = {c["name"]: c for c in doc["spec"]["template"]["spec"]["containers"]}
+    pod_spec = get_pod_spec(doc)
+    c_by_name = {c["name"]: c for c in pod_spec["containers"]}
 
-    if include_init_containers and doc["spec"]["template"]["spec"].get(
-        "initContainers"
-    ):
-        c_by_name.update(
-            {
-                c["name"]: c
-                for c in doc["spec"]["template"]["spec"].get("initContainers")
-            }
-        )
+    if include_init_containers and pod_spec.get("initContainers"):
+        c_by_name.update({c["name"]: c for c in pod_spec.get("initContainers")})
 
     return c_by_name
+
+
+def get_pod_spec(doc):
+    """Given a single doc, return its pod spec, or None if it does not have
+    one."""
+    kind = doc.get("kind")
+    spec = doc.get("spec") or {}
+    if kind == "Pod":
+        return spec
+    if kind == "CronJob":
+        spec = (spec.get("jobTemplate") or {}).get("spec") or {}
+    return (spec.get("template") or {}).get("spec")
@@ -1,38 +1,46 @@
+from copy import deepcopy
+from functools import cache
 from pathlib import Path
 
-import jmespath
 import yaml
 
-from tests.chart_tests.helm_template_generator import render_chart
+from tests.chart_tests.helm_template_generator import render_manifest
 
 
-def get_all_features():
+@cache
+def load_all_features():
     return yaml.safe_load(
         (Path(__file__).parent.parent / "enable_all_features.yaml").read_text()
     )
 
 
+def get_all_features():
+    """Return the values in tests/enable_all_features.yaml.
+
+    The file is only parsed once, and each caller gets its own copy to
+    modify.
+    """
+    return deepcopy(load_all_features())
+
+
 def get_chart_containers(k8s_version, chart_values, ignore_kind_list=[]):
-    docs = render_chart(
+    manifest = render_manifest(
         kube_version=k8s_version,
         values=chart_values,
     )
 
-    specs = jmespath.search(
-        "[?spec.template.spec.containers].{name: metadata.name, kind: kind, containers: spec.template.spec.containers[*]}",
-        docs,
-    )
-
     container_configs = {}
     ignore_kind_list = [ignore_kind.lower() for ignore_kind in ignore_kind_list]
-    for spec in specs:
-        kind = spec["kind"]
+    for doc, container in manifest.containers():
+        kind = doc["kind"]
+        # Only pod templates at spec.template.spec, so not CronJobs or Pods.
+        if "template" not in (doc.get("spec") or {}):
+            continue
         if kind.lower() not in ignore_kind_list:
-            name = spec["name"]
-            for container in spec["containers"]:
-                key = k8s_version + "_" + name + "_" + container["name"]
-                container["key"] = key
-                container["kind"] = kind
-                container_configs[key] = container
+            name = doc["metadata"]["name"]
+            key = k8s_version + "_" + name + "_" + container["name"]
+            container["key"] = key
+            container["kind"] = kind
+            container_configs[key] = container
 
     return container_configs
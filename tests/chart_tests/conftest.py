@@ -19,40 +19,69 @@ import subprocess
 
 import docker
 import pytest
-from filelock import FileLock
 
 from tests import git_root_dir
+from tests.chart_tests import get_all_features
+from tests.chart_tests.helm_dependency_cache import ensure_dependencies
+from tests.chart_tests.helm_template_generator import render_manifest
+from tests.chart_tests.lazy_render import RenderedByKubeVersion
+from tests.chart_tests.validation_cache import validation_cache
+
+private_registry_values = {
+    "global": {
+        "privateRegistry": {
+            "enabled": True,
+            "repository": "bob-the-registry",
+            "secretName": "bob-the-registry-secret",
+        }
+    }
+}
+
+
+@pytest.fixture(autouse=True, scope="session")
+def helm_dependencies():
+    """Put the remote dependencies of every chart in its charts/ directory
+    from the helm dependency cache, which only runs helm when a chart's
+    dependency declarations changed. xdist workers share the cache through
+    a file lock per chart."""
+    try:
+        return ensure_dependencies(git_root_dir)
+    except subprocess.CalledProcessError as e:
+        print(e.output.decode())
+        raise
 
 
 @pytest.fixture(autouse=True, scope="session")
-def upgrade_helm(tmp_path_factory, worker_id):
-    """Add stable helm repo, upgrade helm repos, and do helm dep upgrade."""
-
-    def _upgrade_helm():
-        try:
-            subprocess.check_output(
-                "helm repo add stable --force-update https://charts.helm.sh/stable/".split()
-            )
-            # The following command may modify any requirements.yaml with updated metadata
-            subprocess.check_output(
-                f"find {git_root_dir} -type f -name requirements.yaml -print -execdir helm dep update ;".split()
-            )
-            subprocess.check_output("helm repo update".split())
-        except subprocess.CalledProcessError as e:
-            print(e.output)
-
-    if worker_id == "master":
-        _upgrade_helm()
-        return
-
-    root_tmp_dir = tmp_path_factory.getbasetemp().parent
-    lock_fn = root_tmp_dir / "upgrade_helm.lock"
-    flag_fn = root_tmp_dir / "upgrade_helm.done"
-
-    with FileLock(str(lock_fn)):
-        if not flag_fn.is_file():
-            _upgrade_helm()
-            flag_fn.touch()
+def validation_cache_eviction():
+    """Keep the validation cache bounded by evicting its least recently
+    used markers at the end of the session."""
+    yield
+    validation_cache.evict()
+
+
+@pytest.fixture(scope="session")
+def all_features_docs():
+    """The chart rendered with tests/enable_all_features.yaml, as a
+    RenderedManifest per kube version, eg: all_features_docs["1.24.0"].
+
+    Renders go through the render cache, which locks each render so that
+    pytest-xdist workers share a single helm run and reuse its output.
+    """
+    return RenderedByKubeVersion(values=get_all_features())
+
+
+@pytest.fixture(scope="session")
+def default_docs():
+    """The chart rendered with default values, as a RenderedManifest per kube
+    version, eg: default_docs["1.24.0"]."""
+    return RenderedByKubeVersion()
+
+
+@pytest.fixture(scope="session")
+def private_registry_docs():
+    """The chart rendered with the bob-the-registry private registry
+    enabled, as a RenderedManifest."""
+    return render_manifest(values=private_registry_values)
 
 
 def docker_daemon_present():
@@ -0,0 +1,340 @@
+"""Select the chart tests that a change can affect.
+
+The graph has three kinds of edges:
+
+- test file -> templates: the show_only paths in the test file. A test file
+  that renders the whole chart depends on every template.
+- template -> helpers: the files that define the templates it includes,
+  followed transitively.
+- values key -> templates: the `.Values` references in a template and in the
+  helpers it includes.
+
+A git diff is mapped to the changed templates, including templates whose
+values keys changed in a values.yaml, and from there to the test files that
+depend on them. Changes to the test helpers, Chart.yaml files or anything
+else the graph does not understand select every test. See
+bin/select-chart-tests.
+"""
+
+import ast
+import re
+import subprocess
+from collections import defaultdict
+from dataclasses import dataclass
+from dataclasses import field
+from fnmatch import fnmatch
+from functools import cached_property
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from tests import git_root_dir
+
+define_re = re.compile(r'{{-?\s*define\s+"([^"]+)"')
+include_re = re.compile(r'\b(?:include|template)\s+"([^"]+)"')
+values_re = re.compile(r"\.Values((?:\.[A-Za-z0-9_]+)*)")
+files_re = re.compile(r'\.Files\.[A-Za-z]+\s+"([^"]+)"')
+base_path_re = re.compile(r'print\s+\$\.Template\.BasePath\s+"([^"]+)"')
+include_call_re = re.compile(r'\b(?:include|template)\s+["(]')
+tpl_re = re.compile(r"\btpl\s")
+
+# Calls that render the chart. Without a show_only argument they render all
+# of it.
+render_functions = {
+    "render_chart",
+    "render_chart_output",
+    "render_manifest",
+    "render_chart_batch",
+    "LazyRenderedDocs",
+    "RenderedByKubeVersion",
+    "get_chart_containers",
+}
+full_render_fixtures = {"all_features_docs", "default_docs", "private_registry_docs"}
+
+ValuesPath = tuple[str, ...]
+
+
+def chart_of(path: str) -> str:
+    """Return the chart a chart file belongs to: '' for the top level chart,
+    or the subchart directory name."""
+    parts = path.split("/")
+    return parts[1] if parts[0] == "charts" and len(parts) > 2 else ""
+
+
+def is_template(path: str) -> bool:
+    parts = path.split("/")
+    return (parts[0] == "templates" and len(parts) > 1) or (
+        parts[0] == "charts" and len(parts) > 3 and parts[2] == "templates"
+    )
+
+
+def values_diff(old: dict, new: dict, prefix: ValuesPath = ()) -> set[ValuesPath]:
+    """Return the paths of the values that differ between old and new."""
+    changed = set()
+    for key in set(old) | set(new):
+        old_value, new_value = old.get(key), new.get(key)
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changed |= values_diff(old_value, new_value, prefix + (key,))
+        elif old_value != new_value:
+            changed.add(prefix + (key,))
+    return changed
+
+
+def overlaps(a: ValuesPath, b: ValuesPath) -> bool:
+    """Return whether one path is a prefix of the other."""
+    return a[: len(b)] == b[: len(a)]
+
+
+@dataclass
+class Template:
+    path: str
+    defines: set[str] = field(default_factory=set)
+    includes: set[str] = field(default_factory=set)
+    values: set[ValuesPath] = field(default_factory=set)
+    files: set[str] = field(default_factory=set)
+    # Templates included by path, eg: for checksum annotations.
+    path_includes: set[str] = field(default_factory=set)
+    include_calls: int = 0
+    tpl_calls: int = 0
+
+
+@dataclass
+class TestFile:
+    path: str
+    templates: set[str] = field(default_factory=set)
+    full_render: bool = False
+
+    def depends_on(self, template: str) -> bool:
+        return self.full_render or any(fnmatch(template, p) for p in self.templates)
+
+
+def template_patterns(node: ast.AST) -> Optional[str]:
+    """Return the template path or glob of a string or f-string node that
+    looks like a template path."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        pattern = node.value
+    elif isinstance(node, ast.JoinedStr):
+        pattern = "".join(
+            v.value if isinstance(v, ast.Constant) else "*" for v in node.values
+        )
+    else:
+        return None
+    if is_template(pattern) and pattern.endswith((".yaml", ".tpl", ".txt")):
+        return pattern
+    return None
+
+
+def parse_test_file(path: Path, root: Path) -> TestFile:
+    """Find the templates a test file renders."""
+    test_file = TestFile(str(path.relative_to(root)))
+    renders = False
+    for node in ast.walk(ast.parse(path.read_text())):
+        if pattern := template_patterns(node):
+            test_file.templates.add(pattern)
+        elif isinstance(node, ast.arg) and node.arg in full_render_fixtures:
+            test_file.full_render = True
+        elif isinstance(node, ast.Call):
+            name = getattr(node.func, "id", None) or getattr(node.func, "attr", None)
+            if name in render_functions:
+                renders = True
+                keywords = {k.arg for k in node.keywords}
+                # show_only can also be hidden in **kwargs or in a batch of
+                # render requests.
+                if not keywords & {"show_only", None} and name != "render_chart_batch":
+                    test_file.full_render = True
+    # A test that renders but names no templates must be building their
+    # paths some other way, so it could render any of them.
+    if renders and not test_file.templates:
+        test_file.full_render = True
+    return test_file
+
+
+class DependencyGraph:
+    """The dependencies between the chart tests, templates and values."""
+
+    def __init__(self, root: Path = git_root_dir):
+        self.root = Path(root)
+
+    @cached_property
+    def templates(self) -> dict[str, Template]:
+        templates = {}
+        for chart_dir in [self.root, *sorted((self.root / "charts").glob("*/"))]:
+            for path in sorted((chart_dir / "templates").rglob("*")):
+                if not path.is_file():
+                    continue
+                text = path.read_text()
+                template = Template(str(path.relative_to(self.root)))
+                template.defines = set(define_re.findall(text))
+                template.includes = set(include_re.findall(text))
+                template.include_calls = len(include_call_re.findall(text))
+                template.tpl_calls = len(tpl_re.findall(text))
+                templates_dir = (chart_dir / "templates").relative_to(self.root)
+                template.path_includes = {
+                    f"{templates_dir}{included}"
+                    for included in base_path_re.findall(text)
+                }
+                template.values = {
+                    tuple(filter(None, refs.split(".")))
+                    for refs in values_re.findall(text)
+                }
+                # fnmatch has no {a,b} alternatives, so match them as *.
+                template.files = {
+                    re.sub(r"{[^}]*}", "*", pattern)
+                    for pattern in files_re.findall(text)
+                }
+                templates[template.path] = template
+        return templates
+
+    @cached_property
+    def included_by(self) -> dict[str, set[str]]:
+        """Return the templates that include each template file."""
+        defined_in = defaultdict(set)
+        for template in self.templates.values():
+            for name in template.defines:
+                defined_in[name].add(template.path)
+        included_by = defaultdict(set)
+        for template in self.templates.values():
+            for name in template.includes:
+                for helper in defined_in[name]:
+                    if helper != template.path:
+                        included_by[helper].add(template.path)
+            for included in template.path_includes:
+                included_by[included].add(template.path)
+        return included_by
+
+    def dependents(self, paths: set[str]) -> set[str]:
+        """Return paths and every template that includes them, transitively."""
+        seen, pending = set(), list(paths)
+        while pending:
+            path = pending.pop()
+            if path not in seen:
+                seen.add(path)
+                pending.extend(self.included_by.get(path, ()))
+        return seen
+
+    def path_includes(self, path: str) -> set[str]:
+        """Return the templates that path includes by path, transitively."""
+        seen, pending = set(), list(self.templates[path].path_includes)
+        while pending:
+            included = pending.pop()
+            if included not in seen and included in self.templates:
+                seen.add(included)
+                pending.extend(self.templates[included].path_includes)
+        return seen
+
+    @cached_property
+    def values_refs(self) -> dict[str, set[ValuesPath]]:
+        """Return the values each template uses, including through the
+        helpers it includes."""
+        refs = defaultdict(set)
+        for template in self.templates.values():
+            for dependent in self.dependents({template.path}):
+                refs[dependent] |= template.values
+        return refs
+
+    def templates_using_values(self, chart: str, paths: set[ValuesPath]) -> set[str]:
+        """Return the templates of chart, and of its subcharts for globals,
+        that use any of the values paths."""
+        affected = set()
+        for template, refs in self.values_refs.items():
+            template_chart = chart_of(template)
+            for path in paths:
+                if template_chart == chart or (chart == "" and path[:1] == ("global",)):
+                    if any(overlaps(path, ref) for ref in refs):
+                        affected.add(template)
+                        break
+        return affected
+
+    @cached_property
+    def test_files(self) -> dict[str, TestFile]:
+        test_dir = self.root / "tests" / "chart_tests"
+        return {
+            test_file.path: test_file
+            for test_file in map(
+                lambda p: parse_test_file(p, self.root),
+                sorted(test_dir.glob("test_*.py")),
+            )
+        }
+
+    def read_at(self, path: str, ref: str) -> str:
+        """Return the contents of path at git ref, or '' if it did not
+        exist."""
+        result = subprocess.run(
+            ["git", "show", f"{ref}:{path}"],
+            cwd=self.root,
+            capture_output=True,
+            text=True,
+        )
+        return result.stdout if result.returncode == 0 else ""
+
+    def changed_values(self, path: str, base: str) -> set[ValuesPath]:
+        old = yaml.safe_load(self.read_at(path, base)) or {}
+        new_file = self.root / path
+        new = yaml.safe_load(new_file.read_text()) if new_file.exists() else {}
+        return values_diff(old, new or {})
+
+    def affected_templates(self, changed: list[str], base: str) -> Optional[set[str]]:
+        """Return the templates affected by the changed files, or None if
+        every test can be affected."""
+        affected = set()
+        for path in changed:
+            chart = chart_of(path)
+            chart_prefix = f"charts/{chart}/" if chart else ""
+            relative = path.removeprefix(chart_prefix)
+            if path.startswith("tests/chart_tests/test_"):
+                continue
+            if is_template(path):
+                affected |= self.dependents({path})
+            elif relative == "values.yaml":
+                values_paths = self.changed_values(path, base)
+                if chart == "":
+                    subcharts = defaultdict(set)
+                    for values_path in values_paths:
+                        if (self.root / "charts" / values_path[0]).is_dir():
+                            subcharts[values_path[0]].add(values_path[1:])
+                        else:
+                            subcharts[""].add(values_path)
+                    for subchart, subchart_paths in subcharts.items():
+                        affected |= self.templates_using_values(
+                            subchart, subchart_paths
+                        )
+                else:
+                    affected |= self.templates_using_values(chart, values_paths)
+            elif relative.startswith("files/"):
+                affected |= {
+                    template.path
+                    for template in self.templates.values()
+                    if chart_of(template.path) == chart
+                    and any(fnmatch(relative, pattern) for pattern in template.files)
+                }
+            elif path.startswith(("tests/", "charts/", "templates/")) or path in (
+                "Chart.yaml",
+                "values.schema.json",
+                ".helmignore",
+            ):
+                return None
+        return affected
+
+    def select(self, changed: list[str], base: str = "HEAD") -> list[str]:
+        """Return the test files that a change to the changed files can
+        affect."""
+        affected = self.affected_templates(changed, base)
+        if affected is None:
+            return sorted(self.test_files)
+        selected = {path for path in changed if path in self.test_files}
+        for test_file in self.test_files.values():
+            if any(test_file.depends_on(template) for template in affected):
+                selected.add(test_file.path)
+        return sorted(selected)
+
+
+def changed_files(base: str = "HEAD", root: Path = git_root_dir) -> list[str]:
+    """Return the files that differ from base, including untracked files."""
+    diff = subprocess.check_output(
+        ["git", "diff", "--name-only", base], cwd=root, text=True
+    ).split()
+    untracked = subprocess.check_output(
+        ["git", "ls-files", "--others", "--exclude-standard"], cwd=root, text=True
+    ).split()
+    return sorted(set(diff + untracked))
@@ -0,0 +1,238 @@
+"""Content-addressed cache of the chart archives that helm downloads for
+remote chart dependencies.
+
+A chart's remote dependencies are the dependencies of its Chart.yaml or
+requirements.yaml that have a repository, pinned by its Chart.lock or
+requirements.lock. The archives that `helm dependency build` puts in the
+chart's charts/ directory are stored under cache_dir()/helm-dependencies,
+keyed by a hash of those declarations, so they are only downloaded when the
+declarations change. With CHART_TESTS_OFFLINE set, missing entries are read
+from a vendored tarball of the cache (tests/helm-dependencies.tar.gz, or
+CHART_TESTS_HELM_DEPENDENCIES) instead. Charts whose dependencies are all
+local subcharts need nothing.
+
+The resolved state, from dependency_state(), is part of every render cache
+key, because .helmignore keeps the archives out of chart_tree_hash().
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tarfile
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+import yaml
+from filelock import FileLock
+
+from tests import git_root_dir
+from tests.chart_tests.k8s_schema_store import offline
+from tests.chart_tests.render_cache import cache_dir
+
+DEFAULT_VENDORED_ARCHIVE = git_root_dir / "tests" / "helm-dependencies.tar.gz"
+# Files that declare or pin a chart's dependencies, besides Chart.yaml.
+DEPENDENCY_FILES = ("requirements.yaml", "requirements.lock", "Chart.lock")
+
+
+class DependencyError(RuntimeError):
+    """Raised when a chart's dependencies are not cached and cannot be
+    fetched."""
+
+
+def vendored_archive() -> Path:
+    return Path(os.getenv("CHART_TESTS_HELM_DEPENDENCIES", DEFAULT_VENDORED_ARCHIVE))
+
+
+def chart_dirs(chart_dir: Path) -> list[Path]:
+    """Return chart_dir and the unpacked subcharts in its charts/ directory,
+    recursively."""
+    charts = [chart_dir]
+    for subchart in sorted((chart_dir / "charts").glob("*/Chart.yaml")):
+        charts += chart_dirs(subchart.parent)
+    return charts
+
+
+def remote_dependencies(chart_dir: Path) -> list[dict]:
+    """Return the dependencies of chart_dir that helm has to download."""
+    dependencies = []
+    for name in ("Chart.yaml", "requirements.yaml"):
+        path = chart_dir / name
+        if path.is_file():
+            dependencies += (yaml.safe_load(path.read_text()) or {}).get(
+                "dependencies"
+            ) or []
+    return [
+        dependency
+        for dependency in dependencies
+        if dependency.get("repository")
+        and not dependency["repository"].startswith("file://")
+    ]
+
+
+def dependency_key(chart_dir: Path) -> Optional[str]:
+    """Return the cache key of the remote dependencies of chart_dir, or None
+    if it has none."""
+    dependencies = remote_dependencies(chart_dir)
+    if not dependencies:
+        return None
+    digest = hashlib.sha256()
+    digest.update(json.dumps(dependencies, sort_keys=True, default=str).encode())
+    for name in DEPENDENCY_FILES:
+        path = chart_dir / name
+        if path.is_file():
+            digest.update(b"\0" + name.encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()
+
+
+def dependency_keys(chart_dir: Path) -> dict[str, str]:
+    """Return the key of every chart under chart_dir with remote
+    dependencies, by path relative to chart_dir."""
+    return {
+        str(chart.relative_to(chart_dir)): key
+        for chart in chart_dirs(chart_dir)
+        if (key := dependency_key(chart))
+    }
+
+
+@cache
+def dependency_state(chart_dir: str) -> str:
+    """Return a hash of the resolved dependencies of chart_dir: the key and
+    the archives in charts/ of every chart with remote dependencies.
+
+    Like chart_tree_hash(), this is computed once per process.
+    """
+    root = Path(chart_dir)
+    digest = hashlib.sha256()
+    for rel_path, key in sorted(dependency_keys(root).items()):
+        digest.update(f"{rel_path}\0{key}\0".encode())
+        for archive in sorted((root / rel_path / "charts").glob("*.tgz")):
+            digest.update(archive.name.encode() + b"\0" + archive.read_bytes())
+    return digest.hexdigest()
+
+
+class DependencyCache:
+    """A store of dependency archives, one directory per dependency key."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or cache_dir() / "helm-dependencies")
+
+    def entry(self, key: str) -> Path:
+        return self.path / key
+
+    def restore(self, key: str, chart_dir: Path) -> bool:
+        """Copy the cached archives for key into chart_dir/charts, skipping
+        archives that are already there. Return False on a cache miss."""
+        entry = self.entry(key)
+        if not (entry / "complete").is_file():
+            return False
+        charts = chart_dir / "charts"
+        charts.mkdir(exist_ok=True)
+        for archive in entry.glob("*.tgz"):
+            target = charts / archive.name
+            if not (target.is_file() and filecmp.cmp(archive, target, shallow=False)):
+                shutil.copyfile(archive, target)
+        return True
+
+    def store(self, key: str, archives: list[Path]) -> None:
+        """Atomically store archives under key."""
+        entry = self.entry(key)
+        tmp_entry = entry.with_name(f"{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        tmp_entry.mkdir(parents=True)
+        for archive in archives:
+            shutil.copyfile(archive, tmp_entry / archive.name)
+        (tmp_entry / "complete").touch()
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+
+    def extract_vendored(self, key: str, archive: Path) -> bool:
+        """Extract the entry for key from a vendored tarball of the cache.
+        Return False if the tarball does not have it."""
+        if not archive.is_file():
+            return False
+        with tarfile.open(archive) as tar:
+            members = [
+                member
+                for member in tar.getmembers()
+                if member.isfile() and Path(member.name).parent == Path(key)
+            ]
+            if not members:
+                return False
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_dir = self.path / f"{key}.{os.getpid()}.vendored"
+            tar.extractall(tmp_dir, members=members)
+        self.store(key, sorted((tmp_dir / key).glob("*.tgz")))
+        shutil.rmtree(tmp_dir)
+        return True
+
+    def vendor(self, keys: list[str], archive: Path) -> None:
+        """Write the entries for keys to a tarball for offline use."""
+        with tarfile.open(archive, "w:gz") as tar:
+            for key in sorted(keys):
+                for path in sorted(self.entry(key).iterdir()):
+                    tar.add(path, arcname=f"{key}/{path.name}")
+
+
+def fetch_dependencies(chart_dir: Path) -> list[Path]:
+    """Download the remote dependencies of chart_dir into its charts/
+    directory with helm, and return the archives."""
+    repositories = {d["repository"] for d in remote_dependencies(chart_dir)}
+    for repository in sorted(repositories):
+        if repository.startswith("oci://"):
+            continue
+        # helm finds repositories by URL, so the name only has to be unique.
+        name = f"dependency-{hashlib.sha256(repository.encode()).hexdigest()[:12]}"
+        subprocess.check_output(
+            ["helm", "repo", "add", "--force-update", name, repository],
+            stderr=subprocess.STDOUT,
+        )
+    locked = any((chart_dir / n).is_file() for n in ("Chart.lock", "requirements.lock"))
+    subprocess.check_output(
+        ["helm", "dependency", "build" if locked else "update", str(chart_dir)],
+        stderr=subprocess.STDOUT,
+    )
+    return sorted((chart_dir / "charts").glob("*.tgz"))
+
+
+def ensure_dependencies(
+    chart_dir: Path = git_root_dir,
+    dependency_cache: Optional[DependencyCache] = None,
+    allow_fetch: Optional[bool] = None,
+) -> dict[str, str]:
+    """Make sure every chart under chart_dir has its remote dependencies in
+    its charts/ directory, from the cache, the vendored tarball, or helm,
+    in that order. Return the dependency key of each chart that has remote
+    dependencies, by relative path.
+
+    Fetching is allowed unless CHART_TESTS_OFFLINE is set.
+    """
+    dependency_cache = dependency_cache or DependencyCache()
+    allow_fetch = not offline() if allow_fetch is None else allow_fetch
+    keys = dependency_keys(chart_dir)
+    if not keys:
+        return keys
+    dependency_cache.path.mkdir(parents=True, exist_ok=True)
+    for rel_path, key in keys.items():
+        chart = chart_dir / rel_path
+        with FileLock(str(dependency_cache.path / f"{key}.lock")):
+            if dependency_cache.restore(key, chart):
+                continue
+            if dependency_cache.extract_vendored(key, vendored_archive()):
+                dependency_cache.restore(key, chart)
+                continue
+            if not allow_fetch:
+                raise DependencyError(
+                    f"The dependencies of {chart} are not cached or vendored in "
+                    f"{vendored_archive()}, and fetching is disabled."
+                )
+            archives = fetch_dependencies(chart)
+            dependency_cache.store(key, archives)
+            # `helm dependency update` writes a lock file, which changes the key.
+            if (locked_key := dependency_key(chart)) != key:
+                dependency_cache.store(locked_key, archives)
+                keys[rel_path] = locked_key
+    return keys
@@ -15,55 +15,91 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import os
+import re
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
 from tempfile import NamedTemporaryFile
 from typing import Any
+from typing import Iterator
 from typing import Optional
 
 import jsonschema
-import requests
 import yaml
 from kubernetes.client.api_client import ApiClient
 
+from tests.chart_tests.k8s_schema_store import schema_store
+from tests.chart_tests.render_cache import render_cache
+from tests.chart_tests.render_cache import render_cache_enabled
+from tests.chart_tests.render_cache import render_key
+from tests.chart_tests.rendered_manifest import RenderedManifest
+from tests.chart_tests.validation_cache import digest
+from tests.chart_tests.validation_cache import validation_cache
+from tests.chart_tests.validation_cache import validation_cache_enabled
+
 api_client = ApiClient()
 
-BASE_URL_SPEC = "https://raw.githubusercontent.com/yannh/kubernetes-json-schema/master"
+# libyaml is an order of magnitude faster than the pure python loader.
+yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+document_separator_re = re.compile(rb"^---[ \t]*$", re.MULTILINE)
+source_re = re.compile(rb"^# Source: (.+?)[ \t]*$", re.MULTILINE)
 
 
-# TODO: make this cache the schema so we can test offline, or better, save these to the tests dir
 @cache
 def get_schema_k8s(api_version, kind, kube_version="1.21.0"):
-    """Return a k8s schema for use in validation."""
-    api_version = api_version.lower()
-    kind = kind.lower()
+    """Return a k8s schema for use in validation.
+
+    Schemas are read from the local schema store, see
+    tests/chart_tests/k8s_schema_store.py.
+    """
+    return schema_store.get_or_fetch(api_version, kind, kube_version)
 
-    if "/" in api_version:
-        ext, _, api_version = api_version.partition("/")
-        ext = ext.split(".")[0]
-        url = f"{BASE_URL_SPEC}/v{kube_version}-standalone-strict/{kind}-{ext}-{api_version}.json"
-    else:
-        url = f"{BASE_URL_SPEC}/v{kube_version}-standalone-strict/{kind}-{api_version}.json"
-    request = requests.get(url)
-    request.raise_for_status()
-    return request.json()
+
+@cache
+def get_schema_digest(api_version, kind, kube_version="1.21.0"):
+    """Return a hash of the k8s schema for the given inputs."""
+    return digest(get_schema_k8s(api_version, kind, kube_version=kube_version))
 
 
 @cache
 def create_validator(api_version, kind, kube_version="1.21.0"):
-    """Create a k8s validator for the given inputs."""
+    """Create a k8s validator for the given inputs.
+
+    The meta-schema check is skipped for schemas that passed it in an
+    earlier run, see tests/chart_tests/validation_cache.py.
+    """
     schema = get_schema_k8s(api_version, kind, kube_version=kube_version)
-    jsonschema.Draft7Validator.check_schema(schema)
+    schema_digest = get_schema_digest(api_version, kind, kube_version=kube_version)
+    if not (
+        validation_cache_enabled() and validation_cache.is_schema_checked(schema_digest)
+    ):
+        jsonschema.Draft7Validator.check_schema(schema)
+        if validation_cache_enabled():
+            validation_cache.mark_schema_checked(schema_digest)
     return jsonschema.Draft7Validator(schema)
 
 
 def validate_k8s_object(instance, kube_version="1.21.0"):
-    """Validate the k8s object."""
-    validate = create_validator(
-        instance.get("apiVersion"), instance.get("kind"), kube_version=kube_version
-    )
+    """Validate the k8s object.
+
+    Objects that already validated against the same schema, in this or an
+    earlier run, are not validated again.
+    """
+    api_version = instance.get("apiVersion")
+    kind = instance.get("kind")
+    validate = create_validator(api_version, kind, kube_version=kube_version)
+    if not validation_cache_enabled():
+        validate.validate(instance)
+        return
+
+    schema_digest = get_schema_digest(api_version, kind, kube_version=kube_version)
+    object_digest = digest(instance)
+    if validation_cache.is_valid(schema_digest, object_digest):
+        return
     validate.validate(instance)
+    validation_cache.mark_valid(schema_digest, object_digest)
 
 
 def render_chart(
@@ -74,60 +110,240 @@ def render_chart(
     kube_version: str = "1.21.0",
     baseDomain: str = "example.com",
     namespace: Optional[str] = None,
+    validate: bool = True,
 ):
     """Render a helm chart into dictionaries.
 
-    For helm chart testing only.
+    For helm chart testing only. Renders are cached on disk, see
+    tests/chart_tests/render_cache.py. Set validate=False to skip k8s
+    schema validation of the rendered objects.
     """
-    values = values or {}
-    chart_dir = chart_dir or sys.path[0]
-    with NamedTemporaryFile(delete=False) as tmp_file:
-        content = yaml.dump(values)
-        tmp_file.write(content.encode())
-        tmp_file.flush()
-        command = [
-            "helm",
-            "template",
-            "--kube-version",
-            kube_version,
-            name,
-            chart_dir,
-            "--set",
-            f"global.baseDomain={baseDomain}",
-            "--values",
-            tmp_file.name,
-        ]
-        if namespace:
-            command.extend(["--namespace", namespace])
-        if show_only:
-            if isinstance(show_only, str):
-                show_only = [show_only]
-            for i in show_only:
-                command.extend(["--show-only", i])
-        try:
-            templates = subprocess.check_output(command, stderr=subprocess.PIPE)
-            if not templates:
-                return None
-        except subprocess.CalledProcessError as error:
-            print("ERROR: subprocess.CalledProcessError:")
-            print(f"helm command: {' '.join(command)}")
-            print(f"Values file contents:\n{'-' * 21}\n{yaml.dump(values)}{'-' * 21}")
-            print(f"{error.output=}\n{error.stderr=}")
-
-            if "could not find template" in error.stderr.decode("utf-8"):
-                print(
-                    "ERROR: command is probably using templates with null output, which "
-                    + "usually means there is a helm value that needs to be set to render "
-                    + "the content of the chart.\n"
-                    + "command: "
-                    + " ".join(command)
-                )
-            raise
-        k8s_objects = yaml.full_load_all(templates)
-        k8s_objects = [k8s_object for k8s_object in k8s_objects if k8s_object]  # type: ignore
-        for k8s_object in k8s_objects:
+    templates = render_chart_output(
+        name=name,
+        values=values,
+        show_only=show_only,
+        chart_dir=chart_dir,
+        kube_version=kube_version,
+        baseDomain=baseDomain,
+        namespace=namespace,
+    )
+    return load_k8s_objects(templates, kube_version=kube_version, validate=validate)
+
+
+def render_manifest(**kwargs) -> RenderedManifest:
+    """Render a helm chart into a RenderedManifest.
+
+    Takes the same keyword arguments as render_chart.
+    """
+    validate = kwargs.pop("validate", True)
+    return load_k8s_manifest(
+        render_chart_output(**kwargs),
+        kube_version=kwargs.get("kube_version", "1.21.0"),
+        validate=validate,
+    )
+
+
+def render_chart_batch(render_requests: list[dict], max_workers: Optional[int] = None):
+    """Render a helm chart once for each item in render_requests, which are
+    dicts of render_chart keyword arguments.
+
+    Helm runs concurrently in up to max_workers subprocesses (default:
+    CHART_TESTS_RENDER_WORKERS or the number of CPUs), and the results are
+    returned in the same order as render_requests.
+    """
+    max_workers = max_workers or int(
+        os.getenv("CHART_TESTS_RENDER_WORKERS", os.cpu_count() or 1)
+    )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        outputs = list(
+            executor.map(
+                lambda render_request: render_chart_output(
+                    **{k: v for k, v in render_request.items() if k != "validate"}
+                ),
+                render_requests,
+            )
+        )
+    # Parsing and validation hold the GIL, so there is nothing to gain from doing them in the pool.
+    return [
+        load_k8s_objects(
+            templates,
+            kube_version=render_request.get("kube_version", "1.21.0"),
+            validate=render_request.get("validate", True),
+        )
+        for templates, render_request in zip(outputs, render_requests)
+    ]
+
+
+def render_args(
+    name: str = "release-name",
+    values: Optional[dict] = None,
+    show_only: Optional[list] = (),
+    chart_dir: Optional[str] = None,
+    kube_version: str = "1.21.0",
+    baseDomain: str = "example.com",
+    namespace: Optional[str] = None,
+) -> dict:
+    """Return render_chart keyword arguments with defaults filled in, as
+    used by run_helm_template and render_key."""
+    if isinstance(show_only, str):
+        show_only = [show_only]
+    return {
+        "name": name,
+        "values": values or {},
+        "show_only": list(show_only or []),
+        "chart_dir": chart_dir or sys.path[0],
+        "kube_version": kube_version,
+        "baseDomain": baseDomain,
+        "namespace": namespace,
+    }
+
+
+def render_chart_output(report_errors: bool = True, **kwargs) -> bytes:
+    """Render a helm chart and return the raw output, using the render
+    cache if it is enabled.
+
+    Takes the same keyword arguments as render_chart, except validate.
+    Set report_errors=False to not print the details of helm failures.
+    """
+    args = render_args(**kwargs)
+    if not render_cache_enabled():
+        return run_helm_template(**args, report_errors=report_errors)
+    return render_cache.get_or_render(
+        render_key(**args),
+        lambda: run_helm_template(**args, report_errors=report_errors),
+    )
+
+
+def iter_k8s_objects(templates: bytes) -> Iterator[tuple[Optional[str], dict]]:
+    """Yield (source template, object) for every object in the output of
+    helm template, one document at a time.
+
+    The output is split on helm's `---` separators so that each object can be
+    matched to the `# Source:` comment that precedes it.
+    """
+    for document in document_separator_re.split(templates or b""):
+        source = source_re.search(document)
+        for k8s_object in yaml.load_all(document, Loader=yaml_loader):
+            if k8s_object:
+                yield (source and source.group(1).decode()), k8s_object
+
+
+def load_k8s_manifest(
+    templates: bytes, kube_version: str = "1.21.0", validate: bool = True
+) -> RenderedManifest:
+    """Parse and validate the output of helm template into a
+    RenderedManifest that knows the source template of every object."""
+    sources, k8s_objects = [], []
+    for source, k8s_object in iter_k8s_objects(templates):
+        if validate:
             validate_k8s_object(k8s_object, kube_version=kube_version)
-        return k8s_objects
+        sources.append(source)
+        k8s_objects.append(k8s_object)
+    return RenderedManifest(k8s_objects, sources)
+
+
+def load_k8s_objects(
+    templates: bytes, kube_version: str = "1.21.0", validate: bool = True
+):
+    """Parse and validate the output of helm template."""
+    if not templates:
+        return None
+    return load_k8s_manifest(
+        templates, kube_version=kube_version, validate=validate
+    ).docs
+
+
+def helm_values_stdin(command: list[str], values: dict) -> bytes:
+    """Run a `helm template` command with the values on stdin."""
+    return subprocess.run(
+        [*command, "--values", "-"],
+        input=yaml.dump(values).encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stdout
+
+
+def helm_values_file(command: list[str], values: dict) -> bytes:
+    """Run a `helm template` command with the values in a temporary file,
+    which is removed afterwards."""
+    with NamedTemporaryFile(suffix=".yaml") as values_file:
+        values_file.write(yaml.dump(values).encode())
+        values_file.flush()
+        return subprocess.run(
+            [*command, "--values", values_file.name],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        ).stdout
+
+
+# Ways to run helm, selected with CHART_TESTS_RENDER_BACKEND, so that they can
+# be compared with bin/benchmark-chart-render.
+render_backends = {"stdin": helm_values_stdin, "file": helm_values_file}
+
+
+def render_backend():
+    """Return the function that runs helm for CHART_TESTS_RENDER_BACKEND."""
+    name = os.getenv("CHART_TESTS_RENDER_BACKEND", "stdin")
+    try:
+        return render_backends[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown CHART_TESTS_RENDER_BACKEND {name!r}, expected one of {sorted(render_backends)}"
+        ) from None
+
+
+def run_helm_template(
+    name: str,
+    values: dict,
+    show_only: list,
+    chart_dir: str,
+    kube_version: str,
+    baseDomain: str,
+    namespace: Optional[str],
+    report_errors: bool = True,
+) -> bytes:
+    """Run `helm template` with the render backend and return its raw
+    output.
+
+    helm's output is captured, and on failure it is attached to the
+    CalledProcessError. With report_errors, the failure is also printed
+    along with the command and values.
+    """
+    command = [
+        "helm",
+        "template",
+        "--kube-version",
+        kube_version,
+        name,
+        chart_dir,
+        "--set",
+        f"global.baseDomain={baseDomain}",
+    ]
+    if namespace:
+        command.extend(["--namespace", namespace])
+    for i in show_only:
+        command.extend(["--show-only", i])
+    try:
+        return render_backend()(command, values)
+    except subprocess.CalledProcessError as error:
+        if not report_errors:
+            raise
+        print("ERROR: subprocess.CalledProcessError:")
+        print(f"helm command: {' '.join(error.cmd)}")
+        print(f"Values contents:\n{'-' * 21}\n{yaml.dump(values)}{'-' * 21}")
+        print(f"{error.output=}\n{error.stderr=}")
+
+        if "could not find template" in error.stderr.decode("utf-8"):
+            print(
+                "ERROR: command is probably using templates with null output, which "
+                + "usually means there is a helm value that needs to be set to render "
+                + "the content of the chart.\n"
+                + "command: "
+                + " ".join(error.cmd)
+            )
+        raise
 
 
 def prepare_k8s_lookup_dict(k8s_objects) -> dict[tuple[str, str], dict[str, Any]]:
@@ -135,10 +351,7 @@ def prepare_k8s_lookup_dict(k8s_objects) -> dict[tuple[str, str], dict[str, Any]
 
     The keys of the dict are the k8s object's kind and name
     """
-    return {
-        (k8s_object["kind"], k8s_object["metadata"]["name"]): k8s_object
-        for k8s_object in k8s_objects
-    }
+    return RenderedManifest(k8s_objects).by_name
 
 
 def render_k8s_object(obj, type_to_render):
@@ -0,0 +1,238 @@
+"""Check the templates that helm-unittest suites refer to.
+
+Every `charts/*/tests/*_test.yaml` file is parsed, and each template named
+by its suites and tests must exist in the subchart. Each existing template
+is then rendered once per distinct set of test values, through the render
+cache, to catch templates that exist but fail to render. As a render fails
+when any template in the chart fails, each template is rendered in a copy
+of its chart with only the helpers and the templates it includes by path,
+like render_profile.py does. Files are checked concurrently. See
+bin/validate-helm-unittest-templates.py.
+"""
+
+import json
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from tests import git_root_dir
+from tests.chart_tests.dependency_graph import DependencyGraph
+from tests.chart_tests.helm_template_generator import render_chart_output
+from tests.chart_tests.render_profile import IsolatedChart
+from tests.chart_tests.values_fuzzer import error_signature
+from tests.chart_tests.values_fuzzer import merge
+from tests.chart_tests.values_fuzzer import set_value
+
+
+@dataclass
+class Check:
+    """One template referenced by a test file, and what was found."""
+
+    file: str
+    template: str
+    status: str = "ok"  # ok, missing, error or empty
+    message: str = ""
+    tests: list[str] = field(default_factory=list)
+
+    @property
+    def failed(self) -> bool:
+        return self.status in ("missing", "error")
+
+
+@dataclass
+class RenderRequest:
+    chart_dir: Path
+    template: str
+    values: dict
+
+    def key(self) -> tuple:
+        return (
+            str(self.chart_dir),
+            self.template,
+            json.dumps(self.values, sort_keys=True),
+        )
+
+
+def unittest_files(root: Path = git_root_dir) -> list[Path]:
+    return sorted(Path(root).glob("charts/*/tests/*_test.yaml"))
+
+
+def unittest_values(test: dict, tests_dir: Path) -> dict:
+    """Return the values a helm-unittest test renders with: its values
+    files, then its `set` values."""
+    values: dict = {}
+    for values_file in test.get("values") or []:
+        merge(values, yaml.safe_load((tests_dir / values_file).read_text()) or {})
+    for path, value in (test.get("set") or {}).items():
+        set_value(values, tuple(path.split(".")), value)
+    return values
+
+
+def parse_unittest_file(
+    file: Path, root: Path = git_root_dir
+) -> tuple[list[Check], list[RenderRequest]]:
+    """Return a check for every template that file refers to, and the
+    renders needed to check that they render."""
+    rel_path = str(file.relative_to(root))
+    chart_dir = file.parent.parent
+    try:
+        suites = [s for s in yaml.safe_load_all(file.read_text()) if s]
+    except yaml.YAMLError as error:
+        return [Check(rel_path, "", "error", f"could not be parsed: {error}")], []
+
+    checks: dict[str, Check] = {}
+    requests: dict[tuple, RenderRequest] = {}
+    for suite in suites:
+        suite_templates = suite.get("templates") or []
+        for test in suite.get("tests") or []:
+            name = f"{suite.get('suite', file.stem)} / {test.get('it', '')}"
+            templates = [test["template"]] if "template" in test else suite_templates
+            try:
+                values = unittest_values(test, file.parent)
+            except (OSError, yaml.YAMLError) as error:
+                check = checks.setdefault("", Check(rel_path, ""))
+                check.status, check.message = "error", f"{name}: {error}"
+                continue
+            for template in templates:
+                check = checks.setdefault(template, Check(rel_path, template))
+                check.tests.append(name)
+                request = RenderRequest(chart_dir, template, values)
+                requests.setdefault(request.key(), request)
+        for template in suite_templates:
+            checks.setdefault(template, Check(rel_path, template))
+
+    for template, check in checks.items():
+        if template and not (chart_dir / "templates" / template).exists():
+            check.status, check.message = (
+                "missing",
+                f"{chart_dir.name}/templates/{template} does not exist",
+            )
+    missing = {c.template for c in checks.values() if c.status == "missing"}
+    return list(checks.values()), [
+        r for r in requests.values() if r.template not in missing
+    ]
+
+
+def render_status(chart_dir: Path, template: str, values: dict, kube_version: str):
+    """Render one template and return its status and message."""
+    try:
+        render_chart_output(
+            values=values,
+            show_only=[f"templates/{template}"],
+            chart_dir=str(chart_dir),
+            kube_version=kube_version,
+            report_errors=False,
+        )
+    except subprocess.CalledProcessError as error:
+        signature = error_signature(error)
+        # helm fails a --show-only of a template that renders nothing.
+        if "could not find template" in signature:
+            return "empty", "renders nothing with these values"
+        return "error", signature
+    return "ok", ""
+
+
+def render_template(
+    requests: list[RenderRequest], graph: DependencyGraph, kube_version: str
+) -> tuple[str, str]:
+    """Render a template with each of its requests' values, and return
+    the status and message of the first error, else of the first render
+    that produced output, else that it is always empty."""
+    chart_dir, template = requests[0].chart_dir, requests[0].template
+    chart_prefix = f"{chart_dir.relative_to(graph.root)}/"
+    graph_path = f"{chart_prefix}templates/{template}"
+    included = (
+        {path.removeprefix(chart_prefix) for path in graph.path_includes(graph_path)}
+        if graph_path in graph.templates
+        else set()
+    )
+    statuses: dict[str, str] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        chart = IsolatedChart(chart_dir, Path(workdir))
+        with chart.only({f"templates/{template}"} | included) as path:
+            for request in requests:
+                status, message = render_status(
+                    path, template, request.values, kube_version
+                )
+                statuses.setdefault(status, message)
+    for status in ("error", "ok", "empty"):
+        if status in statuses:
+            return status, statuses[status]
+    return "ok", ""
+
+
+def validate(
+    files: list[Path],
+    root: Path = git_root_dir,
+    render: bool = True,
+    kube_version: str = "1.21.0",
+    max_workers: Optional[int] = None,
+) -> list[Check]:
+    """Check every template referenced by files, sorted by file and
+    template."""
+    with ThreadPoolExecutor(max_workers) as executor:
+        parsed = list(executor.map(lambda f: parse_unittest_file(f, root), files))
+        checks = [check for file_checks, _ in parsed for check in file_checks]
+        if render:
+            graph = DependencyGraph(root)
+            graph.templates  # parse once, before the threads need it
+            by_template: dict[tuple, list[RenderRequest]] = {}
+            for file, (_, file_requests) in zip(files, parsed):
+                for request in file_requests:
+                    key = (str(file.relative_to(root)), request.template)
+                    by_template.setdefault(key, []).append(request)
+            results = executor.map(
+                lambda requests: render_template(requests, graph, kube_version),
+                by_template.values(),
+            )
+            checks_by_template = {(c.file, c.template): c for c in checks}
+            for key, (status, message) in zip(by_template, results):
+                check = checks_by_template[key]
+                check.status, check.message = status, message
+    return sorted(checks, key=lambda c: (c.file, c.template))
+
+
+def json_report(checks: list[Check]) -> str:
+    return json.dumps(
+        {
+            "checks": [asdict(check) for check in checks],
+            "failures": sum(check.failed for check in checks),
+        },
+        indent=2,
+    )
+
+
+def junit_report(checks: list[Check]) -> str:
+    """Return a JUnit XML report with a test suite per unittest file."""
+    testsuites = ElementTree.Element("testsuites", name="helm-unittest-templates")
+    by_file: dict[str, list[Check]] = {}
+    for check in checks:
+        by_file.setdefault(check.file, []).append(check)
+    for file, file_checks in by_file.items():
+        testsuite = ElementTree.SubElement(
+            testsuites,
+            "testsuite",
+            name=file,
+            tests=str(len(file_checks)),
+            failures=str(sum(c.failed for c in file_checks)),
+            skipped=str(sum(c.status == "empty" for c in file_checks)),
+        )
+        for check in file_checks:
+            testcase = ElementTree.SubElement(
+                testsuite, "testcase", classname=file, name=check.template or file
+            )
+            if check.failed:
+                ElementTree.SubElement(
+                    testcase, "failure", message=check.message, type=check.status
+                )
+            elif check.status == "empty":
+                ElementTree.SubElement(testcase, "skipped", message=check.message)
+    return ElementTree.tostring(testsuites, encoding="unicode")
@@ -0,0 +1,307 @@
+"""Check that every image the chart uses exists in its registry.
+
+The images come from a cached render (see tests/image_extractor.py). Each
+unique image is resolved to a manifest digest with the registry v2 API,
+with up to max_workers requests in flight, and resolved digests are cached
+on disk for a TTL (CHART_TESTS_IMAGE_DIGEST_TTL seconds, one day by
+default). Transient registry errors are retried, and every image is
+checked before failures are reported. See bin/verify-chart-images.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import requests
+from filelock import FileLock
+
+from tests import supported_k8s_versions
+from tests.chart_tests.lazy_render import LazyRenderedDocs
+from tests.chart_tests.render_cache import cache_dir
+from tests.image_extractor import manifest_images
+
+DEFAULT_DIGEST_TTL = 24 * 60 * 60
+challenge_param_re = re.compile(r'(\w+)="([^"]*)"')
+DOCKER_HUB = "docker.io"
+DOCKER_HUB_API = "registry-1.docker.io"
+manifest_types = [
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.oci.image.manifest.v1+json",
+]
+
+
+class ImageResolutionError(Exception):
+    """Raised when an image's manifest cannot be resolved."""
+
+
+@dataclass(frozen=True)
+class ImageReference:
+    registry: str
+    repository: str
+    tag: Optional[str] = None
+    digest: Optional[str] = None
+
+    @property
+    def reference(self) -> str:
+        """Return the tag or digest to look the manifest up by."""
+        return self.digest or self.tag or "latest"
+
+
+def parse_image(image: str) -> ImageReference:
+    """Split an image into its registry, repository, tag and digest, with
+    the same defaults as docker, eg: 'alpine' is docker.io/library/alpine."""
+    name, _, digest = image.strip().strip("\"'").partition("@")
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        registry, name = first, rest
+    else:
+        registry = DOCKER_HUB
+    repository, _, tag = name.rpartition(":") if ":" in name else (name, "", "")
+    if registry == DOCKER_HUB and "/" not in repository:
+        repository = f"library/{repository}"
+    return ImageReference(registry, repository, tag or None, digest or None)
+
+
+def image_repository(image: str) -> str:
+    """Return image without its tag or digest."""
+    name = image.partition("@")[0]
+    return name.rpartition(":")[0] if ":" in name.rpartition("/")[2] else name
+
+
+def digest_ttl() -> float:
+    return float(os.getenv("CHART_TESTS_IMAGE_DIGEST_TTL", DEFAULT_DIGEST_TTL))
+
+
+def chart_images(
+    values: Optional[dict] = None, kube_version: Optional[str] = None
+) -> list[str]:
+    """Return the unique images of a cached render."""
+    rendered = LazyRenderedDocs(
+        validate=False,
+        values=values or {},
+        kube_version=kube_version or supported_k8s_versions[-1],
+    )
+    return manifest_images(rendered.docs)
+
+
+class DigestCache:
+    """Resolved image digests on disk, each with the time it was resolved."""
+
+    def __init__(self, path: Optional[Path] = None, ttl: Optional[float] = None):
+        self.path = Path(path or cache_dir() / "image-digests.json")
+        self.ttl = digest_ttl() if ttl is None else ttl
+        self.entries: dict[str, dict] = self._read()
+
+    def _read(self) -> dict[str, dict]:
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def get(self, image: str) -> Optional[str]:
+        """Return the cached digest of image if it has not expired."""
+        entry = self.entries.get(image)
+        if entry and time.time() - entry["resolved_at"] < self.ttl:
+            return entry["digest"]
+        return None
+
+    def update(self, digests: dict[str, str]) -> None:
+        """Add digests to the cache, merging with what other processes have
+        written since it was read."""
+        if not digests:
+            return
+        now = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(f"{self.path}.lock"):
+            self.entries = {**self._read(), **self.entries}
+            for image, digest in digests.items():
+                self.entries[image] = {"digest": digest, "resolved_at": now}
+            self.path.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+
+
+class RegistryClient:
+    """Resolves image manifests with the registry v2 API, using anonymous
+    bearer tokens where the registry asks for them."""
+
+    def __init__(
+        self,
+        insecure_registries: tuple[str, ...] = (),
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30,
+    ):
+        self.insecure_registries = set(insecure_registries)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.tokens: dict[tuple[str, str], str] = {}
+        self.token_locks: dict[tuple[str, str], threading.Lock] = {}
+        self.tokens_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Return this thread's session, as sessions are not thread-safe."""
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def base_url(self, registry: str) -> str:
+        scheme = "http" if registry in self.insecure_registries else "https"
+        host = DOCKER_HUB_API if registry == DOCKER_HUB else registry
+        return f"{scheme}://{host}"
+
+    def token(self, challenge: str) -> str:
+        """Return a bearer token for a WWW-Authenticate challenge.
+
+        Tokens are scoped to a repository, so each scope has its own lock:
+        one thread fetches a scope's token while the others wait for it, and
+        tokens for other scopes are fetched concurrently.
+        """
+        params = dict(challenge_param_re.findall(challenge))
+        realm = params.pop("realm")
+        key = (realm, params.get("scope", ""))
+        with self.tokens_lock:
+            token_lock = self.token_locks.setdefault(key, threading.Lock())
+        with token_lock:
+            if key not in self.tokens:
+                response = self.session.get(realm, params=params, timeout=self.timeout)
+                response.raise_for_status()
+                body = response.json()
+                self.tokens[key] = body.get("token") or body["access_token"]
+            return self.tokens[key]
+
+    def request(self, method: str, url: str) -> requests.Response:
+        """Make a manifest request, answering an auth challenge and retrying
+        connection errors, 429s and 5xxs."""
+        headers = {"Accept": ", ".join(manifest_types)}
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(
+                    method, url, headers=headers, timeout=self.timeout
+                )
+                challenge = response.headers.get("WWW-Authenticate", "")
+                if response.status_code == 401 and challenge.startswith("Bearer "):
+                    headers["Authorization"] = f"Bearer {self.token(challenge)}"
+                    response = self.session.request(
+                        method, url, headers=headers, timeout=self.timeout
+                    )
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            except requests.ConnectionError:
+                if attempt == self.retries:
+                    raise
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2**attempt)
+        return response
+
+    def manifest_url(self, ref: ImageReference, reference: Optional[str] = None):
+        return (
+            f"{self.base_url(ref.registry)}/v2/{ref.repository}"
+            f"/manifests/{reference or ref.reference}"
+        )
+
+    def resolve(self, image: str) -> str:
+        """Return the manifest digest of image."""
+        ref = parse_image(image)
+        url = self.manifest_url(ref)
+        try:
+            response = self.request("HEAD", url)
+            if response.ok and "Docker-Content-Digest" not in response.headers:
+                response = self.request("GET", url)
+        except requests.RequestException as error:
+            raise ImageResolutionError(f"{image}: {error}") from error
+        if not response.ok:
+            raise ImageResolutionError(
+                f"{image}: {response.status_code} {response.reason} from {url}"
+            )
+        return (
+            response.headers.get("Docker-Content-Digest")
+            or f"sha256:{hashlib.sha256(response.content).hexdigest()}"
+        )
+
+    def manifest(self, ref: ImageReference, reference: Optional[str] = None) -> dict:
+        url = self.manifest_url(ref, reference)
+        try:
+            response = self.request("GET", url)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            raise ImageResolutionError(f"{url}: {error}") from error
+        return response.json()
+
+    def image_size(
+        self, image: str, os_name: str = "linux", arch: str = "amd64"
+    ) -> int:
+        """Return the compressed size in bytes of image's layers and config,
+        for the os and arch if it is a multi-platform image."""
+        ref = parse_image(image)
+        manifest = self.manifest(ref)
+        if "manifests" in manifest:
+            platforms = manifest["manifests"]
+            entry = next(
+                (
+                    m
+                    for m in platforms
+                    if m.get("platform", {}).get("os") == os_name
+                    and m.get("platform", {}).get("architecture") == arch
+                ),
+                platforms[0],
+            )
+            manifest = self.manifest(ref, entry["digest"])
+        return sum(layer["size"] for layer in manifest.get("layers") or []) + (
+            manifest.get("config") or {}
+        ).get("size", 0)
+
+
+@dataclass
+class ImageResult:
+    image: str
+    digest: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+
+class ImageVerifier:
+    """Resolves many images at once through a DigestCache."""
+
+    def __init__(
+        self,
+        registry_client: Optional[RegistryClient] = None,
+        digest_cache: Optional[DigestCache] = None,
+        max_workers: int = 16,
+    ):
+        self.registry_client = registry_client or RegistryClient()
+        self.digest_cache = digest_cache or DigestCache()
+        self.max_workers = max_workers
+
+    def resolve(self, image: str) -> ImageResult:
+        if digest := self.digest_cache.get(image):
+            return ImageResult(image, digest, cached=True)
+        try:
+            return ImageResult(image, self.registry_client.resolve(image))
+        except ImageResolutionError as error:
+            return ImageResult(image, error=str(error))
+
+    def verify(self, images: list[str]) -> list[ImageResult]:
+        """Return the result of every unique image, sorted by image."""
+        images = sorted(set(images))
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            results = list(executor.map(self.resolve, images))
+        self.digest_cache.update(
+            {r.image: r.digest for r in results if r.digest and not r.cached}
+        )
+        return results
+
+
+def format_images(images: list[str]) -> str:
+    """Return a table of image repositories and images, as printed by
+    `make show-docker-images`."""
+    rows = [(f"https://{image_repository(image)}", image) for image in images]
+    width = max((len(url) for url, _ in rows), default=0)
+    return "\n".join(f"{url:<{width}}  {image}" for url, image in rows)
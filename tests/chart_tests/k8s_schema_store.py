@@ -0,0 +1,131 @@
+"""Local store of kubernetes JSON schemas used to validate rendered
+objects.
+
+Schemas are kept gzipped under tests/k8s_schemas (or CHART_TESTS_SCHEMA_DIR)
+at their path in the kubernetes-json-schema repo. That store is vendored,
+and only bin/sync-k8s-schemas writes to it. When a schema is not vendored
+it is downloaded into cache_dir()/k8s-schemas, which is not tracked by git,
+unless CHART_TESTS_OFFLINE is set.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+from tests import git_root_dir
+from tests.chart_tests.render_cache import cache_dir
+
+BASE_URL_SPEC = "https://raw.githubusercontent.com/yannh/kubernetes-json-schema/master"
+DEFAULT_SCHEMA_DIR = git_root_dir / "tests" / "k8s_schemas"
+
+
+class SchemaNotFoundError(LookupError):
+    """Raised when a schema is not in the store and cannot be fetched."""
+
+
+def offline() -> bool:
+    """Return whether schemas must not be downloaded."""
+    return os.getenv("CHART_TESTS_OFFLINE", "").lower() not in ("", "0", "false")
+
+
+def schema_filename(api_version: str, kind: str, kube_version: str) -> str:
+    """Return the path of a schema relative to the root of the
+    kubernetes-json-schema repo."""
+    api_version = api_version.lower()
+    kind = kind.lower()
+
+    if "/" in api_version:
+        ext, _, api_version = api_version.partition("/")
+        ext = ext.split(".")[0]
+        return f"v{kube_version}-standalone-strict/{kind}-{ext}-{api_version}.json"
+    return f"v{kube_version}-standalone-strict/{kind}-{api_version}.json"
+
+
+def fetch_schema(api_version: str, kind: str, kube_version: str) -> dict:
+    """Download a schema from the kubernetes-json-schema repo."""
+    url = f"{BASE_URL_SPEC}/{schema_filename(api_version, kind, kube_version)}"
+    request = requests.get(url)
+    request.raise_for_status()
+    return request.json()
+
+
+class SchemaStore:
+    """Gzipped kubernetes JSON schemas on disk.
+
+    Schemas that get_or_fetch() downloads are stored under download_path
+    rather than path, so test runs do not change the vendored store.
+    """
+
+    def __init__(
+        self, path: Optional[Path] = None, download_path: Optional[Path] = None
+    ):
+        self.path = Path(
+            path or os.getenv("CHART_TESTS_SCHEMA_DIR", DEFAULT_SCHEMA_DIR)
+        )
+        self.download_path = Path(download_path or cache_dir() / "k8s-schemas")
+
+    def get(
+        self,
+        api_version: str,
+        kind: str,
+        kube_version: str,
+        include_downloaded: bool = True,
+    ) -> Optional[dict]:
+        """Return a schema from the store, or from the downloaded schemas
+        if include_downloaded is set, or None if it is not there."""
+        rel_path = f"{schema_filename(api_version, kind, kube_version)}.gz"
+        roots = [self.path, self.download_path] if include_downloaded else [self.path]
+        for root in roots:
+            try:
+                return json.loads(gzip.decompress((root / rel_path).read_bytes()))
+            except FileNotFoundError:
+                continue
+        return None
+
+    def put(
+        self,
+        api_version: str,
+        kind: str,
+        kube_version: str,
+        schema: dict,
+        downloaded: bool = False,
+    ) -> None:
+        """Add a schema to the store, or to the downloaded schemas if
+        downloaded is set."""
+        root = self.download_path if downloaded else self.path
+        rel_path = f"{schema_filename(api_version, kind, kube_version)}.gz"
+        schema_file = root / rel_path
+        schema_file.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps(schema, sort_keys=True, separators=(",", ":")).encode()
+        tmp_file = schema_file.with_name(f"{schema_file.name}.{os.getpid()}.tmp")
+        # mtime=0 keeps the gzip output reproducible, so re-syncing does not make noisy diffs
+        tmp_file.write_bytes(gzip.compress(content, mtime=0))
+        os.replace(tmp_file, schema_file)
+
+    def get_or_fetch(self, api_version: str, kind: str, kube_version: str) -> dict:
+        """Return a schema from the store, downloading it first if needed
+        and allowed."""
+        if (schema := self.get(api_version, kind, kube_version)) is not None:
+            return schema
+        missing = f"No schema for {api_version} {kind} kube_version {kube_version} in {self.path}"
+        if offline():
+            raise SchemaNotFoundError(
+                f"{missing} and CHART_TESTS_OFFLINE is set. "
+                + "Run bin/sync-k8s-schemas to update the store."
+            )
+        try:
+            schema = fetch_schema(api_version, kind, kube_version)
+        except requests.RequestException as err:
+            raise SchemaNotFoundError(
+                f"{missing} and it could not be downloaded ({err}). "
+                + "Run bin/sync-k8s-schemas with network access to update the store."
+            ) from err
+        self.put(api_version, kind, kube_version, schema, downloaded=True)
+        return schema
+
+
+schema_store = SchemaStore()
@@ -0,0 +1,156 @@
+"""Lazily rendered charts for use in test parametrization.
+
+Parametrizing tests over rendered docs means rendering at import time, so
+even `pytest --collect-only` or a `-k` selection that skips those tests
+pays for full chart renders. LazyRenderedDocs instead builds parameters
+from a small manifest index that is cached next to the render, and each
+parameter only loads the rendered doc when a test actually uses it.
+"""
+
+from collections.abc import Mapping
+from functools import cached_property
+from typing import Callable
+from typing import Optional
+
+import pytest
+
+from tests import get_pod_spec
+from tests import supported_k8s_versions
+from tests.chart_tests.helm_template_generator import iter_k8s_objects
+from tests.chart_tests.helm_template_generator import render_args
+from tests.chart_tests.helm_template_generator import render_chart_output
+from tests.chart_tests.helm_template_generator import render_manifest
+from tests.chart_tests.render_cache import render_cache
+from tests.chart_tests.render_cache import render_cache_enabled
+from tests.chart_tests.render_cache import render_key
+from tests.chart_tests.rendered_manifest import RenderedManifest
+
+
+def index_entry(position: int, doc: dict, source: Optional[str] = None) -> dict:
+    """Return the manifest index entry for a single doc."""
+    metadata = doc.get("metadata") or {}
+    pod_spec = get_pod_spec(doc) or {}
+    containers = (pod_spec.get("initContainers") or []) + (
+        pod_spec.get("containers") or []
+    )
+    return {
+        "position": position,
+        "source": source,
+        "apiVersion": doc.get("apiVersion"),
+        "kind": doc.get("kind"),
+        "name": metadata.get("name"),
+        "namespace": metadata.get("namespace"),
+        "labels": metadata.get("labels") or {},
+        "annotations": sorted(metadata.get("annotations") or {}),
+        "images": [c["image"] for c in containers if c.get("image")],
+    }
+
+
+def default_id(entry: dict) -> str:
+    return f"{entry['kind']}/{entry['name']}"
+
+
+class LazyDoc(Mapping):
+    """A read-only rendered doc that is only loaded when it is accessed."""
+
+    def __init__(self, rendered: "LazyRenderedDocs", position: int):
+        self.rendered = rendered
+        self.position = position
+
+    def load(self) -> dict:
+        return self.rendered.docs[self.position]
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __repr__(self):
+        return repr(self.load())
+
+
+class LazyRenderedDocs:
+    """A render_chart call that is made when the docs are first needed
+    rather than when it is defined.
+
+    Takes the same keyword arguments as render_chart.
+    """
+
+    def __init__(self, validate: bool = True, **render_kwargs):
+        self.validate = validate
+        self.render_kwargs = render_kwargs
+
+    @cached_property
+    def docs(self) -> list[dict]:
+        """Return the rendered and validated docs."""
+        return self.manifest.docs
+
+    @cached_property
+    def manifest(self) -> RenderedManifest:
+        """Return the rendered docs as a RenderedManifest."""
+        return render_manifest(validate=self.validate, **self.render_kwargs)
+
+    @cached_property
+    def index(self) -> list[dict]:
+        """Return the manifest index of the render, which is cached on disk
+        with the render itself."""
+        key = render_key(**render_args(**self.render_kwargs))
+        index = render_cache.get_index(key) if render_cache_enabled() else None
+        # Indexes cached before entries recorded their source are rebuilt.
+        if index is not None and all("source" in entry for entry in index):
+            return index
+        output = render_chart_output(**self.render_kwargs)
+        index = [
+            index_entry(position, doc, source)
+            for position, (source, doc) in enumerate(iter_k8s_objects(output))
+        ]
+        if render_cache_enabled():
+            render_cache.put_index(key, index)
+        return index
+
+    def select(self, predicate: Optional[Callable[[dict], bool]] = None) -> list[dict]:
+        """Return the index entries that match predicate."""
+        return [entry for entry in self.index if predicate is None or predicate(entry)]
+
+    def params(
+        self,
+        predicate: Optional[Callable[[dict], bool]] = None,
+        id: Callable[[dict], str] = default_id,
+    ) -> list:
+        """Return a LazyDoc pytest.param for each doc whose index entry
+        matches predicate."""
+        return [
+            pytest.param(LazyDoc(self, entry["position"]), id=id(entry))
+            for entry in self.select(predicate)
+        ]
+
+    def images(self) -> list[str]:
+        """Return all the container images in the render, sorted and
+        deduplicated."""
+        return sorted({image for entry in self.index for image in entry["images"]})
+
+
+class RenderedByKubeVersion(Mapping):
+    """RenderedManifests of the same render_chart keyword arguments, keyed by
+    kube version. Each version is rendered when it is first looked up."""
+
+    def __init__(
+        self, kube_versions: list[str] = supported_k8s_versions, **render_kwargs
+    ):
+        self.renders = {
+            kube_version: LazyRenderedDocs(kube_version=kube_version, **render_kwargs)
+            for kube_version in kube_versions
+        }
+
+    def __getitem__(self, kube_version: str) -> RenderedManifest:
+        return self.renders[kube_version].manifest
+
+    def __iter__(self):
+        return iter(self.renders)
+
+    def __len__(self):
+        return len(self.renders)
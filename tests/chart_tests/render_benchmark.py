@@ -0,0 +1,240 @@
+"""Render time benchmarks for the chart.
+
+Each benchmark case runs `helm template` a few times, bypassing the render
+cache, and records the p50 and p95 render time and the output size. Cases
+are:
+
+- full renders with default values and with tests/enable_all_features.yaml
+- a full render for every feature flag group in enable_all_features.yaml, to
+  show what each feature adds to the default render
+- a show_only render of every subchart, with all features enabled
+
+Results are appended to a JSON history file, and a run fails when the p50
+of a case regresses beyond a threshold compared to earlier runs on the same
+host. The history file is in the gitignored tests/.cache and CI does not
+run the benchmarks, so baselines are local to each machine. See
+bin/benchmark-chart-render.
+"""
+
+import json
+import platform
+import re
+import statistics
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Optional
+from typing import Pattern
+
+from tests.chart_tests import get_all_features
+from tests.chart_tests.helm_template_generator import render_args
+from tests.chart_tests.helm_template_generator import run_helm_template
+from tests.chart_tests.render_cache import cache_dir
+from tests.chart_tests.render_cache import helm_version
+
+source_re = re.compile(r"^# Source: [^/]+/(.+)$", re.MULTILINE)
+
+
+def default_history_file() -> Path:
+    return cache_dir() / "render-benchmarks.json"
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Return the percentile of samples, interpolating between the closest
+    ranks."""
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+@dataclass
+class BenchmarkCase:
+    """One render to benchmark, with render_chart keyword arguments."""
+
+    id: str
+    kube_version: str
+    values: dict = field(default_factory=dict)
+    show_only: list = field(default_factory=list)
+
+    def render(self, chart_dir: str) -> bytes:
+        return run_helm_template(
+            **render_args(
+                values=self.values,
+                show_only=self.show_only,
+                chart_dir=chart_dir,
+                kube_version=self.kube_version,
+            )
+        )
+
+
+def feature_flags(all_features: dict) -> dict[str, dict]:
+    """Return the values for each feature flag group in all_features, keyed
+    by the dotted path of the group, eg: 'global.pgbouncer'."""
+    return {
+        f"global.{name}": {"global": {name: value}}
+        for name, value in all_features.get("global", {}).items()
+        if name != "baseDomain"
+    }
+
+
+def subchart_templates(output: bytes) -> dict[str, list[str]]:
+    """Return the show_only paths of the templates in a render, grouped by
+    subchart. Templates of the top level chart are grouped as 'astronomer'."""
+    subcharts: dict[str, list[str]] = {}
+    for template in dict.fromkeys(source_re.findall(output.decode())):
+        parts = template.split("/")
+        subchart = parts[1] if parts[0] == "charts" else "astronomer"
+        subcharts.setdefault(subchart, []).append(template)
+    return subcharts
+
+
+def subchart_names(chart_dir: str) -> list[str]:
+    """Return the names subchart_templates() groups templates under."""
+    subcharts = sorted(
+        path.parent.name for path in Path(chart_dir).glob("charts/*/Chart.yaml")
+    )
+    return ["astronomer"] + subcharts
+
+
+def benchmark_cases(
+    kube_versions: list[str],
+    chart_dir: str,
+    case_filter: Optional[Pattern] = None,
+) -> list[BenchmarkCase]:
+    """Return the benchmark cases for kube_versions whose id matches
+    case_filter.
+
+    The templates of the show_only cases come from an all features render,
+    which is skipped when case_filter excludes every show_only case.
+    """
+
+    def selected(case_id: str) -> bool:
+        return case_filter is None or bool(case_filter.search(case_id))
+
+    all_features = get_all_features()
+    cases = []
+    for kube_version in kube_versions:
+        cases.append(BenchmarkCase(f"{kube_version}/full/default", kube_version))
+        cases.append(
+            BenchmarkCase(
+                f"{kube_version}/full/enable_all_features", kube_version, all_features
+            )
+        )
+        for flag, values in feature_flags(all_features).items():
+            cases.append(
+                BenchmarkCase(f"{kube_version}/flag/{flag}", kube_version, values)
+            )
+        if not any(
+            selected(f"{kube_version}/show_only/{subchart}")
+            for subchart in subchart_names(chart_dir)
+        ):
+            continue
+        output = BenchmarkCase("", kube_version, all_features).render(chart_dir)
+        for subchart, templates in sorted(subchart_templates(output).items()):
+            cases.append(
+                BenchmarkCase(
+                    f"{kube_version}/show_only/{subchart}",
+                    kube_version,
+                    all_features,
+                    templates,
+                )
+            )
+    return [case for case in cases if selected(case.id)]
+
+
+def run_case(case: BenchmarkCase, chart_dir: str, repeat: int) -> dict:
+    """Render case repeat times and return its timings and output size."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = case.render(chart_dir)
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "bytes": len(output),
+        "samples": samples,
+    }
+
+
+@dataclass
+class Regression:
+    case: str
+    baseline: float
+    current: float
+
+    def __str__(self):
+        change = (self.current - self.baseline) / self.baseline
+        return (
+            f"{self.case}: p50 {self.current:.3f}s vs baseline {self.baseline:.3f}s "
+            f"({change:+.0%})"
+        )
+
+
+class BenchmarkHistory:
+    """The JSON file that benchmark runs are recorded in."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or default_history_file())
+        self.runs: list[dict] = (
+            json.loads(self.path.read_text())["runs"] if self.path.exists() else []
+        )
+
+    def baseline(self, case: str, host: str, runs: int) -> Optional[float]:
+        """Return the median p50 of case over the last runs on host."""
+        p50s = [
+            run["results"][case]["p50"]
+            for run in self.runs
+            if run["host"] == host and case in run["results"]
+        ][-runs:]
+        return statistics.median(p50s) if p50s else None
+
+    def regressions(
+        self,
+        run: dict,
+        threshold: float,
+        min_delta: float,
+        baseline_runs: int,
+    ) -> list[Regression]:
+        """Return the cases in run whose p50 is more than threshold (a
+        fraction) and min_delta (seconds) slower than their baseline."""
+        regressions = []
+        for case, result in run["results"].items():
+            baseline = self.baseline(case, run["host"], baseline_runs)
+            if baseline is None:
+                continue
+            delta = result["p50"] - baseline
+            if delta > min_delta and delta > baseline * threshold:
+                regressions.append(Regression(case, baseline, result["p50"]))
+        return regressions
+
+    def record(self, run: dict) -> None:
+        self.runs.append(run)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"runs": self.runs}, indent=2) + "\n")
+
+
+def new_run(results: dict, git_sha: Optional[str] = None) -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "git_sha": git_sha,
+        "helm_version": helm_version(),
+        "results": results,
+    }
+
+
+def format_results(results: dict) -> str:
+    """Return a table of results for printing."""
+    width = max((len(case) for case in results), default=0)
+    lines = [f"{'case':<{width}}  {'p50':>8}  {'p95':>8}  {'bytes':>9}"]
+    lines += [
+        f"{case:<{width}}  {r['p50']:>7.3f}s  {r['p95']:>7.3f}s  {r['bytes']:>9}"
+        for case, r in results.items()
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+"""On-disk cache of ``helm template`` output for chart tests.
+
+Many tests render the exact same chart with the exact same values, so we
+key each render on everything that can change helm's output and store the
+raw output on disk, where it is shared between pytest-xdist workers and
+between test runs.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+from fnmatch import fnmatch
+from functools import cache
+from pathlib import Path
+from typing import Callable
+from typing import Optional
+
+from filelock import FileLock
+
+from tests import git_root_dir
+
+DEFAULT_CACHE_DIR = git_root_dir / "tests" / ".cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_dir() -> Path:
+    """Return the base directory for chart test caches."""
+    return Path(os.getenv("CHART_TESTS_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+
+def render_cache_enabled() -> bool:
+    """Return whether the render cache should be used."""
+    return os.getenv("CHART_TESTS_RENDER_CACHE", "1").lower() not in ("0", "false")
+
+
+@cache
+def helm_version() -> str:
+    """Return the version of the helm binary, which is part of every cache
+    key."""
+    return subprocess.check_output(["helm", "version", "--short"]).decode().strip()
+
+
+@cache
+def helmignore_patterns(chart_dir: str) -> tuple[str, ...]:
+    """Return the patterns from the .helmignore file in chart_dir."""
+    helmignore = Path(chart_dir) / ".helmignore"
+    if not helmignore.is_file():
+        return ()
+    lines = (line.strip() for line in helmignore.read_text().splitlines())
+    return tuple(line for line in lines if line and not line.startswith("#"))
+
+
+def is_helmignored(rel_path: Path, patterns: tuple[str, ...]) -> bool:
+    """Approximate helm's .helmignore matching for a path relative to the
+    chart root."""
+    for pattern in patterns:
+        if pattern.startswith("/"):
+            anchored = pattern.strip("/")
+            if fnmatch(str(rel_path), anchored) or fnmatch(rel_path.parts[0], anchored):
+                return True
+        elif any(fnmatch(part, pattern.rstrip("/")) for part in rel_path.parts):
+            return True
+    return False
+
+
+@cache
+def chart_tree_hash(chart_dir: str) -> str:
+    """Return a hash of every file helm loads from chart_dir, including
+    templates, values, Chart.yaml and files of every subchart.
+
+    This is computed once per process, so edits to the chart while a
+    test session is running are not picked up.
+    """
+    root = Path(chart_dir)
+    patterns = helmignore_patterns(chart_dir)
+    digest = hashlib.sha256()
+    for path in sorted(root.rglob("*")):
+        rel_path = path.relative_to(root)
+        if not path.is_file() or is_helmignored(rel_path, patterns):
+            continue
+        digest.update(str(rel_path).encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def render_key(
+    chart_dir: str,
+    name: str,
+    values: dict,
+    show_only: list,
+    kube_version: str,
+    baseDomain: str,
+    namespace: Optional[str],
+) -> str:
+    """Return the cache key for a single helm render."""
+    # helm_dependency_cache keeps its archives in cache_dir().
+    from tests.chart_tests.helm_dependency_cache import dependency_state
+
+    key_data = {
+        "chart": chart_tree_hash(chart_dir),
+        "dependencies": dependency_state(chart_dir),
+        "helm": helm_version(),
+        "name": name,
+        "values": values,
+        "show_only": list(show_only),
+        "kube_version": kube_version,
+        "baseDomain": baseDomain,
+        "namespace": namespace,
+    }
+    canonical = json.dumps(key_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RenderCache:
+    """A size-bounded, least-recently-used, file-locked store of raw helm
+    output."""
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.path = Path(path or cache_dir() / "render")
+        self.max_bytes = max_bytes or int(
+            os.getenv("CHART_TESTS_RENDER_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+        )
+
+    def _entry(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.yaml.gz"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached output for key, or None on a cache miss."""
+        entry = self._entry(key)
+        try:
+            data = gzip.decompress(entry.read_bytes())
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile):
+            return None
+        # Bump mtime so eviction is least-recently-used, not least-recently-written.
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Atomically store data for key, then evict old entries if the
+        cache is too big."""
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        tmp_entry.write_bytes(gzip.compress(data, compresslevel=1))
+        os.replace(tmp_entry, entry)
+        self.evict()
+
+    def get_index(self, key: str) -> Optional[list]:
+        """Return the cached manifest index for key, or None."""
+        try:
+            return json.loads(self._entry(key).with_suffix(".index.json").read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put_index(self, key: str, index: list) -> None:
+        """Atomically store the manifest index for key."""
+        index_file = self._entry(key).with_suffix(".index.json")
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = index_file.with_name(f"{index_file.name}.{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(index))
+        os.replace(tmp_file, index_file)
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Return the cached output for key, calling render at most once
+        across all processes sharing this cache."""
+        if (data := self.get(key)) is not None:
+            return data
+        lock_file = self._entry(key).with_suffix(".lock")
+        lock_file.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(lock_file)):
+            if (data := self.get(key)) is not None:
+                return data
+            data = render()
+            self.put(key, data)
+        return data
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in
+        max_bytes."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(self.path / "evict.lock")):
+            entries = []
+            total = 0
+            for entry in self.path.glob("*/*.yaml.gz"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, entry in sorted(entries):
+                entry.unlink(missing_ok=True)
+                entry.with_suffix(".lock").unlink(missing_ok=True)
+                entry.with_suffix(".index.json").unlink(missing_ok=True)
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+render_cache = RenderCache()
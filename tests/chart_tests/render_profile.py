@@ -0,0 +1,158 @@
+"""Profile how much each chart template adds to the render time.
+
+`helm template --show-only` renders every template and only filters the
+output, so it cannot tell templates apart. Instead each template is rendered
+in a copy of the chart that only has the helpers (`_*.tpl` files), the
+template itself, and the templates it includes by path. The time of that
+render minus the time of rendering the helpers alone is the cost of the
+template.
+
+Output bytes and object counts come from a full render, and include and
+tpl counts are the calls written in the template, not the number of times
+they run. See bin/profile-chart-templates.
+"""
+
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+from typing import Optional
+
+from tests.chart_tests.dependency_graph import DependencyGraph
+from tests.chart_tests.helm_template_generator import document_separator_re
+from tests.chart_tests.helm_template_generator import iter_k8s_objects
+from tests.chart_tests.helm_template_generator import render_args
+from tests.chart_tests.helm_template_generator import run_helm_template
+from tests.chart_tests.helm_template_generator import source_re
+from tests.chart_tests.render_benchmark import percentile
+from tests.chart_tests.render_cache import helmignore_patterns
+from tests.chart_tests.render_cache import is_helmignored
+from tests.chart_tests.values_fuzzer import error_signature
+
+
+def is_helper(path: str) -> bool:
+    name = Path(path).name
+    return name.startswith("_") or name == "NOTES.txt"
+
+
+def output_sizes(output: bytes) -> dict[str, dict]:
+    """Return the bytes and number of objects in a render per template,
+    keyed by the template path relative to the chart."""
+    sizes: dict[str, dict] = {}
+    for document in document_separator_re.split(output):
+        if not (source := source_re.search(document)):
+            continue
+        template = source.group(1).decode().split("/", 1)[1]
+        size = sizes.setdefault(template, {"bytes": 0, "objects": 0})
+        size["bytes"] += len(document)
+        size["objects"] += len(list(iter_k8s_objects(document)))
+    return sizes
+
+
+class IsolatedChart:
+    """A copy of the chart with only its helpers, to which templates can be
+    added one at a time."""
+
+    def __init__(self, chart_dir: Path, workdir: Path):
+        self.source = Path(chart_dir)
+        self.path = Path(workdir) / "chart"
+        patterns = helmignore_patterns(str(chart_dir))
+        for path in sorted(self.source.rglob("*")):
+            rel_path = path.relative_to(self.source)
+            if not path.is_file() or is_helmignored(rel_path, patterns):
+                continue
+            parts = rel_path.parts
+            if "templates" in parts[:3] and not is_helper(str(rel_path)):
+                continue
+            (self.path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, self.path / rel_path)
+
+    @contextmanager
+    def only(self, templates: set[str]) -> Iterator[Path]:
+        """Add templates to the chart for the duration of the context."""
+        for template in templates:
+            (self.path / template).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(self.source / template, self.path / template)
+        try:
+            yield self.path
+        finally:
+            for template in templates:
+                (self.path / template).unlink()
+
+
+def time_render(chart_dir: Path, values: dict, kube_version: str, repeat: int):
+    """Return the p50 render time of chart_dir in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_helm_template(
+            **render_args(
+                values=values, chart_dir=str(chart_dir), kube_version=kube_version
+            ),
+            report_errors=False,
+        )
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50)
+
+
+def profile_templates(
+    chart_dir: Path,
+    values: dict,
+    kube_version: str,
+    workdir: Path,
+    repeat: int = 3,
+    templates: Optional[list[str]] = None,
+) -> list[dict]:
+    """Return the profile of every template, or of the given templates,
+    sorted by cost."""
+    graph = DependencyGraph(chart_dir)
+    templates = templates or [t for t in graph.templates if not is_helper(t)]
+    sizes = output_sizes(
+        run_helm_template(
+            **render_args(
+                values=values, chart_dir=str(chart_dir), kube_version=kube_version
+            )
+        )
+    )
+
+    chart = IsolatedChart(chart_dir, workdir)
+    baseline = time_render(chart.path, values, kube_version, repeat)
+    profiles = []
+    for template in templates:
+        parsed = graph.templates[template]
+        profile = {
+            "template": template,
+            "seconds": None,
+            "bytes": sizes.get(template, {}).get("bytes", 0),
+            "objects": sizes.get(template, {}).get("objects", 0),
+            "include_calls": parsed.include_calls,
+            "tpl_calls": parsed.tpl_calls,
+            "error": None,
+        }
+        with chart.only({template} | graph.path_includes(template)) as path:
+            try:
+                seconds = time_render(path, values, kube_version, repeat)
+                profile["seconds"] = max(0.0, seconds - baseline)
+            except subprocess.CalledProcessError as error:
+                profile["error"] = error_signature(error)
+        profiles.append(profile)
+    profiles.sort(key=lambda p: -(p["seconds"] or 0))
+    return [{"template": "(helpers)", "seconds": baseline}] + profiles
+
+
+def folded(profiles: list[dict]) -> str:
+    """Return profiles in the folded stack format of flamegraph.pl and
+    speedscope, with one sample per microsecond."""
+    lines = []
+    for profile in profiles:
+        if not profile["seconds"]:
+            continue
+        parts = [
+            p
+            for p in profile["template"].split("/")
+            if p not in ("charts", "templates")
+        ]
+        lines.append(f"astronomer;{';'.join(parts)} {round(profile['seconds'] * 1e6)}")
+    return "\n".join(lines) + "\n"
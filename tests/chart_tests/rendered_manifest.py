@@ -0,0 +1,109 @@
+"""An indexed view of the docs from a single chart render."""
+
+from collections import defaultdict
+from functools import cache
+from typing import Any
+from typing import Optional
+
+import jmespath
+
+from tests import get_pod_spec
+
+pod_kinds = ["Deployment", "StatefulSet", "DaemonSet", "Job", "CronJob", "Pod"]
+
+
+@cache
+def compile_query(expression: str):
+    """Return a compiled jmespath expression, compiling each expression only
+    once per process."""
+    return jmespath.compile(expression)
+
+
+def search(expression: str, data: Any) -> Any:
+    """jmespath.search with compiled expression caching."""
+    return compile_query(expression).search(data)
+
+
+class RenderedManifest:
+    """The docs from one render, indexed by kind, name, namespace, label and
+    source template.
+
+    Build it once per render and use the lookups instead of scanning the
+    whole list of docs for every question a test asks.
+    """
+
+    def __init__(self, docs: Optional[list], sources: Optional[list] = None):
+        self.docs = docs or []
+        self.sources = sources or [None] * len(self.docs)
+        self.by_kind: dict[str, list] = defaultdict(list)
+        self.by_name: dict[tuple[str, str], dict] = {}
+        self.by_namespace: dict[Optional[str], list] = defaultdict(list)
+        self.by_label: dict[tuple[str, str], list] = defaultdict(list)
+        self.by_template: dict[Optional[str], list] = defaultdict(list)
+
+        for doc, source in zip(self.docs, self.sources):
+            metadata = doc.get("metadata") or {}
+            self.by_kind[doc["kind"]].append(doc)
+            self.by_name[(doc["kind"], metadata.get("name"))] = doc
+            self.by_namespace[metadata.get("namespace")].append(doc)
+            for label, value in (metadata.get("labels") or {}).items():
+                self.by_label[(label, str(value))].append(doc)
+            self.by_template[source].append(doc)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def get(self, kind: str, name: str) -> Optional[dict]:
+        """Return the doc with the given kind and name."""
+        return self.by_name.get((kind, name))
+
+    def kind(self, *kinds: str) -> list:
+        """Return all docs of the given kinds, in render order within each
+        kind."""
+        return [doc for kind in kinds for doc in self.by_kind.get(kind, [])]
+
+    def labelled(self, **labels: str) -> list:
+        """Return the docs that have all the given labels."""
+        matches = None
+        for label, value in labels.items():
+            docs = self.by_label.get((label, str(value)), [])
+            ids = {id(doc) for doc in docs}
+            matches = ids if matches is None else matches & ids
+        return [doc for doc in self.docs if matches is None or id(doc) in matches]
+
+    def template(self, source: str) -> list:
+        """Return the docs rendered from the given template, eg:
+        'astronomer/charts/prometheus/templates/prometheus-statefulset.yaml'"""
+        return self.by_template.get(source, [])
+
+    def pod_specs(self) -> list[tuple[dict, dict]]:
+        """Return (doc, pod spec) for every doc that has a pod spec,
+        regardless of its kind."""
+        return [
+            (doc, pod_spec)
+            for doc in self.kind(*pod_kinds)
+            if (pod_spec := get_pod_spec(doc)) is not None
+        ]
+
+    def containers(self, include_init_containers: bool = False) -> list[tuple]:
+        """Return (doc, container) for every container in every pod spec."""
+        containers = []
+        for doc, pod_spec in self.pod_specs():
+            if include_init_containers:
+                containers += [(doc, c) for c in pod_spec.get("initContainers") or []]
+            containers += [(doc, c) for c in pod_spec.get("containers") or []]
+        return containers
+
+    def images(self) -> list[str]:
+        """Return every container and initContainer image, sorted and
+        deduplicated."""
+        return sorted(
+            {c["image"] for _, c in self.containers(include_init_containers=True)}
+        )
+
+    def search(self, expression: str) -> Any:
+        """Run a jmespath expression against the list of docs."""
+        return search(expression, self.docs)
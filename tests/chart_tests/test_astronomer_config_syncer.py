@@ -1,4 +1,5 @@
 from tests.chart_tests.helm_template_generator import render_chart
+from tests.chart_tests.helm_template_generator import render_chart_batch
 import pytest
 from tests import supported_k8s_versions
 
@@ -34,6 +35,36 @@ cron_test_data = [
     ("development-optical-asteroid-4621", 54, 14),
 ]
 
+cron_render_requests = {
+    (release_name, kube_version): {
+        "name": release_name,
+        "kube_version": kube_version,
+        "show_only": [
+            "charts/astronomer/templates/config-syncer/config-syncer-cronjob.yaml"
+        ],
+    }
+    for release_name, _, _ in cron_test_data
+    for kube_version in supported_k8s_versions
+}
+
+
+@pytest.fixture(scope="module")
+def cron_docs(request):
+    """Render the cron_test_data release names and kube versions of the
+    selected schedule tests in one batch, so a `-k` selection only renders
+    what it runs."""
+    selected = {
+        (item.callspec.params["test_data"][0], item.callspec.params["kube_version"])
+        for item in request.session.items
+        if item.module is request.module
+        and item.originalname
+        == "test_astronomer_config_syncer_cronjob_default_schedule"
+    }
+    keys = [key for key in cron_render_requests if key in selected]
+    return dict(
+        zip(keys, render_chart_batch([cron_render_requests[key] for key in keys]))
+    )
+
 
 @pytest.mark.parametrize(
     "kube_version",
@@ -226,18 +257,12 @@ class TestAstronomerConfigSyncer:
         "test_data", cron_test_data, ids=[x[0] for x in cron_test_data]
     )
     def test_astronomer_config_syncer_cronjob_default_schedule(
-        self, test_data, kube_version
+        self, test_data, kube_version, cron_docs
     ):
         """Test that if no schedule is provided for configSyncer, helm
         automatically generates a random one."""
 
-        doc = render_chart(
-            name=test_data[0],
-            kube_version=kube_version,
-            show_only=[
-                "charts/astronomer/templates/config-syncer/config-syncer-cronjob.yaml",
-            ],
-        )[0]
+        doc = cron_docs[(test_data[0], kube_version)][0]
 
         cron_schedule = doc["spec"]["schedule"].split(" ")
         assert int(cron_schedule[0]) == test_data[1]
@@ -4,7 +4,8 @@ import pytest
 
 import tests.chart_tests as chart_tests
 from tests import get_containers_by_name
-from tests.chart_tests.helm_template_generator import render_chart
+from tests import supported_k8s_versions
+from tests.chart_tests.lazy_render import LazyRenderedDocs
 
 annotation_validator = re.compile(
     "^([^/]+/)?(([A-Za-z0-9][-A-Za-z0-9_.]*)?[A-Za-z0-9])$"
@@ -13,16 +14,12 @@ pod_managers = ["Deployment", "StatefulSet", "DaemonSet"]
 
 
 class TestAllCronJobs:
-    chart_values = chart_tests.get_all_features()
-
-    def test_ensure_cronjob_names_are_max_52_chars(self):
+    @pytest.mark.parametrize("kube_version", supported_k8s_versions)
+    def test_ensure_cronjob_names_are_max_52_chars(
+        self, all_features_docs, kube_version
+    ):
         """Cronjob names must be DNS_MAX_LEN - TIMESTAMP_LEN, which is 52 chars."""
-        default_docs = render_chart(values=self.chart_values)
-        cronjobs = [
-            doc for doc in default_docs if doc["kind"].lower() == "CronJob".lower()
-        ]
-
-        for doc in cronjobs:
+        for doc in all_features_docs[kube_version].kind("CronJob"):
             name_len = len(doc["metadata"]["name"])
             assert (
                 name_len <= 52
@@ -34,14 +31,11 @@ class TestAllPodSpecContainers:
 
     chart_values = chart_tests.get_all_features()
 
-    default_docs = render_chart(values=chart_values)
-    pod_manager_docs = [doc for doc in default_docs if doc["kind"] in pod_managers]
-    annotated = [x for x in default_docs if x["metadata"].get("annotations")]
+    default_docs = LazyRenderedDocs(values=chart_values)
 
     @pytest.mark.parametrize(
         "doc",
-        annotated,
-        ids=[f"{x['kind']}/{x['metadata']['name']}" for x in annotated],
+        default_docs.params(lambda entry: entry["annotations"]),
     )
     def test_annotation_keys_are_valid(self, doc):
         """Test that our annotation keys are valid."""
@@ -54,8 +48,7 @@ class TestAllPodSpecContainers:
 
     @pytest.mark.parametrize(
         "doc",
-        pod_manager_docs,
-        ids=[f"{x['kind']}/{x['metadata']['name']}" for x in pod_manager_docs],
+        default_docs.params(lambda entry: entry["kind"] in pod_managers),
     )
     def test_default_chart_with_basedomain(self, doc):
         """Test that each container in each pod spec renders and has some
@@ -72,7 +65,7 @@ class TestAllPodSpecContainers:
             assert "memory" in resources.get("requests")
 
     private_repo = "example.com/the-private-registry-repository"
-    private_repo_docs = render_chart(
+    private_repo_docs = LazyRenderedDocs(
         values={
             "global": {
                 "privateRegistry": {
@@ -82,14 +75,10 @@ class TestAllPodSpecContainers:
             }
         },
     )
-    private_repo_docs_trimmed = [
-        doc for doc in private_repo_docs if doc["kind"] in pod_managers
-    ]
 
     @pytest.mark.parametrize(
         "doc",
-        private_repo_docs_trimmed,
-        ids=[f"{x['kind']}/{x['metadata']['name']}" for x in private_repo_docs_trimmed],
+        private_repo_docs.params(lambda entry: entry["kind"] in pod_managers),
     )
     def test_all_default_charts_with_private_registry(self, doc):
         """Test that each chart uses the privateRegistry.
@@ -112,10 +101,7 @@ class TestDuplicateEnvironment:
     """Parametrize all the docs that have container specs and test them for
     duplicate env vars."""
 
-    values = chart_tests.get_all_features()
-
-    docs = render_chart(values=values)
-    trimmed_docs = [x for x in docs if x["kind"] in pod_managers + ["CronJob"]]
+    docs = LazyRenderedDocs(values=chart_tests.get_all_features())
 
     @staticmethod
     def check_env_vars_are_unique(container):
@@ -125,8 +111,7 @@ class TestDuplicateEnvironment:
 
     @pytest.mark.parametrize(
         "doc",
-        trimmed_docs,
-        ids=[f"{x['kind']}/{x['metadata']['name']}" for x in trimmed_docs],
+        docs.params(lambda entry: entry["kind"] in pod_managers + ["CronJob"]),
     )
     def test_env_vars_have_no_duplicates(self, doc):
         """Test that there are no duplicate env vars."""
@@ -0,0 +1,72 @@
+from tests.chart_tests.dependency_graph import DependencyGraph
+from tests.chart_tests.dependency_graph import values_diff
+
+chart_files = {
+    "values.yaml": "global:\n  a: 1\nsub:\n  b: 2\n",
+    "templates/_helpers.tpl": '{{- define "top.name" -}}{{ .Values.global.a }}{{- end }}',
+    "templates/top.yaml": '{{ include "top.name" . }}',
+    "charts/sub/values.yaml": "b: 1\nc: 1\n",
+    "charts/sub/templates/_helpers.tpl": '{{- define "sub.name" -}}x{{- end }}',
+    "charts/sub/templates/b.yaml": '{{ include "sub.name" . }}{{ .Values.b }}',
+    "charts/sub/templates/d.yaml": '{{ include (print $.Template.BasePath "/b.yaml") . }}',
+    "tests/chart_tests/test_d.py": 'render_chart(show_only=["charts/sub/templates/d.yaml"])',
+    "charts/sub/templates/c.yaml": '{{ .Values.c }}{{ .Files.Get "files/c.conf" }}',
+    "tests/chart_tests/test_top.py": 'render_chart(show_only=["templates/top.yaml"])',
+    "tests/chart_tests/test_b.py": 'render_chart(show_only=["charts/sub/templates/b.yaml"])',
+    "tests/chart_tests/test_c.py": 'render_chart(show_only=[f"charts/{name}/templates/c.yaml"])',
+    "tests/chart_tests/test_all.py": "def test_all(all_features_docs): pass",
+    "tests/chart_tests/test_unit.py": "def test_unit(): pass",
+}
+
+
+def make_graph(tmp_path, old_values):
+    for name, content in chart_files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+    graph = DependencyGraph(tmp_path)
+    graph.read_at = lambda path, ref: old_values.get(path, "")
+    return graph
+
+
+def test_dependency_graph_selects_tests_through_includes(tmp_path):
+    graph = make_graph(tmp_path, {})
+
+    assert graph.select(["charts/sub/templates/_helpers.tpl"]) == [
+        "tests/chart_tests/test_all.py",
+        "tests/chart_tests/test_b.py",
+        "tests/chart_tests/test_d.py",
+    ]
+    assert graph.select(["charts/sub/files/c.conf"]) == [
+        "tests/chart_tests/test_all.py",
+        "tests/chart_tests/test_c.py",
+    ]
+    assert graph.select(["tests/chart_tests/test_unit.py", "README.md"]) == [
+        "tests/chart_tests/test_unit.py"
+    ]
+    assert len(graph.select(["tests/chart_tests/helm_template_generator.py"])) == 6
+
+
+def test_dependency_graph_selects_tests_by_values(tmp_path):
+    graph = make_graph(
+        tmp_path,
+        {
+            "values.yaml": "global:\n  a: 0\nsub:\n  b: 2\n",
+            "charts/sub/values.yaml": "b: 1\nc: 0\n",
+        },
+    )
+
+    # global.a is used by the top level helper that top.yaml includes.
+    assert graph.select(["values.yaml"]) == [
+        "tests/chart_tests/test_all.py",
+        "tests/chart_tests/test_top.py",
+    ]
+    assert graph.select(["charts/sub/values.yaml"]) == [
+        "tests/chart_tests/test_all.py",
+        "tests/chart_tests/test_c.py",
+    ]
+
+
+def test_values_diff():
+    old = {"a": {"b": 1, "c": [1]}, "d": 1}
+    new = {"a": {"b": 1, "c": [2]}, "e": {"f": 1}}
+    assert values_diff(old, new) == {("a", "c"), ("d",), ("e",)}
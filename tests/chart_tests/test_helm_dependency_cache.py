@@ -0,0 +1,85 @@
+import pytest
+import yaml
+
+from tests import git_root_dir
+from tests.chart_tests.helm_dependency_cache import DependencyCache
+from tests.chart_tests.helm_dependency_cache import DependencyError
+from tests.chart_tests.helm_dependency_cache import dependency_keys
+from tests.chart_tests.helm_dependency_cache import dependency_state
+from tests.chart_tests.helm_dependency_cache import ensure_dependencies
+
+
+def make_chart(path, dependencies):
+    path.mkdir(parents=True)
+    chart = {"apiVersion": "v2", "name": path.name, "version": "0.1.0"}
+    (path / "Chart.yaml").write_text(yaml.safe_dump({**chart, **dependencies}))
+    return path
+
+
+@pytest.fixture
+def chart(tmp_path):
+    chart = make_chart(
+        tmp_path / "chart",
+        {
+            "dependencies": [
+                {"name": "local", "version": "0.1.0"},
+                {
+                    "name": "redis",
+                    "version": "1.0.0",
+                    "repository": "https://x.invalid",
+                },
+            ]
+        },
+    )
+    make_chart(
+        chart / "charts" / "local",
+        {
+            "dependencies": [
+                {"name": "nginx", "version": "2.0.0", "repository": "oci://x.invalid"},
+            ]
+        },
+    )
+    return chart
+
+
+def test_repo_charts_have_no_remote_dependencies():
+    assert dependency_keys(git_root_dir) == {}
+
+
+def test_keys_follow_dependency_declarations(chart):
+    keys = dependency_keys(chart)
+    assert sorted(keys) == [".", "charts/local"]
+
+    (chart / "Chart.lock").write_text("digest: sha256:abc\n")
+    assert dependency_keys(chart)["."] != keys["."]
+    assert dependency_keys(chart)["charts/local"] == keys["charts/local"]
+
+
+def test_restores_from_cache_and_vendored_tarball(chart, tmp_path, monkeypatch):
+    keys = dependency_keys(chart)
+    archive = tmp_path / "redis-1.0.0.tgz"
+    archive.write_bytes(b"redis")
+    seeded = DependencyCache(tmp_path / "seeded")
+    seeded.store(keys["."], [archive])
+    seeded.store(keys["charts/local"], [])
+
+    dependency_cache = DependencyCache(tmp_path / "cache")
+    with pytest.raises(DependencyError):
+        ensure_dependencies(chart, dependency_cache, allow_fetch=False)
+
+    vendored = tmp_path / "vendored.tar.gz"
+    seeded.vendor(list(keys.values()), vendored)
+    monkeypatch.setenv("CHART_TESTS_HELM_DEPENDENCIES", str(vendored))
+    assert ensure_dependencies(chart, dependency_cache, allow_fetch=False) == keys
+    assert (chart / "charts" / "redis-1.0.0.tgz").read_bytes() == b"redis"
+    state = dependency_state(str(chart))
+
+    # Once cached, the vendored tarball is not needed.
+    vendored.unlink()
+    (chart / "charts" / "redis-1.0.0.tgz").unlink()
+    assert ensure_dependencies(chart, dependency_cache, allow_fetch=False) == keys
+    assert (chart / "charts" / "redis-1.0.0.tgz").read_bytes() == b"redis"
+
+    (chart / "charts" / "redis-1.0.0.tgz").write_bytes(b"changed")
+    dependency_state.cache_clear()
+    assert dependency_state(str(chart)) != state
@@ -0,0 +1,79 @@
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from tests.chart_tests.helm_unittest_validator import junit_report
+from tests.chart_tests.helm_unittest_validator import unittest_files
+from tests.chart_tests.helm_unittest_validator import validate
+
+unittest_file = """
+suite: demo
+templates:
+  - configmap.yaml
+  - missing.yaml
+tests:
+  - it: renders when enabled
+    set:
+      configmap.enabled: true
+  - it: renders nothing when disabled
+    template: configmap.yaml
+  - it: needs a value
+    template: required.yaml
+---
+suite: off
+tests:
+  - it: is empty
+    template: disabled.yaml
+"""
+
+
+@pytest.fixture
+def chart_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHART_TESTS_RENDER_CACHE", "0")
+    chart = tmp_path / "charts" / "demo"
+    (chart / "templates").mkdir(parents=True)
+    (chart / "tests").mkdir()
+    (chart / "Chart.yaml").write_text("apiVersion: v2\nname: demo\nversion: 0.1.0\n")
+    (chart / "values.yaml").write_text("configmap:\n  enabled: false\n")
+    (chart / "templates" / "configmap.yaml").write_text(
+        "{{- if .Values.configmap.enabled }}\n"
+        "apiVersion: v1\nkind: ConfigMap\nmetadata:\n  name: demo\n"
+        "{{- end }}\n"
+    )
+    (chart / "templates" / "required.yaml").write_text(
+        'value: {{ required "needed is required" .Values.needed }}\n'
+    )
+    (chart / "templates" / "disabled.yaml").write_text("{{- if false }}\n{{- end }}\n")
+    (chart / "tests" / "demo_test.yaml").write_text(unittest_file)
+    (chart / "tests" / "broken_test.yaml").write_text("suite: [\n")
+    return tmp_path
+
+
+def test_validate(chart_root):
+    files = unittest_files(chart_root)
+    checks = {
+        (check.file.split("/")[-1], check.template): check
+        for check in validate(files, root=chart_root, max_workers=2)
+    }
+
+    assert checks[("demo_test.yaml", "configmap.yaml")].status == "ok"
+    assert checks[("demo_test.yaml", "configmap.yaml")].tests == [
+        "demo / renders when enabled",
+        "demo / renders nothing when disabled",
+    ]
+    assert checks[("demo_test.yaml", "missing.yaml")].status == "missing"
+    required = checks[("demo_test.yaml", "required.yaml")]
+    assert required.status == "error"
+    assert "needed is required" in required.message
+    assert checks[("demo_test.yaml", "disabled.yaml")].status == "empty"
+    assert checks[("broken_test.yaml", "")].status == "error"
+    assert [key for key, check in checks.items() if check.failed] == [
+        ("broken_test.yaml", ""),
+        ("demo_test.yaml", "missing.yaml"),
+        ("demo_test.yaml", "required.yaml"),
+    ]
+
+    report = ElementTree.fromstring(junit_report(list(checks.values())))
+    suites = {s.get("name").split("/")[-1]: s for s in report}
+    assert suites["demo_test.yaml"].get("failures") == "2"
+    assert suites["demo_test.yaml"].get("skipped") == "1"
@@ -0,0 +1,55 @@
+from tests.image_extractor import configured_images
+from tests.image_extractor import manifest_images
+
+
+def test_manifest_images():
+    docs = [
+        {
+            "kind": "Deployment",
+            "spec": {
+                "template": {
+                    "spec": {
+                        "initContainers": [{"name": "wait", "image": "busybox:1"}],
+                        "containers": [
+                            {"name": "app", "image": "quay.io/astronomer/app:1"},
+                            {"name": "sidecar", "image": "quay.io/astronomer/proxy:2"},
+                        ],
+                    }
+                }
+            },
+        },
+        {
+            "kind": "CronJob",
+            "spec": {
+                "jobTemplate": {
+                    "spec": {
+                        "template": {
+                            "spec": {
+                                "containers": [{"name": "job", "image": "busybox:1"}]
+                            }
+                        }
+                    }
+                }
+            },
+        },
+        {"kind": "Service", "spec": {}},
+    ]
+    assert manifest_images(docs) == [
+        "busybox:1",
+        "quay.io/astronomer/app:1",
+        "quay.io/astronomer/proxy:2",
+    ]
+
+
+def test_configured_images():
+    docs = [
+        {
+            "kind": "ConfigMap",
+            "data": {
+                "production.yaml": "deployments:\n  loggingSidecar:\n    image: quay.io/astronomer/ap-vector:1\n",
+                "nginx.conf": "image: {{ not yaml",
+            },
+        },
+        {"kind": "Secret", "data": {"config": "image: ignored"}},
+    ]
+    assert configured_images(docs) == {"quay.io/astronomer/ap-vector:1"}
@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from tests.chart_tests.image_verifier import DigestCache
+from tests.chart_tests.image_verifier import ImageReference
+from tests.chart_tests.image_verifier import ImageVerifier
+from tests.chart_tests.image_verifier import RegistryClient
+from tests.chart_tests.image_verifier import parse_image
+
+
+class Registry(BaseHTTPRequestHandler):
+    """A registry stand-in that serves the digests in manifests, asks for a
+    bearer token, and fails the first request for flaky/ images."""
+
+    manifests = {
+        "library/alpine:3.16": "sha256:alpine",
+        "astronomer/ap-houston-api:1.0.0": "sha256:houston",
+        "flaky/image:1": "sha256:flaky",
+    }
+    # Manifests that GET requests return, by path.
+    documents = {
+        "/v2/multi/image/manifests/1": {
+            "manifests": [
+                {
+                    "digest": "sha256:arm",
+                    "platform": {"os": "linux", "architecture": "arm64"},
+                },
+                {
+                    "digest": "sha256:amd",
+                    "platform": {"os": "linux", "architecture": "amd64"},
+                },
+            ]
+        },
+        "/v2/multi/image/manifests/sha256:amd": {
+            "config": {"size": 5},
+            "layers": [{"size": 100}, {"size": 20}],
+        },
+    }
+    requests: list = []
+    failed: set = set()
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.requests.append(self.path)
+        if self.path.startswith("/token"):
+            return
+        if self.headers.get("Authorization") != "Bearer secret":
+            self.send_response(401)
+            host = self.headers["Host"]
+            self.send_header(
+                "WWW-Authenticate",
+                f'Bearer realm="http://{host}/token",service="registry",scope="pull"',
+            )
+            self.end_headers()
+            return
+        repository, _, reference = self.path[4:].rpartition("/manifests/")
+        if repository.startswith("flaky/") and repository not in self.failed:
+            self.failed.add(repository)
+            self.send_response(503)
+            self.end_headers()
+            return
+        digest = self.manifests.get(f"{repository}:{reference}")
+        self.send_response(200 if digest else 404)
+        if digest:
+            self.send_header("Docker-Content-Digest", digest)
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        body = json.dumps(self.documents.get(self.path, {"token": "secret"}))
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def registry():
+    Registry.requests, Registry.failed = [], set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Registry)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize(
+    "image,expected",
+    [
+        ("alpine", ImageReference("docker.io", "library/alpine")),
+        (
+            "quay.io/astronomer/ap-houston-api:1.0.0",
+            ImageReference("quay.io", "astronomer/ap-houston-api", "1.0.0"),
+        ),
+        (
+            "localhost:5000/foo/bar@sha256:abc",
+            ImageReference("localhost:5000", "foo/bar", digest="sha256:abc"),
+        ),
+        (
+            "bitnami/redis:6",
+            ImageReference("docker.io", "bitnami/redis", "6"),
+        ),
+    ],
+)
+def test_parse_image(image, expected):
+    assert parse_image(image) == expected
+
+
+def test_verify_reports_every_failure_and_caches_digests(registry, tmp_path):
+    images = [
+        f"{registry}/library/alpine:3.16",
+        f"{registry}/astronomer/ap-houston-api:1.0.0",
+        f"{registry}/astronomer/ap-houston-api:0.0.0",
+        f"{registry}/astronomer/missing:1",
+        f"{registry}/flaky/image:1",
+    ]
+    client = RegistryClient(insecure_registries=(registry,), backoff=0)
+    cache = DigestCache(tmp_path / "digests.json", ttl=60)
+    results = ImageVerifier(client, cache).verify(images + images[:1])
+
+    assert [r.image for r in results] == sorted(images)
+    digests = {r.image: r.digest for r in results}
+    assert digests[f"{registry}/library/alpine:3.16"] == "sha256:alpine"
+    assert digests[f"{registry}/flaky/image:1"] == "sha256:flaky"
+    errors = sorted(r.image for r in results if r.error)
+    assert errors == [
+        f"{registry}/astronomer/ap-houston-api:0.0.0",
+        f"{registry}/astronomer/missing:1",
+    ]
+    # One token for the whole run.
+    assert len([p for p in Registry.requests if p.startswith("/token")]) == 1
+
+    Registry.requests.clear()
+    results = ImageVerifier(client, DigestCache(tmp_path / "digests.json")).verify(
+        images
+    )
+    assert [r.image for r in results if r.cached] == sorted(set(images) - set(errors))
+    assert {p.rpartition("/manifests/")[0] for p in Registry.requests} == {
+        "/v2/astronomer/ap-houston-api",
+        "/v2/astronomer/missing",
+    }
+
+    Registry.requests.clear()
+    expired = DigestCache(tmp_path / "digests.json", ttl=0)
+    time.sleep(0.01)
+    ImageVerifier(client, expired).verify(images[:1])
+    assert Registry.requests
+
+
+def test_image_size(registry):
+    client = RegistryClient(insecure_registries=(registry,), backoff=0)
+    assert client.image_size(f"{registry}/multi/image:1") == 125
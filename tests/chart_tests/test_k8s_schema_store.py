@@ -0,0 +1,38 @@
+import pytest
+import requests
+
+from tests.chart_tests import k8s_schema_store
+from tests.chart_tests.k8s_schema_store import SchemaNotFoundError
+from tests.chart_tests.k8s_schema_store import SchemaStore
+
+
+def test_schema_store_keeps_downloads_out_of_the_store(tmp_path, monkeypatch):
+    store = SchemaStore(tmp_path / "store", tmp_path / "downloads")
+    store.put("v1", "ConfigMap", "1.25.0", {"type": "object"})
+    monkeypatch.setattr(
+        k8s_schema_store, "fetch_schema", lambda *args: {"type": "string"}
+    )
+
+    assert store.get_or_fetch("v1", "ConfigMap", "1.25.0") == {"type": "object"}
+    assert store.get_or_fetch("apps/v1", "Deployment", "1.25.0") == {"type": "string"}
+    assert (
+        store.get("apps/v1", "Deployment", "1.25.0", include_downloaded=False) is None
+    )
+    assert [path.name for path in (tmp_path / "store").rglob("*.gz")] == [
+        "configmap-v1.json.gz"
+    ]
+
+
+def test_schema_store_missing_schema_says_to_sync(tmp_path, monkeypatch):
+    store = SchemaStore(tmp_path / "store", tmp_path / "downloads")
+
+    def fetch_schema(*args):
+        raise requests.ConnectionError("no network")
+
+    monkeypatch.setattr(k8s_schema_store, "fetch_schema", fetch_schema)
+    with pytest.raises(SchemaNotFoundError, match="Run bin/sync-k8s-schemas"):
+        store.get_or_fetch("v1", "ConfigMap", "1.25.0")
+
+    monkeypatch.setenv("CHART_TESTS_OFFLINE", "1")
+    with pytest.raises(SchemaNotFoundError, match="CHART_TESTS_OFFLINE is set"):
+        store.get_or_fetch("v1", "ConfigMap", "1.25.0")
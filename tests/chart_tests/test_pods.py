@@ -1,47 +1,32 @@
-import jmespath
 import pytest
 
 import tests.chart_tests as chart_tests
-from tests.chart_tests.helm_template_generator import render_chart
+from tests.chart_tests.lazy_render import LazyRenderedDocs
+from tests.chart_tests.rendered_manifest import search
 
 
-def init_test_pod_labels_configs():
-    chart_values = chart_tests.get_all_features()
+pod_labels_paths = {
+    "StatefulSet": "spec.template.metadata.labels",
+    "Deployment": "spec.template.metadata.labels",
+    "CronJob": "spec.jobTemplate.spec.template.metadata.labels",
+    "Job": "spec.template.metadata.labels",
+    "DaemonSet": "spec.template.metadata.labels",
+    "Pod": "metadata.labels",
+}
 
-    kubernetes_objects = {
-        "StatefulSet": "spec.template.metadata.labels",
-        "Deployment": "spec.template.metadata.labels",
-        "CronJob": "spec.jobTemplate.spec.template.metadata.labels",
-        "Job": "spec.template.metadata.labels",
-        "DaemonSet": "spec.template.metadata.labels",
-        "Pod": "metadata.labels",
-    }
-
-    docs = render_chart(values=chart_values)
-
-    pod_docs = []
-    for key, val in kubernetes_objects.items():
-        pod_docs += jmespath.search(
-            "[?kind == `%s`].{name: metadata.name, kind: kind, chart: metadata.labels.chart, labels: %s}"
-            % (key, val),
-            docs,
-        )
-
-    return {
-        f'{doc["chart"]}_{doc["kind"]}_{doc["name"]}': doc["labels"] for doc in pod_docs
-    }
-
-
-test_pod_labels_configs_data = init_test_pod_labels_configs()
+all_features_docs = LazyRenderedDocs(values=chart_tests.get_all_features())
 
 
 @pytest.mark.parametrize(
-    "pod_labels",
-    test_pod_labels_configs_data.values(),
-    ids=test_pod_labels_configs_data.keys(),
+    "doc",
+    all_features_docs.params(
+        lambda entry: entry["kind"] in pod_labels_paths,
+        id=lambda entry: f'{entry["labels"].get("chart")}_{entry["kind"]}_{entry["name"]}',
+    ),
 )
-def test_pod_labels_configs(pod_labels):
+def test_pod_labels_configs(doc):
     """Labels check for definition."""
+    pod_labels = search(pod_labels_paths[doc["kind"]], doc)
     assert pod_labels is not None
     assert "app" in pod_labels
     assert "version" in pod_labels
@@ -50,19 +50,14 @@ def test_private_registry_repository_image_names_the_same_as_public_ones():
     assert not differently_named_images, differently_named_images
 
 
-def test_private_registry_repository_overrides_work():
+def test_private_registry_repository_overrides_work(private_registry_docs):
     """image names should always contain the new repository when it is
     specified."""
     repository = "bob-the-registry"
-    docs = render_chart(
-        values={
-            "global": {"privateRegistry": {"enabled": True, "repository": repository}}
-        },
-    )
     # there should be lots of image hits
-    assert len(docs) > 50
+    assert len(private_registry_docs) > 50
     differently_named_images = []
-    for doc in docs:
+    for doc in private_registry_docs:
         doc_images = jmespath.search("spec.template.spec.containers[*].image", doc)
         if doc_images is not None:
             for image in doc_images:
@@ -51,8 +51,13 @@ class TestPrometheusAlertConfigmap:
         assert doc["apiVersion"] == "v1"
         assert doc["metadata"]["name"] == "release-name-prometheus-alerts"
 
-        # Validate the contents of an embedded yaml doc
-        groups = yaml.safe_load(doc["data"]["alerts"])["groups"]
+        # Validate the contents of the embedded yaml docs
+        assert sorted(doc["data"]) == ["alerts", "platform"]
+        groups = [
+            group
+            for rules in doc["data"].values()
+            for group in yaml.safe_load(rules)["groups"]
+        ]
         for group in groups:
             assert isinstance(group.get("name"), str)
             assert isinstance(group.get("rules"), list)
@@ -96,11 +101,81 @@ class TestPrometheusAlertConfigmap:
         )
 
         config_yaml = docs[0]["data"]["alerts"]
+        platform_yaml = docs[0]["data"]["platform"]
         assert re.search(
             r'.*The Astronomer Helm release foo-name is failing task instances "{{ printf \\"%.2f\\" \$value }}\%" of the time over the past 30 minutes.*',
             config_yaml,
         )
         assert re.search(
             r".*If more than 2 Airflow Schedulers are not heartbeating for more than 5 minutes, this alarm fires..*",
-            config_yaml,
+            platform_yaml,
+        )
+
+    def test_prometheus_alerts_use_airflow_recording_rules(self, kube_version):
+        """Alerts on airflow aggregates query the airflow-recording.rules
+        and platform-recording.rules groups, whose interval, operator regex
+        and extra rules are configurable."""
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only,
+            values={
+                "prometheus": {
+                    "recordingRules": {
+                        "interval": "2m",
+                        "operatorRegex": "BashOperator|PythonOperator",
+                        "additional": "- record: deployment:airflow_scheduler_tasks_pending:max\n  expr: max by (deployment) (airflow_scheduler_tasks_pending)\n",
+                    }
+                }
+            },
+        )
+
+        groups = {
+            group["name"]: group
+            for rules in docs[0]["data"].values()
+            for group in yaml.safe_load(rules)["groups"]
+        }
+        records = {}
+        for name in ("airflow-recording.rules", "platform-recording.rules"):
+            assert groups[name]["interval"] == "2m"
+            records.update(
+                {rule["record"]: rule["expr"] for rule in groups[name]["rules"]}
+            )
+        assert (
+            records["deployment:airflow_scheduler_tasks_pending:max"]
+            == "max by (deployment) (airflow_scheduler_tasks_pending)"
         )
+        assert (
+            'airflow_operator_failures{operator=~"BashOperator|PythonOperator"}'
+            in records["deployment_operator:airflow_operator_failures:increase1h"]
+        )
+
+        alerts = {
+            rule["alert"]: rule["expr"]
+            for group in groups.values()
+            for rule in group["rules"]
+            if "alert" in rule
+        }
+        assert (
+            alerts["AirflowOperatorFailureRate"]
+            == "100 * operator:airflow_operator_failures:ratio1h > 50"
+        )
+        for alert in [
+            "AirflowDeploymentUnhealthy",
+            "AirflowSchedulerUnhealthy",
+            "AirflowPodQuota",
+            "AirflowOperatorFailureRate",
+            "ManyUnhealthySchedulers",
+            "SchedulersNotHealthy",
+        ]:
+            used = set(re.findall(r"\w+(?::\w+)+", alerts[alert]))
+            assert used and used <= set(records), alert
+
+    def test_prometheus_platform_rules_only_read_recorded_series(self, kube_version):
+        """The platform rules aggregate over every deployment, so with
+        sharding they run on the federating Prometheus, which only has the
+        recorded series by default."""
+        docs = render_chart(kube_version=kube_version, show_only=self.show_only)
+        for group in yaml.safe_load(docs[0]["data"]["platform"])["groups"]:
+            for rule in group["rules"]:
+                names = [t for t in re.findall(r"[\w:]+", rule["expr"]) if "_" in t]
+                assert names and all(":" in name for name in names), rule
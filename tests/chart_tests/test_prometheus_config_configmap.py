@@ -218,3 +218,87 @@ class TestPrometheusConfigConfigmap:
         )
         assert "regex" not in metric_relabel_config_search_result[0]
         assert "replacement" not in metric_relabel_config_search_result[0]
+
+    def test_prometheus_config_scrape_limits(self, kube_version):
+        """Scrape limits are set per job, on top of the defaults for every
+        job, and no job has a limit by default."""
+        doc = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only,
+        )[0]
+        jobs = {
+            job["job_name"]: job
+            for job in yaml.safe_load(doc["data"]["config"])["scrape_configs"]
+        }
+        for job in jobs.values():
+            assert not {"sample_limit", "label_limit", "target_limit"} & set(job)
+
+        doc = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only,
+            values={
+                "global": {"blackboxExporterEnabled": True},
+                "prometheus": {
+                    "scrapeLimits": {
+                        "default": {"target_limit": 100, "label_limit": 30},
+                        "jobs": {
+                            "airflow": {
+                                "sample_limit": 2000000,
+                                "label_limit": 64,
+                                "target_limit": 0,
+                            },
+                            "blackbox HTTP": {"sample_limit": 500},
+                        },
+                    }
+                },
+            },
+        )[0]
+        jobs = {
+            job["job_name"]: job
+            for job in yaml.safe_load(doc["data"]["config"])["scrape_configs"]
+        }
+        assert {
+            key: jobs["airflow"][key]
+            for key in ("sample_limit", "label_limit", "target_limit")
+        } == {"sample_limit": 2000000, "label_limit": 64, "target_limit": 0}
+        assert jobs["blackbox HTTP"]["sample_limit"] == 500
+        assert jobs["blackbox HTTP"]["label_limit"] == 30
+        for job in jobs.values():
+            assert "target_limit" in job
+
+    def test_prometheus_config_airflow_metrics_allow_list(self, kube_version):
+        """With an allow list, the airflow job keeps only the allowed
+        metrics instead of dropping a fixed list of them."""
+
+        def airflow_metric_relabel_configs(values):
+            doc = render_chart(
+                kube_version=kube_version,
+                show_only=self.show_only,
+                values=values,
+            )[0]
+            config = yaml.safe_load(doc["data"]["config"])
+            return jmespath.search(
+                "scrape_configs[?job_name == 'airflow'].metric_relabel_configs | [0]",
+                config,
+            )
+
+        default = airflow_metric_relabel_configs({})
+        assert {rule.get("action") for rule in default[1:]} == {"drop"}
+
+        allowed = airflow_metric_relabel_configs(
+            {
+                "prometheus": {
+                    "airflowMetrics": {
+                        "allowList": ["airflow_scheduler_.*", "airflow_ti_.*"]
+                    }
+                }
+            }
+        )
+        assert allowed[0]["target_label"] == "deployment"
+        assert allowed[1:] == [
+            {
+                "source_labels": ["__name__"],
+                "regex": "airflow_scheduler_.*|airflow_ti_.*",
+                "action": "keep",
+            }
+        ]
@@ -0,0 +1,160 @@
+from tests.chart_tests.helm_template_generator import render_chart
+import pytest
+from tests import supported_k8s_versions, get_containers_by_name
+import yaml
+
+recorded_series_only = {
+    "source_labels": ["__name__"],
+    "regex": ".+:.+",
+    "action": "keep",
+}
+longterm_templates = [
+    "charts/prometheus/templates/prometheus-longterm-configmap.yaml",
+    "charts/prometheus/templates/prometheus-longterm-networkpolicy.yaml",
+    "charts/prometheus/templates/prometheus-longterm-service.yaml",
+    "charts/prometheus/templates/prometheus-longterm-statefulset.yaml",
+]
+
+
+def remote_write(docs):
+    config_map = next(
+        doc for doc in docs if doc["metadata"]["name"].endswith("-prometheus-config")
+    )
+    return yaml.safe_load(config_map["data"]["config"]).get("remote_write")
+
+
+@pytest.mark.parametrize(
+    "kube_version",
+    supported_k8s_versions,
+)
+class TestPrometheusRemoteWrite:
+    show_only = ["charts/prometheus/templates/prometheus-config-configmap.yaml"]
+
+    def test_prometheus_remote_write_disabled_by_default(self, kube_version):
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only + longterm_templates,
+        )
+        assert len(docs) == 1
+        assert remote_write(docs) is None
+
+    def test_prometheus_remote_write_endpoints(self, kube_version):
+        """Endpoints get the default queue_config with their overrides, and
+        write_relabel_configs that keep only recorded series when asked."""
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only,
+            values={
+                "prometheus": {
+                    "remote_write": [{"url": "http://legacy/write"}],
+                    "remoteWrite": {
+                        "queueConfig": {"capacity": 5000},
+                        "endpoints": [
+                            {
+                                "name": "capacity-planning",
+                                "url": "https://a.example.com/write",
+                                "recordedSeriesOnly": True,
+                                "queueConfig": {"max_shards": 10},
+                                "writeRelabelConfigs": [
+                                    {
+                                        "source_labels": ["__name__"],
+                                        "regex": "operator:.*",
+                                        "action": "drop",
+                                    }
+                                ],
+                                "extra": {"remote_timeout": "1m"},
+                            },
+                            {"url": "https://b.example.com/write"},
+                        ],
+                    },
+                }
+            },
+        )
+
+        legacy, capacity_planning, other = remote_write(docs)
+        assert legacy == {"url": "http://legacy/write"}
+        assert capacity_planning == {
+            "name": "capacity-planning",
+            "url": "https://a.example.com/write",
+            "remote_timeout": "1m",
+            "queue_config": {
+                "capacity": 5000,
+                "min_shards": 1,
+                "max_shards": 10,
+                "max_samples_per_send": 2000,
+                "batch_send_deadline": "5s",
+            },
+            "write_relabel_configs": [
+                recorded_series_only,
+                {
+                    "source_labels": ["__name__"],
+                    "regex": "operator:.*",
+                    "action": "drop",
+                },
+            ],
+        }
+        assert other["queue_config"]["max_shards"] == 50
+        assert "write_relabel_configs" not in other
+
+    def test_prometheus_long_term_store(self, kube_version):
+        """The bundled long-term store receives the recorded series."""
+        docs = render_chart(
+            name="foo",
+            namespace="bar",
+            kube_version=kube_version,
+            show_only=self.show_only + longterm_templates,
+            values={
+                "global": {"networkPolicy": {"enabled": True}},
+                "prometheus": {"remoteWrite": {"longTermStore": {"enabled": True}}},
+            },
+        )
+        by_kind = {doc["kind"]: doc for doc in docs}
+        assert set(by_kind) == {"ConfigMap", "NetworkPolicy", "Service", "StatefulSet"}
+
+        assert remote_write(docs)[-1] == {
+            "name": "long-term-store",
+            "url": "http://foo-prometheus-longterm.bar:9090/api/v1/write",
+            "queue_config": {
+                "capacity": 10000,
+                "min_shards": 1,
+                "max_shards": 50,
+                "max_samples_per_send": 2000,
+                "batch_send_deadline": "5s",
+            },
+            "write_relabel_configs": [recorded_series_only],
+        }
+        assert by_kind["Service"]["metadata"]["name"] == "foo-prometheus-longterm"
+        sts = by_kind["StatefulSet"]
+        args = get_containers_by_name(sts)["prometheus"]["args"]
+        assert "--web.enable-remote-write-receiver" in args
+        assert "--storage.tsdb.retention.time=395d" in args
+        assert (
+            sts["spec"]["volumeClaimTemplates"][0]["spec"]["resources"]["requests"][
+                "storage"
+            ]
+            == "50Gi"
+        )
+
+    def test_prometheus_long_term_store_url(self, kube_version):
+        """With a url, the long-term store is not deployed and Prometheus
+        writes to that url instead, eg to a stand-in."""
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=self.show_only + longterm_templates,
+            values={
+                "prometheus": {
+                    "remoteWrite": {
+                        "longTermStore": {
+                            "enabled": True,
+                            "url": "http://stand-in:8080/write",
+                            "remoteWrite": {"queueConfig": {"capacity": 100}},
+                        }
+                    }
+                }
+            },
+        )
+        assert len(docs) == 1
+        (endpoint,) = remote_write(docs)
+        assert endpoint["url"] == "http://stand-in:8080/write"
+        assert endpoint["queue_config"]["capacity"] == 100
+        assert endpoint["write_relabel_configs"] == [recorded_series_only]
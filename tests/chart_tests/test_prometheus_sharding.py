@@ -0,0 +1,231 @@
+from tests.chart_tests.helm_template_generator import render_chart
+import pytest
+from tests import supported_k8s_versions, get_containers_by_name
+import yaml
+
+sharding_values = {
+    "global": {"nodeExporterEnabled": True, "networkPolicy": {"enabled": True}},
+    "prometheus": {
+        "sharding": {"enabled": True, "shards": 3},
+        "tsdb": {"outOfOrderTimeWindow": "30m"},
+    },
+}
+sharded_jobs = {"airflow", "node-exporter", "fluentd"}
+
+
+def hashmod_rules(job):
+    return [
+        rule
+        for rule in job.get("relabel_configs", [])
+        if rule.get("action") == "hashmod"
+        or rule.get("source_labels") == ["__tmp_hashmod"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "kube_version",
+    supported_k8s_versions,
+)
+class TestPrometheusSharding:
+    def test_prometheus_sharding_disabled_by_default(self, kube_version):
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=[
+                "charts/prometheus/templates/prometheus-config-configmap.yaml",
+                "charts/prometheus/templates/prometheus-federation-config-configmap.yaml",
+                "charts/prometheus/templates/prometheus-federation-statefulset.yaml",
+            ],
+        )
+        assert len(docs) == 1
+        config = yaml.safe_load(docs[0]["data"]["config"])
+        assert not any(hashmod_rules(job) for job in config["scrape_configs"])
+        assert config["rule_files"] == ["/etc/prometheus/alerts.d/*.yaml"]
+
+        sts = render_chart(
+            kube_version=kube_version,
+            show_only=["charts/prometheus/templates/prometheus-statefulset.yaml"],
+        )[0]
+        alert_volume = next(
+            volume
+            for volume in sts["spec"]["template"]["spec"]["volumes"]
+            if volume["name"] == "alert-volume"
+        )
+        assert alert_volume["configMap"]["items"] == [
+            {"key": "alerts", "path": "alerts.yaml"},
+            {"key": "platform", "path": "platform.yaml"},
+        ]
+
+    def test_prometheus_shard_configs(self, kube_version):
+        """Each shard scrapes its hash of the targets of the sharded jobs,
+        only shard 0 scrapes the other jobs, and every shard evaluates the
+        per-deployment rules and sends its own alerts with a shard label."""
+        doc = render_chart(
+            kube_version=kube_version,
+            show_only=["charts/prometheus/templates/prometheus-config-configmap.yaml"],
+            values=sharding_values,
+        )[0]
+
+        assert sorted(doc["data"]) == ["config-0", "config-1", "config-2"]
+        job_names = {}
+        for shard in range(3):
+            config = yaml.safe_load(doc["data"][f"config-{shard}"])
+            assert config["global"]["external_labels"] == {"shard": str(shard)}
+            assert config["alerting"]["alertmanagers"]
+            assert config["rule_files"] == ["/etc/prometheus/alerts.d/*.yaml"]
+            assert config["storage"] == {"tsdb": {"out_of_order_time_window": "30m"}}
+            job_names[shard] = {job["job_name"] for job in config["scrape_configs"]}
+            for job in config["scrape_configs"]:
+                if job["job_name"] in sharded_jobs:
+                    assert job["relabel_configs"][-2:] == [
+                        {
+                            "source_labels": ["__address__"],
+                            "modulus": 3,
+                            "target_label": "__tmp_hashmod",
+                            "action": "hashmod",
+                        },
+                        {
+                            "source_labels": ["__tmp_hashmod"],
+                            "regex": f"^{shard}$",
+                            "action": "keep",
+                        },
+                    ]
+                else:
+                    assert not hashmod_rules(job)
+
+        assert job_names[1] == job_names[2] == sharded_jobs
+        assert sharded_jobs < job_names[0]
+        assert {"prometheus", "houston-api", "nats_server", "kube-state"} < job_names[0]
+
+    def test_prometheus_sharded_statefulset(self, kube_version):
+        doc = render_chart(
+            kube_version=kube_version,
+            show_only=["charts/prometheus/templates/prometheus-statefulset.yaml"],
+            values=sharding_values,
+        )[0]
+
+        assert doc["spec"]["replicas"] == 3
+        prometheus = get_containers_by_name(doc)["prometheus"]
+        assert prometheus["command"][:2] == ["/bin/sh", "-c"]
+        assert (
+            "--config.file=/etc/prometheus/config/prometheus-${HOSTNAME##*-}.yaml"
+            in prometheus["command"][2]
+        )
+        assert "--storage.tsdb.retention.time=1d" in prometheus["args"]
+        assert not any(arg.startswith("--config.file") for arg in prometheus["args"])
+        config_volume = next(
+            volume
+            for volume in doc["spec"]["template"]["spec"]["volumes"]
+            if volume["name"] == "prometheus-config-volume"
+        )
+        assert config_volume["configMap"]["items"] == [
+            {"key": f"config-{shard}", "path": f"prometheus-{shard}.yaml"}
+            for shard in range(3)
+        ]
+        alert_volume = next(
+            volume
+            for volume in doc["spec"]["template"]["spec"]["volumes"]
+            if volume["name"] == "alert-volume"
+        )
+        assert alert_volume["configMap"]["items"] == [
+            {"key": "alerts", "path": "alerts.yaml"}
+        ]
+
+    def test_prometheus_federation(self, kube_version):
+        """The federating Prometheus scrapes the recorded series of every
+        shard through its Service, evaluates the platform rules, and is what
+        the main Service selects."""
+        docs = render_chart(
+            name="foo",
+            namespace="bar",
+            kube_version=kube_version,
+            show_only=[
+                "charts/prometheus/templates/prometheus-federation-config-configmap.yaml",
+                "charts/prometheus/templates/prometheus-federation-statefulset.yaml",
+                "charts/prometheus/templates/prometheus-service.yaml",
+                "charts/prometheus/templates/prometheus-networkpolicy.yaml",
+            ],
+            values=sharding_values,
+        )
+        by_kind_name = {(doc["kind"], doc["metadata"]["name"]): doc for doc in docs}
+
+        config = yaml.safe_load(
+            by_kind_name[("ConfigMap", "foo-prometheus-federation-config")]["data"][
+                "config"
+            ]
+        )
+        assert config["rule_files"] == ["/etc/prometheus/alerts.d/*.yaml"]
+        assert config["alerting"]["alertmanagers"]
+        federate = next(
+            job for job in config["scrape_configs"] if job["job_name"] == "federate"
+        )
+        assert federate["honor_labels"] is True
+        assert federate["metrics_path"] == "/federate"
+        assert federate["params"] == {"match[]": ['{__name__=~".+:.+"}']}
+        assert federate["static_configs"][0]["targets"] == [
+            f"foo-prometheus-{shard}.bar:9090" for shard in range(3)
+        ]
+
+        sts = by_kind_name[("StatefulSet", "foo-prometheus-federation")]
+        labels = sts["spec"]["template"]["metadata"]["labels"]
+        assert labels["component"] == "prometheus-federation"
+        prometheus = get_containers_by_name(sts)["prometheus"]
+        assert "--storage.tsdb.retention.time=15d" in prometheus["args"]
+        alert_volume = next(
+            volume
+            for volume in sts["spec"]["template"]["spec"]["volumes"]
+            if volume["name"] == "alert-volume"
+        )
+        assert alert_volume["configMap"]["items"] == [
+            {"key": "platform", "path": "platform.yaml"}
+        ]
+
+        for shard in range(3):
+            assert ("Service", f"foo-prometheus-{shard}") in by_kind_name
+        service = by_kind_name[("Service", "foo-prometheus")]
+        assert service["spec"]["selector"]["component"] == "prometheus-federation"
+
+        policy = by_kind_name[("NetworkPolicy", "foo-prometheus-policy")]["spec"]
+        assert policy["podSelector"]["matchExpressions"][0]["values"] == [
+            "prometheus",
+            "prometheus-federation",
+        ]
+        assert {
+            "podSelector": {
+                "matchLabels": {
+                    "tier": "monitoring",
+                    "component": "prometheus-federation",
+                    "release": "foo",
+                }
+            }
+        } in policy["ingress"][0]["from"]
+
+    def test_prometheus_shards_remote_write(self, kube_version):
+        """The shards send their own series to remote_write, and the
+        federating Prometheus only sends the series it records itself."""
+        values = {
+            "prometheus": {
+                **sharding_values["prometheus"],
+                "remoteWrite": {"endpoints": [{"url": "http://remote/write"}]},
+            }
+        }
+        docs = render_chart(
+            kube_version=kube_version,
+            show_only=[
+                "charts/prometheus/templates/prometheus-config-configmap.yaml",
+                "charts/prometheus/templates/prometheus-federation-config-configmap.yaml",
+            ],
+            values=values,
+        )
+        shards, federation = docs
+        for shard in range(3):
+            config = yaml.safe_load(shards["data"][f"config-{shard}"])
+            assert [endpoint["url"] for endpoint in config["remote_write"]] == [
+                "http://remote/write"
+            ]
+        remote_write = yaml.safe_load(federation["data"]["config"])["remote_write"]
+        assert [endpoint["url"] for endpoint in remote_write] == ["http://remote/write"]
+        assert remote_write[0]["write_relabel_configs"][0] == {
+            "source_labels": ["shard"],
+            "regex": ".+",
+            "action": "drop",
+        }
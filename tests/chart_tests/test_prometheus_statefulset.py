@@ -1,5 +1,7 @@
 from tests.chart_tests.helm_template_generator import render_chart
 import pytest
+from subprocess import CalledProcessError
+import yaml
 from tests import supported_k8s_versions, get_containers_by_name
 
 
@@ -123,3 +125,121 @@ class TestPrometheusStatefulset:
             "--enable-feature=remote-write-receiver" in c_by_name["prometheus"]["args"]
         )
         assert "--enable-feature=agent" in c_by_name["prometheus"]["args"]
+
+    def test_prometheus_sts_tsdb_args_defaults(self, kube_version):
+        """The TSDB size retention defaults to 85% of the volume, and query
+        limits are set."""
+        docs = render_chart(
+            kube_version=kube_version,
+            values={"prometheus": {"persistence": {"size": "200Gi"}}},
+            show_only=self.show_only,
+        )
+        args = get_containers_by_name(docs[0])["prometheus"]["args"]
+        assert args[:8] == [
+            "--config.file=/etc/prometheus/config/prometheus.yaml",
+            "--storage.tsdb.path=/prometheus",
+            "--storage.tsdb.retention.time=15d",
+            "--storage.tsdb.retention.size=170GB",
+            "--storage.tsdb.wal-compression",
+            "--query.max-concurrency=20",
+            "--query.timeout=2m",
+            "--query.max-samples=50000000",
+        ]
+        assert not any("block-duration" in arg for arg in args)
+
+    def test_prometheus_sts_tsdb_args(self, kube_version):
+        docs = render_chart(
+            kube_version=kube_version,
+            values={
+                "prometheus": {
+                    "tsdb": {
+                        "retentionSize": "50GB",
+                        "walCompression": False,
+                        "minBlockDuration": "1h",
+                        "maxBlockDuration": "1d",
+                    },
+                    "query": {
+                        "maxConcurrency": 4,
+                        "timeout": "30s",
+                        "maxSamples": 100000000,
+                    },
+                }
+            },
+            show_only=self.show_only,
+        )
+        args = get_containers_by_name(docs[0])["prometheus"]["args"]
+        for arg in [
+            "--storage.tsdb.retention.size=50GB",
+            "--no-storage.tsdb.wal-compression",
+            "--storage.tsdb.min-block-duration=1h",
+            "--storage.tsdb.max-block-duration=1d",
+            "--query.max-concurrency=4",
+            "--query.timeout=30s",
+            "--query.max-samples=100000000",
+        ]:
+            assert arg in args
+        assert "--storage.tsdb.wal-compression" not in args
+
+    def test_prometheus_sts_tsdb_args_set_in_extra_flags(self, kube_version):
+        """A tsdb or query flag that extraFlags sets is not repeated, which
+        Prometheus would refuse to start with."""
+        extra_flags = [
+            "--query.max-samples=1000",
+            "--query.timeout=1m",
+            "--storage.tsdb.wal-compression",
+            "--storage.tsdb.retention.size=10GB",
+        ]
+        docs = render_chart(
+            kube_version=kube_version,
+            values={
+                "prometheus": {
+                    "tsdb": {"walCompression": False},
+                    "extraFlags": extra_flags,
+                }
+            },
+            show_only=self.show_only,
+        )
+        args = get_containers_by_name(docs[0])["prometheus"]["args"]
+        assert args[-4:] == extra_flags
+        flags = [arg.split("=")[0] for arg in args]
+        assert len(flags) == len(set(flags))
+        assert "--no-storage.tsdb.wal-compression" not in args
+        assert "--query.max-concurrency=20" in args
+
+    def test_prometheus_sts_no_size_retention_without_persistence(self, kube_version):
+        docs = render_chart(
+            kube_version=kube_version,
+            values={"prometheus": {"persistence": {"enabled": False}}},
+            show_only=self.show_only,
+        )
+        args = get_containers_by_name(docs[0])["prometheus"]["args"]
+        assert not any(arg.startswith("--storage.tsdb.retention.size") for arg in args)
+
+    def test_prometheus_out_of_order_time_window(self, kube_version):
+        docs = render_chart(
+            kube_version=kube_version,
+            values={"prometheus": {"tsdb": {"outOfOrderTimeWindow": "30m"}}},
+            show_only=["charts/prometheus/templates/prometheus-config-configmap.yaml"],
+        )
+        config = yaml.safe_load(docs[0]["data"]["config"])
+        assert config["storage"] == {"tsdb": {"out_of_order_time_window": "30m"}}
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            {"tsdb": {"retentionSize": "50Gi"}},
+            {"tsdb": {"walCompression": "yes"}},
+            {"tsdb": {"minBlockDuration": "2 hours"}},
+            {"tsdb": {"walCompresion": False}},
+            {"query": {"maxConcurrency": 0}},
+            {"query": {"timeout": 30}},
+            {"retention": "15 days"},
+        ],
+    )
+    def test_prometheus_tsdb_values_are_validated(self, kube_version, values):
+        with pytest.raises(CalledProcessError):
+            render_chart(
+                kube_version=kube_version,
+                values={"prometheus": values},
+                show_only=self.show_only,
+            )
@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+from tests import git_root_dir
+from tests import supported_k8s_versions
+from tests.chart_tests.helm_template_generator import render_backends
+from tests.chart_tests.render_benchmark import BenchmarkCase
+from tests.chart_tests.render_benchmark import BenchmarkHistory
+from tests.chart_tests.render_benchmark import benchmark_cases
+from tests.chart_tests.render_benchmark import percentile
+from tests.chart_tests.render_benchmark import subchart_templates
+
+
+def test_percentile():
+    samples = [5.0, 1.0, 3.0, 2.0, 4.0]
+    assert percentile(samples, 50) == 3.0
+    assert percentile(samples, 95) == 4.8
+    assert percentile([1.0], 95) == 1.0
+
+
+def test_subchart_templates():
+    output = b"""---
+# Source: astronomer/charts/prometheus/templates/prometheus-statefulset.yaml
+kind: StatefulSet
+---
+# Source: astronomer/charts/prometheus/templates/prometheus-statefulset.yaml
+kind: Service
+---
+# Source: astronomer/templates/houston/houston-configmap.yaml
+kind: ConfigMap
+"""
+    assert subchart_templates(output) == {
+        "prometheus": ["charts/prometheus/templates/prometheus-statefulset.yaml"],
+        "astronomer": ["templates/houston/houston-configmap.yaml"],
+    }
+
+
+def test_benchmark_history_regressions(tmp_path):
+    """Only cases that are slower than their baseline by both the threshold
+    and min_delta regress, and only runs on the same host count."""
+    history = BenchmarkHistory(tmp_path / "history.json")
+    for p50 in [1.0, 1.1, 0.9]:
+        history.record(
+            {"host": "ci", "results": {"a": {"p50": p50}, "b": {"p50": 0.1}}}
+        )
+    history.record({"host": "laptop", "results": {"a": {"p50": 0.2}}})
+
+    run = {
+        "host": "ci",
+        "results": {"a": {"p50": 1.3}, "b": {"p50": 0.14}, "c": {"p50": 9.0}},
+    }
+    regressions = history.regressions(
+        run, threshold=0.2, min_delta=0.05, baseline_runs=5
+    )
+    assert [(r.case, r.baseline) for r in regressions] == [("a", 1.0)]
+    assert BenchmarkHistory(tmp_path / "history.json").runs == history.runs
+
+
+def test_benchmark_cases_filter_before_rendering(monkeypatch):
+    """Cases are filtered by id, and the all features render that lists the
+    show_only templates only runs when a show_only case is selected."""
+    renders = []
+
+    def render(case, chart_dir):
+        renders.append(case.kube_version)
+        return b"# Source: astronomer/charts/nats/templates/statefulset.yaml\n"
+
+    monkeypatch.setattr(BenchmarkCase, "render", render)
+    cases = benchmark_cases(["1.24.0"], str(git_root_dir), re.compile("flag/"))
+    assert cases
+    assert all("/flag/" in case.id for case in cases)
+    assert not renders
+
+    cases = benchmark_cases(
+        ["1.23.0", "1.24.0"], str(git_root_dir), re.compile("1.24.0/show_only/nats")
+    )
+    assert [case.id for case in cases] == ["1.24.0/show_only/nats"]
+    assert cases[0].show_only == ["charts/nats/templates/statefulset.yaml"]
+    assert renders == ["1.24.0"]
+
+
+def test_render_backends_render_the_same(monkeypatch):
+    """Each CHART_TESTS_RENDER_BACKEND renders the same output, so they can
+    be benchmarked against each other."""
+    case = BenchmarkCase(
+        id="show_only/prometheus",
+        kube_version=supported_k8s_versions[-1],
+        values={"prometheus": {"replicas": 2}},
+        show_only=["charts/prometheus/templates/prometheus-statefulset.yaml"],
+    )
+    outputs = {}
+    for backend in render_backends:
+        monkeypatch.setenv("CHART_TESTS_RENDER_BACKEND", backend)
+        outputs[backend] = case.render(str(git_root_dir))
+    assert outputs["file"] == outputs["stdin"]
+    assert b"replicas: 2" in outputs["stdin"]
+
+    monkeypatch.setenv("CHART_TESTS_RENDER_BACKEND", "worker")
+    with pytest.raises(ValueError, match="Unknown CHART_TESTS_RENDER_BACKEND"):
+        case.render(str(git_root_dir))
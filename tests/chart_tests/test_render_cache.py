@@ -0,0 +1,55 @@
+import os
+from pathlib import Path
+
+from tests.chart_tests.render_cache import RenderCache
+from tests.chart_tests.render_cache import is_helmignored
+
+
+def test_render_cache_renders_once(tmp_path):
+    """A cache hit must not call the render function again."""
+    cache = RenderCache(path=tmp_path)
+    calls = []
+
+    def render():
+        calls.append(1)
+        return b"kind: ConfigMap\n"
+
+    assert cache.get_or_render("abcd", render) == b"kind: ConfigMap\n"
+    assert cache.get_or_render("abcd", render) == b"kind: ConfigMap\n"
+    assert len(calls) == 1
+
+
+def test_render_cache_caches_empty_output(tmp_path):
+    """Templates with no output are cached too."""
+    cache = RenderCache(path=tmp_path)
+    cache.put("abcd", b"")
+    assert cache.get("abcd") == b""
+    assert cache.get("dcba") is None
+
+
+def test_render_cache_evicts_least_recently_used(tmp_path):
+    """Entries that were read recently survive eviction."""
+    cache = RenderCache(path=tmp_path, max_bytes=10**9)
+    payload = os.urandom(2048)
+    for key in ["aa01", "bb02", "cc03"]:
+        cache.put(key, payload)
+    for age, key in enumerate(["cc03", "bb02", "aa01"]):
+        entry = cache._entry(key)
+        os.utime(entry, (1000 + age, 1000 + age))
+    cache.get("cc03")
+
+    cache.max_bytes = 2 * cache._entry("aa01").stat().st_size
+    cache.evict()
+
+    assert cache.get("cc03") == payload
+    assert cache.get("aa01") == payload
+    assert cache.get("bb02") is None
+
+
+def test_is_helmignored():
+    patterns = ("/tests", ".git/", "*.tgz")
+    assert is_helmignored(Path("tests/chart_tests/conftest.py"), patterns)
+    assert is_helmignored(Path(".git/HEAD"), patterns)
+    assert is_helmignored(Path("charts/foo/charts/bar.tgz"), patterns)
+    assert not is_helmignored(Path("charts/prometheus/templates/x.yaml"), patterns)
+    assert not is_helmignored(Path("charts/astronomer/tests/x.yaml"), patterns)
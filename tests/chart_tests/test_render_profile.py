@@ -0,0 +1,52 @@
+from tests.chart_tests.render_profile import folded
+from tests.chart_tests.render_profile import output_sizes
+from tests.chart_tests.render_profile import profile_templates
+
+chart_files = {
+    "Chart.yaml": "apiVersion: v2\nname: tiny\nversion: 0.1.0\n",
+    "templates/_helpers.tpl": '{{- define "tiny.name" -}}tiny{{- end }}',
+    "templates/a.yaml": (
+        "kind: ConfigMap\n"
+        "metadata:\n"
+        '  name: {{ include "tiny.name" . }}-a\n'
+        "  annotations:\n"
+        '    checksum: {{ include (print $.Template.BasePath "/b.yaml") . | sha256sum }}\n'
+    ),
+    "templates/b.yaml": "kind: ConfigMap\nmetadata:\n  name: b\n---\nkind: Secret\nmetadata:\n  name: b\n",
+}
+
+
+def test_profile_templates(tmp_path):
+    chart_dir = tmp_path / "chart"
+    for name, content in chart_files.items():
+        (chart_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        (chart_dir / name).write_text(content)
+
+    profiles = profile_templates(chart_dir, {}, "1.24.0", tmp_path / "work", repeat=1)
+
+    assert profiles[0]["template"] == "(helpers)"
+    by_template = {profile["template"]: profile for profile in profiles[1:]}
+    assert set(by_template) == {"templates/a.yaml", "templates/b.yaml"}
+    assert by_template["templates/a.yaml"]["error"] is None
+    assert by_template["templates/a.yaml"]["include_calls"] == 2
+    assert by_template["templates/b.yaml"]["objects"] == 2
+    assert (chart_dir / "templates/b.yaml").exists()
+
+
+def test_output_sizes_and_folded():
+    output = b"""---
+# Source: astronomer/charts/prometheus/templates/a.yaml
+kind: ConfigMap
+---
+# Source: astronomer/charts/prometheus/templates/a.yaml
+kind: Secret
+"""
+    # Everything but the two `---` separators.
+    assert output_sizes(output) == {
+        "charts/prometheus/templates/a.yaml": {"bytes": len(output) - 6, "objects": 2}
+    }
+    profiles = [
+        {"template": "charts/prometheus/templates/a.yaml", "seconds": 0.25},
+        {"template": "templates/b.yaml", "seconds": 0.0},
+    ]
+    assert folded(profiles) == "astronomer;prometheus;a.yaml 250000\n"
@@ -0,0 +1,66 @@
+from tests.chart_tests.helm_template_generator import iter_k8s_objects
+
+
+def test_rendered_manifest_indexes(all_features_docs):
+    """Test that the manifest lookups agree with scanning the docs."""
+    manifest = all_features_docs["1.21.0"]
+
+    assert len(manifest) == len(manifest.docs)
+    for doc in manifest:
+        assert manifest.get(doc["kind"], doc["metadata"]["name"]) is doc
+        assert doc in manifest.kind(doc["kind"])
+
+    prometheus = manifest.labelled(component="prometheus", release="release-name")
+    assert manifest.get("StatefulSet", "release-name-prometheus") in prometheus
+    assert all(
+        doc["metadata"]["labels"]["component"] == "prometheus" for doc in prometheus
+    )
+
+
+def test_rendered_manifest_pod_specs(all_features_docs):
+    """Test that pod specs are found for every kind that has one."""
+    manifest = all_features_docs["1.21.0"]
+
+    kinds = {doc["kind"] for doc, _ in manifest.pod_specs()}
+    assert {"Deployment", "StatefulSet", "DaemonSet", "CronJob"} <= kinds
+    for _, pod_spec in manifest.pod_specs():
+        assert pod_spec["containers"]
+
+    images = manifest.images()
+    assert images == sorted(set(images))
+    assert manifest.search("[?kind == 'CronJob'].metadata.name")
+
+
+def test_rendered_manifest_sources(all_features_docs):
+    """Test that every doc is indexed by the template that rendered it."""
+    manifest = all_features_docs["1.21.0"]
+
+    statefulset = "astronomer/charts/prometheus/templates/prometheus-statefulset.yaml"
+    assert manifest.template(statefulset) == [
+        manifest.get("StatefulSet", "release-name-prometheus")
+    ]
+    assert None not in manifest.by_template
+
+
+def test_iter_k8s_objects():
+    output = b"""---
+# Source: astronomer/templates/a.yaml
+kind: ConfigMap
+data:
+  script: |
+    ---
+    not a separator
+---
+# Source: astronomer/templates/b.yaml
+# a comment
+---
+# Source: astronomer/templates/c.yaml
+kind: Secret
+"""
+    assert list(iter_k8s_objects(output)) == [
+        (
+            "astronomer/templates/a.yaml",
+            {"kind": "ConfigMap", "data": {"script": "---\nnot a separator\n"}},
+        ),
+        ("astronomer/templates/c.yaml", {"kind": "Secret"}),
+    ]
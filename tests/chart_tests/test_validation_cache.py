@@ -0,0 +1,55 @@
+import os
+
+from tests.chart_tests.helm_template_generator import render_chart
+from tests.chart_tests.validation_cache import ValidationCache
+from tests.chart_tests.validation_cache import digest
+
+
+def test_validation_cache_markers(tmp_path):
+    cache = ValidationCache(path=tmp_path)
+    schema_digest = digest({"type": "object"})
+    object_digest = digest({"kind": "ConfigMap", "apiVersion": "v1"})
+
+    assert not cache.is_schema_checked(schema_digest)
+    assert not cache.is_valid(schema_digest, object_digest)
+    cache.mark_schema_checked(schema_digest)
+    cache.mark_valid(schema_digest, object_digest)
+    assert cache.is_schema_checked(schema_digest)
+    assert cache.is_valid(schema_digest, object_digest)
+    assert not cache.is_valid(digest({"type": "string"}), object_digest)
+
+
+def test_validation_cache_evicts_least_recently_used(tmp_path):
+    cache = ValidationCache(path=tmp_path, max_markers=2)
+    schema_digest = digest({"type": "object"})
+    old, used, new = (digest({"name": name}) for name in ("old", "used", "new"))
+    for mtime, object_digest in enumerate([old, used, new]):
+        cache.mark_valid(schema_digest, object_digest)
+        os.utime(cache._marker(schema_digest, object_digest), (mtime, mtime))
+    # A hit makes a marker the most recently used.
+    assert cache.is_valid(schema_digest, old)
+
+    cache.evict()
+    assert cache.is_valid(schema_digest, old)
+    assert not cache.is_valid(schema_digest, used)
+    assert cache.is_valid(schema_digest, new)
+
+    cache = ValidationCache(path=tmp_path, max_markers=0)
+    cache.evict()
+    assert list(tmp_path.iterdir()) == [tmp_path / "evict.lock"]
+
+
+def test_digest_is_canonical():
+    assert digest({"a": 1, "b": [1, 2]}) == digest({"b": [1, 2], "a": 1})
+    assert digest({"a": 1}) != digest({"a": "1"})
+
+
+def test_render_chart_without_validation(monkeypatch):
+    """Test that validate=False does not need any schemas."""
+    monkeypatch.setenv("CHART_TESTS_OFFLINE", "1")
+    docs = render_chart(
+        show_only=["charts/prometheus/templates/prometheus-config-configmap.yaml"],
+        validate=False,
+    )
+    assert len(docs) == 1
+    assert docs[0]["kind"] == "ConfigMap"
@@ -0,0 +1,61 @@
+import subprocess
+
+import pytest
+
+from tests.chart_tests.helm_template_generator import render_args
+from tests.chart_tests.helm_template_generator import run_helm_template
+from tests.chart_tests.values_fuzzer import Flag
+from tests.chart_tests.values_fuzzer import ValuesFuzzer
+from tests.chart_tests.values_fuzzer import chart_flags
+
+
+class FakeRenderFuzzer(ValuesFuzzer):
+    """Fails whenever global.a and global.b are both enabled."""
+
+    def check(self, case):
+        values = self.values(case).get("global", {})
+        if values.get("a") and values.get("b"):
+            return "a and b"
+        return None
+
+
+def test_chart_flags():
+    flags = {flag.path: flag for flag in chart_flags()}
+    assert flags[("global", "singleNamespace")].default is False
+    assert flags[("global", "customLogging", "enabled")].default is False
+    assert ("nats", "auth", "enabled") in flags
+
+
+def test_values_fuzzer_samples_are_canonical():
+    fuzzer = ValuesFuzzer(flags=[Flag(("global", "a"), False)], seed=0)
+    for _ in range(20):
+        kube_version, items = fuzzer.sample()
+        assert items in ((), ((("global", "a"), True),))
+
+
+def test_values_fuzzer_adds_companion_values():
+    flag = Flag(("global", "customLogging", "enabled"), False)
+    fuzzer = ValuesFuzzer(flags=[flag])
+    assert fuzzer.values(("1.21.0", ((flag.path, True),))) == {
+        "global": {"customLogging": {"enabled": True, "awsSecretName": "dummy"}}
+    }
+
+
+def test_values_fuzzer_minimizes_failures():
+    flags = [Flag(("global", name), False) for name in "abcdefgh"]
+    fuzzer = FakeRenderFuzzer(flags=flags, flip_probability=0.9, seed=1, max_workers=2)
+    rendered, failures = fuzzer.run(50)
+
+    assert rendered <= 50
+    assert [failure.signature for failure in failures] == ["a and b"]
+    assert fuzzer.values(failures[0].minimal) == {"global": {"a": True, "b": True}}
+
+
+def test_helm_failures_are_not_printed_without_report_errors(capsys):
+    """The fuzzer expects failures, so their helm output is only kept on the
+    error."""
+    args = render_args(show_only=["templates/does-not-exist.yaml"])
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run_helm_template(**args, report_errors=False)
+    assert b"could not find template" in error.value.stderr
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,103 @@
+"""On-disk record of kubernetes objects that already passed schema
+validation.
+
+Most renders produce objects that earlier renders already produced, so we
+store a marker for every (schema, object) pair that validated, and for every
+schema that passed the Draft7 meta-schema check. Markers are empty files,
+so concurrent pytest-xdist workers can share them without locking. A hit
+bumps the marker's mtime, and evict() removes the least recently used
+markers beyond max_markers.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from filelock import FileLock
+
+from tests.chart_tests.render_cache import cache_dir
+
+DEFAULT_MAX_MARKERS = 100_000
+
+
+def validation_cache_enabled() -> bool:
+    """Return whether validation results should be cached."""
+    return os.getenv("CHART_TESTS_VALIDATION_CACHE", "1").lower() not in (
+        "0",
+        "false",
+    )
+
+
+def digest(obj) -> str:
+    """Return a hash of the canonical JSON form of obj."""
+    canonical = json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ValidationCache:
+    """Markers for schemas that were checked and objects that were
+    validated."""
+
+    def __init__(self, path: Optional[Path] = None, max_markers: Optional[int] = None):
+        self.path = Path(path or cache_dir() / "validated")
+        if max_markers is None:
+            max_markers = int(
+                os.getenv(
+                    "CHART_TESTS_VALIDATION_CACHE_MAX_MARKERS", DEFAULT_MAX_MARKERS
+                )
+            )
+        self.max_markers = max_markers
+
+    def _marker(self, schema_digest: str, object_digest: str) -> Path:
+        return self.path / schema_digest[:32] / object_digest[:32]
+
+    def _mark(self, marker: Path) -> None:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+
+    @staticmethod
+    def _hit(marker: Path) -> bool:
+        """Return whether marker exists, bumping its mtime if it does."""
+        try:
+            os.utime(marker)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def is_schema_checked(self, schema_digest: str) -> bool:
+        return self._hit(self._marker(schema_digest, "schema"))
+
+    def mark_schema_checked(self, schema_digest: str) -> None:
+        self._mark(self._marker(schema_digest, "schema"))
+
+    def is_valid(self, schema_digest: str, object_digest: str) -> bool:
+        return self._hit(self._marker(schema_digest, object_digest))
+
+    def mark_valid(self, schema_digest: str, object_digest: str) -> None:
+        self._mark(self._marker(schema_digest, object_digest))
+
+    def evict(self) -> None:
+        """Remove least recently used markers until at most max_markers
+        are left, and the schema directories that are left empty."""
+        if not self.path.is_dir():
+            return
+        with FileLock(str(self.path / "evict.lock")):
+            markers = []
+            for marker in self.path.glob("*/*"):
+                try:
+                    markers.append((marker.stat().st_mtime, marker))
+                except FileNotFoundError:
+                    continue
+            if len(markers) <= self.max_markers:
+                return
+            markers.sort()
+            for _, marker in markers[: len(markers) - self.max_markers]:
+                marker.unlink(missing_ok=True)
+            for schema_dir in self.path.iterdir():
+                if schema_dir.is_dir() and not any(schema_dir.iterdir()):
+                    schema_dir.rmdir()
+
+
+validation_cache = ValidationCache()
@@ -0,0 +1,253 @@
+"""Render the chart with random combinations of its feature flags.
+
+The flags are every boolean in values.yaml, every `enabled` toggle in the
+subcharts' values.yaml, and every boolean in values.schema.json.example.
+Each sample flips a random few of them away from their defaults and picks a
+kube version. Flags that need other values to go with them get them from
+tests/enable_all_features.yaml, eg: global.customLogging.awsSecretName.
+
+Samples are canonicalized to the flags that differ from the defaults, so
+equivalent samples are only rendered once. They are rendered and validated
+concurrently, and repeated and minimized cases come from the render cache.
+helm's output is captured per render rather than printed. Failures are
+grouped by error, and one example of each is minimized by dropping flags
+while it still fails with the same error. See bin/fuzz-chart-values.
+"""
+
+import json
+import random
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from typing import Optional
+
+import jsonschema
+import yaml
+
+from tests import git_root_dir
+from tests import supported_k8s_versions
+from tests.chart_tests import get_all_features
+from tests.chart_tests.helm_template_generator import load_k8s_objects
+from tests.chart_tests.helm_template_generator import render_chart_output
+
+ValuesPath = tuple[str, ...]
+# A canonical sample: the kube version and the sorted flags that differ from
+# their defaults.
+Case = tuple[str, tuple[tuple[ValuesPath, Any], ...]]
+
+
+@dataclass(frozen=True)
+class Flag:
+    path: ValuesPath
+    default: Any
+    choices: tuple = (True, False)
+
+
+def boolean_leaves(values: dict, prefix: ValuesPath = (), key: Optional[str] = None):
+    """Yield (path, value) for every boolean in values, or only for the
+    booleans named key."""
+    for name, value in values.items():
+        if isinstance(value, dict):
+            yield from boolean_leaves(value, prefix + (name,), key)
+        elif isinstance(value, bool) and key in (None, name):
+            yield prefix + (name,), value
+
+
+def schema_booleans(schema: dict, prefix: ValuesPath = ()):
+    """Yield the path of every boolean property in a JSON schema."""
+    for name, prop in (schema.get("properties") or {}).items():
+        if prop.get("type") == "boolean":
+            yield prefix + (name,)
+        yield from schema_booleans(prop, prefix + (name,))
+
+
+def get_value(values: dict, path: ValuesPath, default=None):
+    for name in path:
+        if not isinstance(values, dict) or name not in values:
+            return default
+        values = values[name]
+    return values
+
+
+def set_value(values: dict, path: ValuesPath, value) -> None:
+    for name in path[:-1]:
+        values = values.setdefault(name, {})
+    values[path[-1]] = value
+
+
+def chart_flags(chart_dir: Path = git_root_dir) -> list[Flag]:
+    """Return all the flags to fuzz, in a stable order."""
+    values = yaml.safe_load((chart_dir / "values.yaml").read_text())
+    flags = {path: Flag(path, default) for path, default in boolean_leaves(values)}
+    for values_file in sorted(chart_dir.glob("charts/*/values.yaml")):
+        subchart = values_file.parent.name
+        subchart_values = yaml.safe_load(values_file.read_text()) or {}
+        for path, default in boolean_leaves(subchart_values, key="enabled"):
+            path = (subchart,) + path
+            flags.setdefault(path, Flag(path, get_value(values, path, default)))
+    schema_file = chart_dir / "values.schema.json.example"
+    if schema_file.exists():
+        for path in schema_booleans(json.loads(schema_file.read_text())):
+            flags.setdefault(path, Flag(path, get_value(values, path)))
+    return list(flags.values())
+
+
+def companion_values(flags: list[Flag], all_features: dict) -> dict[ValuesPath, dict]:
+    """Return the values that must be set along with each flag when it is
+    enabled: the non-boolean siblings of the flag in all_features."""
+    companions = {}
+    for flag in flags:
+        siblings = get_value(all_features, flag.path[:-1])
+        if not isinstance(siblings, dict):
+            continue
+        extra = {
+            name: value
+            for name, value in siblings.items()
+            if not isinstance(value, (bool, dict)) and name != "baseDomain"
+        }
+        if extra:
+            companion: dict = {}
+            set_value(companion, flag.path[:-1], extra)
+            companions[flag.path] = companion
+    return companions
+
+
+def merge(values: dict, extra: dict) -> dict:
+    for name, value in extra.items():
+        if isinstance(value, dict) and isinstance(values.get(name), dict):
+            merge(values[name], value)
+        else:
+            values[name] = deepcopy(value)
+    return values
+
+
+def error_signature(error: Exception) -> str:
+    """Return a short description of a render failure that is the same for
+    every render that fails the same way."""
+    if isinstance(error, subprocess.CalledProcessError):
+        lines = [line.strip() for line in error.stderr.decode().splitlines()]
+        lines = [line for line in lines if line]
+        errors = [line for line in lines if line.startswith("Error:")] or lines
+        return errors[0] if errors else f"helm exited {error.returncode}"
+    if isinstance(error, jsonschema.ValidationError):
+        path = ".".join(str(p) for p in error.absolute_path)
+        return f"ValidationError at {path}: {error.message}"
+    return f"{type(error).__name__}: {error}"
+
+
+@dataclass
+class Failure:
+    signature: str
+    count: int
+    example: Case
+    minimal: Optional[Case] = None
+
+
+class ValuesFuzzer:
+    """Samples, renders and minimizes chart flag combinations."""
+
+    def __init__(
+        self,
+        flags: Optional[list[Flag]] = None,
+        kube_versions: list[str] = supported_k8s_versions,
+        flip_probability: float = 0.1,
+        seed: Optional[int] = None,
+        validate: bool = True,
+        max_workers: Optional[int] = None,
+    ):
+        self.flags = chart_flags() if flags is None else flags
+        self.kube_versions = kube_versions
+        self.flip_probability = flip_probability
+        self.random = random.Random(seed)
+        self.validate = validate
+        self.max_workers = max_workers
+        self.companions = companion_values(self.flags, get_all_features())
+
+    def sample(self) -> Case:
+        """Return a random canonical case."""
+        items = []
+        for flag in self.flags:
+            if self.random.random() < self.flip_probability:
+                value = self.random.choice(flag.choices)
+                if value != flag.default:
+                    items.append((flag.path, value))
+        return self.random.choice(self.kube_versions), tuple(sorted(items))
+
+    def values(self, case: Case) -> dict:
+        """Return the helm values for a case."""
+        values: dict = {}
+        for path, value in case[1]:
+            set_value(values, path, value)
+            if value is True and path in self.companions:
+                merge(values, self.companions[path])
+        return values
+
+    def check(self, case: Case) -> Optional[str]:
+        """Render and validate a case, returning its error signature if it
+        fails."""
+        try:
+            # helm's output is kept on the error rather than printed, as
+            # failures are expected here.
+            output = render_chart_output(
+                values=self.values(case),
+                kube_version=case[0],
+                report_errors=False,
+            )
+            load_k8s_objects(output, kube_version=case[0], validate=self.validate)
+        except Exception as error:
+            return error_signature(error)
+        return None
+
+    def minimize(self, case: Case, signature: str) -> Case:
+        """Drop flags from a failing case while it still fails with the same
+        signature."""
+        kube_version, items = case
+        position = 0
+        while position < len(items):
+            trial = items[:position] + items[position:][1:]
+            if self.check((kube_version, trial)) == signature:
+                items = trial
+            else:
+                position += 1
+        return kube_version, items
+
+    def run(self, samples: int) -> tuple[int, list[Failure]]:
+        """Render up to samples unique cases and return the number rendered
+        and the failures, each with a minimized example."""
+        cases = list(dict.fromkeys(self.sample() for _ in range(samples)))
+        failures: dict[str, Failure] = {}
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for case, signature in zip(cases, executor.map(self.check, cases)):
+                if signature is None:
+                    continue
+                if signature in failures:
+                    failures[signature].count += 1
+                else:
+                    failures[signature] = Failure(signature, 1, case)
+            minimal = executor.map(
+                lambda failure: self.minimize(failure.example, failure.signature),
+                failures.values(),
+            )
+            for failure, minimal_case in zip(failures.values(), minimal):
+                failure.minimal = minimal_case
+        return len(cases), sorted(failures.values(), key=lambda f: -f.count)
+
+    def report(self, rendered: int, failures: list[Failure]) -> dict:
+        """Return a JSON serializable report of a run."""
+        return {
+            "rendered": rendered,
+            "flags": len(self.flags),
+            "failures": [
+                {
+                    "signature": failure.signature,
+                    "count": failure.count,
+                    "kube_version": failure.minimal[0],
+                    "minimal_values": self.values(failure.minimal),
+                    "example_values": self.values(failure.example),
+                }
+                for failure in failures
+            ],
+        }
@@ -0,0 +1,178 @@
+"""An in-memory copy of the pods, services and statefulsets of a namespace.
+
+Fixtures used to LIST pods from the API server for every test. A
+ClusterSnapshot instead lists each resource type once and then follows a
+watch on it from a background thread, so lookups by label selector are
+answered from memory and stay up to date as pods restart. When the watch
+falls too far behind (410 Gone), the resource type is listed again.
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Callable
+from typing import Optional
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+selector_requirement_re = re.compile(
+    r"^\s*(?P<not>!)?\s*(?P<key>[\w./-]+)\s*"
+    r"(?:(?P<op>==|=|!=|\s+in\s+|\s+notin\s+)\s*(?P<values>\([^)]*\)|[\w.-]*))?\s*$"
+)
+
+
+def split_selector(label_selector: str) -> list[str]:
+    """Split a label selector on the commas that are not inside a set."""
+    requirements, depth, current = [], 0, ""
+    for char in label_selector:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            requirements.append(current)
+            current = ""
+        else:
+            current += char
+    return [r for r in requirements + [current] if r.strip()]
+
+
+def label_matcher(label_selector: Optional[str]) -> Callable[[dict], bool]:
+    """Return a function that checks a dict of labels against a kubernetes
+    label selector, eg: 'component=houston,tier in (a, b),!canary'."""
+    checks = []
+    for requirement in split_selector(label_selector or ""):
+        match = selector_requirement_re.match(requirement)
+        if not match:
+            raise ValueError(f"Invalid label selector: {label_selector!r}")
+        key, op = match["key"], (match["op"] or "").strip()
+        values = (
+            {v.strip() for v in match["values"].strip("()").split(",")} if op else set()
+        )
+        if match["not"]:
+            checks.append(lambda labels, key=key: key not in labels)
+        elif not op:
+            checks.append(lambda labels, key=key: key in labels)
+        elif op in ("=", "==", "in"):
+            checks.append(lambda labels, key=key, v=values: labels.get(key) in v)
+        else:
+            checks.append(lambda labels, key=key, v=values: labels.get(key) not in v)
+    return lambda labels: all(check(labels or {}) for check in checks)
+
+
+class WatchedResource:
+    """The objects of one resource type, kept up to date by a watch."""
+
+    def __init__(self, kind: str, list_function: Callable, namespace: str):
+        self.kind = kind
+        self.list_function = list_function
+        self.namespace = namespace
+        self.objects: dict[str, object] = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.watch = watch.Watch()
+        self.stopped = False
+        self.thread = threading.Thread(
+            target=self.run, name=f"watch-{kind}", daemon=True
+        )
+
+    def relist(self) -> str:
+        """Replace the objects with a fresh LIST and return its resource
+        version."""
+        listed = self.list_function(self.namespace)
+        with self.lock:
+            self.objects = {item.metadata.name: item for item in listed.items}
+        self.synced.set()
+        return listed.metadata.resource_version
+
+    def apply(self, event: dict) -> None:
+        item = event["object"]
+        with self.lock:
+            if event["type"] == "DELETED":
+                self.objects.pop(item.metadata.name, None)
+            elif event["type"] in ("ADDED", "MODIFIED"):
+                self.objects[item.metadata.name] = item
+
+    def run(self) -> None:
+        resource_version = None
+        while not self.stopped:
+            try:
+                if resource_version is None:
+                    resource_version = self.relist()
+                for event in self.watch.stream(
+                    self.list_function,
+                    self.namespace,
+                    resource_version=resource_version,
+                ):
+                    self.apply(event)
+                    if self.stopped:
+                        break
+                resource_version = self.watch.resource_version
+            except ApiException as error:
+                if error.status != 410:
+                    logging.warning(f"Watching {self.kind} failed: {error}")
+                    time.sleep(1)
+                resource_version = None
+            except Exception as error:
+                if self.stopped:
+                    break
+                logging.warning(f"Watching {self.kind} failed: {error}")
+                time.sleep(1)
+                resource_version = None
+
+    def select(self, label_selector: Optional[str] = None) -> list:
+        """Return the objects matching label_selector, sorted by name."""
+        matches = label_matcher(label_selector)
+        with self.lock:
+            items = list(self.objects.values())
+        return sorted(
+            (item for item in items if matches(item.metadata.labels)),
+            key=lambda item: item.metadata.name,
+        )
+
+    def stop(self) -> None:
+        self.stopped = True
+        self.watch.stop()
+
+
+class ClusterSnapshot:
+    """Pods, services and statefulsets of a namespace, queried in memory."""
+
+    def __init__(
+        self,
+        namespace: str,
+        core_v1: Optional[client.CoreV1Api] = None,
+        apps_v1: Optional[client.AppsV1Api] = None,
+        sync_timeout: float = 60,
+    ):
+        core_v1 = core_v1 or client.CoreV1Api()
+        apps_v1 = apps_v1 or client.AppsV1Api()
+        self.namespace = namespace
+        self.resources = {
+            "pods": WatchedResource("pods", core_v1.list_namespaced_pod, namespace),
+            "services": WatchedResource(
+                "services", core_v1.list_namespaced_service, namespace
+            ),
+            "statefulsets": WatchedResource(
+                "statefulsets", apps_v1.list_namespaced_stateful_set, namespace
+            ),
+        }
+        for resource in self.resources.values():
+            resource.thread.start()
+        for resource in self.resources.values():
+            if not resource.synced.wait(sync_timeout):
+                raise TimeoutError(f"Timed out listing {resource.kind} in {namespace}")
+
+    def pods(self, label_selector: Optional[str] = None) -> list[client.V1Pod]:
+        return self.resources["pods"].select(label_selector)
+
+    def services(self, label_selector: Optional[str] = None) -> list[client.V1Service]:
+        return self.resources["services"].select(label_selector)
+
+    def statefulsets(
+        self, label_selector: Optional[str] = None
+    ) -> list[client.V1StatefulSet]:
+        return self.resources["statefulsets"].select(label_selector)
+
+    def stop(self) -> None:
+        for resource in self.resources.values():
+            resource.stop()
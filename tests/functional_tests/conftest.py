@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import atexit
+from functools import cache
 from os import getenv
 
 import docker
@@ -7,6 +9,8 @@ import pytest
 import testinfra
 from kubernetes import client, config
 
+from tests.functional_tests.cluster_snapshot import ClusterSnapshot
+
 if not (namespace := getenv("NAMESPACE")):
     print("NAMESPACE env var is not present, using 'astronomer' namespace")
     namespace = "astronomer"
@@ -102,7 +106,9 @@ def kube_client(request, in_cluster=False):
     yield k8s_client
 
 
+@cache
 def get_kube_client(in_cluster=False):
+    """Return a kubernetes client, loading the configuration only once."""
     if in_cluster:
         print("Using in cluster kubernetes configuration")
         config.load_incluster_config()
@@ -113,13 +119,27 @@ def get_kube_client(in_cluster=False):
     return client.CoreV1Api()
 
 
+@pytest.fixture(scope="session")
+def cluster_snapshot(request, kube_client):
+    """Return the in-memory snapshot of the release namespace."""
+    yield get_cluster_snapshot()
+
+
+@cache
+def get_cluster_snapshot(snapshot_namespace=namespace) -> ClusterSnapshot:
+    """Return the snapshot of a namespace, starting its watches the first
+    time it is used."""
+    get_kube_client()
+    snapshot = ClusterSnapshot(snapshot_namespace)
+    atexit.register(snapshot.stop)
+    return snapshot
+
+
 def get_pod_by_label_selector(
     kube_client, label_selector, pod_namespace=namespace
 ) -> str:
     """Return the name of a pod found by label selector."""
-    pods = kube_client.list_namespaced_pod(
-        pod_namespace, label_selector=label_selector
-    ).items
+    pods = get_cluster_snapshot(pod_namespace).pods(label_selector)
     assert (
         len(pods) > 0
     ), f"Expected to find at least one pod with labels '{label_selector}'"
@@ -128,12 +148,12 @@ def get_pod_by_label_selector(
 
 def get_pod_running_containers(pod_namespace=namespace):
     """Return the containers from pods found."""
-    pods = get_kube_client().list_namespaced_pod(pod_namespace).items
+    pods = get_cluster_snapshot(pod_namespace).pods()
 
     containers = {}
     for pod in pods:
         pod_name = pod.metadata.name
-        for container_status in pod.status.container_statuses:
+        for container_status in pod.status.container_statuses or []:
             if container_status.ready:
                 container = vars(container_status).copy()
                 container["pod_name"] = pod_name
@@ -0,0 +1,134 @@
+"""Run shell checks in many containers at once.
+
+testinfra runs every check as its own `kubectl exec`, and a host per
+container means a new kubectl process for each of them. run_checks instead
+runs a batch of named checks in one exec per container over the kubernetes
+API, and run_checks_in_containers fans that out over a bounded thread pool.
+
+The kubernetes client's stream() temporarily patches the API client it is
+called with, so each thread gets its own CoreV1Api built from the kube
+config that get_kube_client already loaded.
+"""
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from typing import Union
+
+from kubernetes import client
+from kubernetes.stream import stream
+
+check_re = re.compile(r"^<<<check (\S+)>>>$\n(.*?)^<<<exit (\d+)>>>$", re.M | re.S)
+
+# The checks that test_container_non_root makes.
+user_checks = {
+    "uid": "id -u",
+    "gid": "id -g",
+    "user": "id -un",
+    "group": "id -gn",
+}
+
+
+@dataclass(frozen=True)
+class Container:
+    pod_name: str
+    name: str
+    namespace: str
+
+
+@dataclass
+class CheckResult:
+    output: str
+    exit_status: int
+
+    @property
+    def succeeded(self) -> bool:
+        return self.exit_status == 0
+
+
+thread_clients = threading.local()
+
+
+def thread_client() -> client.CoreV1Api:
+    """Return this thread's kubernetes client."""
+    if not hasattr(thread_clients, "core_v1"):
+        thread_clients.core_v1 = client.CoreV1Api(client.ApiClient())
+    return thread_clients.core_v1
+
+
+def checks_script(checks: dict[str, str]) -> str:
+    """Return a shell script that runs every check and marks where each
+    one's output and exit status are.
+
+    The exit marker goes on a line of its own, even when a check's output
+    does not end with a newline.
+    """
+    return "".join(
+        f"echo '<<<check {name}>>>'; ( {command} ) 2>&1; "
+        'status=$?; echo; echo "<<<exit $status>>>"; '
+        for name, command in checks.items()
+    )
+
+
+def parse_checks_output(output: str) -> dict[str, CheckResult]:
+    # [:-1] drops the newline that checks_script adds before the exit marker.
+    return {
+        name: CheckResult(check_output[:-1].rstrip("\n"), int(exit_status))
+        for name, check_output, exit_status in check_re.findall(output)
+    }
+
+
+def run_checks(
+    container: Container,
+    checks: dict[str, str],
+    timeout: int = 60,
+    core_v1: Optional[client.CoreV1Api] = None,
+) -> dict[str, CheckResult]:
+    """Run named shell checks in container with a single exec, and return
+    their results by name."""
+    response = stream(
+        (core_v1 or thread_client()).connect_get_namespaced_pod_exec,
+        container.pod_name,
+        container.namespace,
+        container=container.name,
+        command=["/bin/sh", "-c", checks_script(checks)],
+        stderr=True,
+        stdin=False,
+        stdout=True,
+        tty=False,
+        _preload_content=False,
+    )
+    try:
+        response.run_forever(timeout=timeout)
+        output = response.read_stdout()
+        errors = response.read_stderr()
+    finally:
+        response.close()
+    results = parse_checks_output(output)
+    if missing := set(checks) - set(results):
+        raise RuntimeError(
+            f"{container.pod_name}/{container.name} did not run checks "
+            f"{sorted(missing)}: {errors or output}"
+        )
+    return results
+
+
+def run_checks_in_containers(
+    containers: list[Container],
+    checks: dict[str, str],
+    max_workers: int = 16,
+    timeout: int = 60,
+) -> dict[Container, Union[dict[str, CheckResult], Exception]]:
+    """Run the same checks in every container concurrently. A container
+    whose exec fails gets the exception instead of its results."""
+
+    def run(container: Container):
+        try:
+            return run_checks(container, checks, timeout=timeout)
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(containers, executor.map(run, containers)))
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
 import pytest
-import testinfra
 
 from tests.functional_tests.conftest import get_pod_running_containers
+from tests.functional_tests.pod_exec import Container
+from tests.functional_tests.pod_exec import run_checks_in_containers
+from tests.functional_tests.pod_exec import user_checks
 
 container_ignore_list = [
     "kube-state",
@@ -14,26 +16,36 @@ container_ignore_list = [
 container_list = get_pod_running_containers()
 
 
+@pytest.fixture(scope="module")
+def container_users():
+    """Check the user of every container concurrently, with one exec per
+    container."""
+    containers = [
+        Container(c["pod_name"], c["_name"], c["namespace"])
+        for c in container_list.values()
+        if c["_name"] not in container_ignore_list
+    ]
+    return run_checks_in_containers(containers, user_checks)
+
+
 @pytest.mark.parametrize(
     "container",
     container_list.values(),
     ids=container_list.keys(),
 )
-def test_container_non_root(request, container):
+def test_container_non_root(container, container_users):
     if container["_name"] in container_ignore_list:
         pytest.skip("Info: Unsupported container: " + container["_name"])
 
-    """This is the host fixture for testinfra. To read more, please see
-    the testinfra documentation:
-    https://testinfra.readthedocs.io/en/latest/examples.html#test-docker-images
-    """
-
-    pod_client = testinfra.get_host(
-        f"kubectl://{container['pod_name']}?container={container['_name']}&namespace={container['namespace']}"
-    )
-
-    user_info = pod_client.user()
-    assert user_info.name != "root"
-    assert user_info.group != "root"
-    assert user_info.gid != 0
-    assert user_info.uid != 0
+    user_info = container_users[
+        Container(container["pod_name"], container["_name"], container["namespace"])
+    ]
+    if isinstance(user_info, Exception):
+        raise user_info
+
+    for key, result in user_info.items():
+        assert result.succeeded, f"{key} check failed: {result.output}"
+    assert user_info["user"].output != "root"
+    assert user_info["group"].output != "root"
+    assert user_info["gid"].output != "0"
+    assert user_info["uid"].output != "0"
@@ -1,13 +1,22 @@
+import json
 import logging
 import sys
 import xml.etree.ElementTree as xml_parser
+from collections import defaultdict
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from contextlib import contextmanager
 from os import getenv
+from pathlib import Path
 from random import randint
-from time import sleep, time
+from time import time
 
-import testinfra
-from kubernetes import client, config
+from kubernetes import client, config, watch
+
+from tests.functional_tests.pod_exec import Container
+from tests.functional_tests.pod_exec import run_checks
 
 if getenv("DEBUG"):
     logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -16,19 +25,25 @@ else:
 
 
 class ScanFinding:
-    def __init__(self, name="", ip_address="", ports=[]):
+    def __init__(self, name="", ip_address="", ports=None):
         self.name = name
         self.ip_address = ip_address
-        self.ports = ports
+        self.ports = ports or []
 
     def add_port(self, port):
         if port not in self.ports:
             self.ports.append(port)
 
+    def to_dict(self):
+        return {"name": self.name, "ip_address": self.ip_address, "ports": self.ports}
+
 
 class ScanResult:
-    def __init__(self, findings=[]):
-        self.findings = findings
+    """Findings of a scan, which grow as each part of the scan finishes."""
+
+    def __init__(self, findings=None):
+        self.findings = findings or []
+        self.scans = []
 
     def add_finding(self, finding):
         self.findings.append(finding)
@@ -36,6 +51,29 @@ class ScanResult:
     def remove_finding(self, finding):
         self.findings.remove(finding)
 
+    def add_scan(self, namespace, addresses, ports, duration, error=None):
+        self.scans.append(
+            {
+                "namespace": namespace,
+                "addresses": len(addresses),
+                "ports": len(ports),
+                "seconds": round(duration, 3),
+                "error": error,
+            }
+        )
+
+    def to_dict(self):
+        return {
+            "scans": self.scans,
+            "findings": [finding.to_dict() for finding in self.findings],
+        }
+
+    def write_report(self, path):
+        """Write the result so far as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
 
 class ScanTarget:
     def __init__(self, name, ip_address, _type, ports=[], namespace=None):
@@ -60,11 +98,55 @@ class ScanTarget:
         ), f"Expected to find str, but found: {type(self.namespace)}"
 
 
+def open_ports_by_address(scan_xml):
+    """Return the open ports of every host in nmap XML output."""
+    # sample XML at the "ports" level:
+    # <ports>
+    #   <port protocol="tcp" portid="53">
+    #     <state state="closed" reason="reset" reason_ttl="253"/>
+    #     <service name="domain" method="table" conf="3"/>
+    #   </port>
+    #   <port protocol="tcp" portid="61678">
+    #     <state state="closed" reason="reset" reason_ttl="253"/>
+    #   </port>
+    # </ports>
+    open_ports = {}
+    for host in xml_parser.fromstring(scan_xml).iter("host"):
+        address = host.find("address")
+        if address is None:
+            continue
+        ports = [
+            int(port.attrib["portid"])
+            for port in host.iter("port")
+            if port.find("state") is not None
+            and port.find("state").attrib["state"] == "open"
+        ]
+        if ports:
+            open_ports[address.attrib["addr"]] = ports
+    return open_ports
+
+
 class KubernetesNetworkChecker:
-    def __init__(self):
+    """Scans every pod and service port from a pod in its own namespace.
+
+    Every address is scanned on every port that any target declares, so an
+    open port that a target did not declare is still found. Targets are
+    grouped by namespace into scans of at most hosts_per_scan addresses. Up
+    to max_parallel_scans nmap processes run in the scanner pod at once, and
+    at most max_scans_per_namespace of them for any one namespace.
+    """
+
+    namespace = "astronomer-scan-test"
+
+    def __init__(
+        self, max_parallel_scans=8, max_scans_per_namespace=2, hosts_per_scan=32
+    ):
         config.load_kube_config()
         self.targets = []
         self.v1 = client.CoreV1Api()
+        self.max_parallel_scans = max_parallel_scans
+        self.max_scans_per_namespace = max_scans_per_namespace
+        self.hosts_per_scan = hosts_per_scan
 
     def collect_scan_targets(self):
         logging.info("Iterating through all pods")
@@ -94,117 +176,152 @@ class KubernetesNetworkChecker:
             if ports:
                 self.targets.append(target)
 
+    def scan_plan(self):
+        """Return (namespace, addresses, ports) for every nmap run, with
+        the ports of all targets in every run."""
+        ports = sorted({port for target in self.targets for port in target.ports})
+        by_namespace = defaultdict(list)
+        for target in self.targets:
+            by_namespace[target.namespace].append(target)
+        plan = []
+        for namespace, targets in sorted(by_namespace.items()):
+            for i in range(0, len(targets), self.hosts_per_scan):
+                chunk = targets[i:][: self.hosts_per_scan]
+                addresses = sorted({target.ip_address for target in chunk})
+                plan.append((namespace, addresses, ports))
+        return plan
+
+    def schedule(self, plan, submit):
+        """Submit the scans in plan and yield (scan, future) as each one
+        finishes.
+
+        A scan is only submitted when fewer than max_parallel_scans scans are
+        running, and fewer than max_scans_per_namespace for its namespace,
+        taking namespaces in turn. Pool threads never wait for a namespace
+        to free up.
+        """
+        pending = defaultdict(deque)
+        for scan in plan:
+            pending[scan[0]].append(scan)
+        turns = deque(pending)
+        running = {}
+        per_namespace = defaultdict(int)
+        while pending or running:
+            idle_turns = 0
+            while turns and idle_turns < len(turns):
+                if len(running) >= self.max_parallel_scans:
+                    break
+                namespace = turns[0]
+                turns.rotate(-1)
+                if per_namespace[namespace] >= self.max_scans_per_namespace:
+                    idle_turns += 1
+                    continue
+                idle_turns = 0
+                scan = pending[namespace].popleft()
+                if not pending[namespace]:
+                    del pending[namespace]
+                    turns.remove(namespace)
+                running[submit(*scan)] = scan
+                per_namespace[namespace] += 1
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                scan = running.pop(future)
+                per_namespace[scan[0]] -= 1
+                yield scan, future
+
+    def _wait_until_ready(self, pod_name, timeout=120):
+        """Watch the pod until its container is ready."""
+        pod_watch = watch.Watch()
+        for event in pod_watch.stream(
+            self.v1.list_namespaced_pod,
+            self.namespace,
+            field_selector=f"metadata.name={pod_name}",
+            timeout_seconds=timeout,
+        ):
+            statuses = event["object"].status.container_statuses or []
+            if statuses and statuses[0].ready:
+                pod_watch.stop()
+                logging.info("network-scanner is ready")
+                return
+        raise Exception("Timed out waiting for pod to start")
+
     @contextmanager
     def _scanning_pod(self):
-        namespace = "astronomer-scan-test"
+        namespace = self.namespace
         pod_name = f"network-scanner-{randint(0,100000)}"
         v1container = client.V1Container(name="scanner")
-        v1container.command = ["sleep", "300"]
+        v1container.command = ["sleep", "3600"]
         v1container.image = "alpine"
         v1podspec = client.V1PodSpec(containers=[v1container])
         v1objectmeta = client.V1ObjectMeta(name=pod_name)
         v1pod = client.V1Pod(spec=v1podspec, metadata=v1objectmeta)
         logging.info(f"Creating {pod_name} pod in namespace {namespace}")
         # --as=system:serviceaccount:astronomer:default
-        pod = self.v1.create_namespaced_pod(namespace, v1pod)
-        # allow pod to become 'Pending'
-        sleep(2)
+        self.v1.create_namespaced_pod(namespace, v1pod)
         try:
-            timeout = 120
-            start = time()
-            while True:
-                if time() - start > timeout:
-                    raise Exception("Timed out waiting for pod to start")
-                sleep(1)
-                check_pod = self.v1.read_namespaced_pod(pod.metadata.name, namespace)
-                if check_pod.status.container_statuses[0].ready:
-                    logging.info("network-scanner is ready")
-                    break
-            test_fixture = testinfra.get_host(
-                f"kubectl://{pod.metadata.name}?"
-                + f"container={v1container.name}&namespace={namespace}"
-            )
+            self._wait_until_ready(pod_name)
+            scanner = Container(pod_name, v1container.name, namespace)
             logging.info("Installing nmap into network-scanner")
-            test_fixture.check_output("apk add nmap")
-            test_fixture.exists("nmap")
-            yield test_fixture
+            install = run_checks(scanner, {"install": "apk add nmap"}, timeout=300)
+            if not install["install"].succeeded:
+                raise Exception(f"Could not install nmap: {install['install'].output}")
+            yield scanner
         finally:
             logging.info(f"Cleaning up network-scanner pod from namespace {namespace}")
-            self.v1.delete_namespaced_pod(v1pod.metadata.name, namespace)
+            self.v1.delete_namespaced_pod(pod_name, namespace)
 
-    def scan_all_targets(self):
-        # Configure API key authorization: BearerToken
-        all_ports = set()
+    def _scan(self, scanner, namespace, addresses, ports):
+        """Run one nmap in the scanner pod and return its XML output and how
+        long it took."""
+        command = (
+            "nmap --max-retries 2 -T5 --max-rtt-timeout 100ms -Pn -oX - "
+            + f"-p{','.join(str(port) for port in ports)} {' '.join(addresses)}"
+            + " 2>/dev/null"
+        )
+        logging.info(f"running command: {command}")
+        start = time()
+        scan = run_checks(scanner, {"nmap": command}, timeout=600)["nmap"]
+        duration = time() - start
+        if not scan.succeeded:
+            raise Exception(f"nmap exited {scan.exit_status} in {namespace}")
+        return scan.output, duration
+
+    def scan_all_targets(self, report_path=None):
+        """Scan every target, adding findings to the result as each scan
+        finishes and writing the result so far to report_path."""
+        names = {}
         for target in self.targets:
-            for port in target.ports:
-                all_ports.add(port)
-        all_ports = list(all_ports)
-        all_ips = {target.ip_address for target in self.targets}
-        # Nmap does not have an option to specify ports-per-target,
-        # so we scan all ports for any target on all hosts.
-        with self._scanning_pod() as scanner:
-            scanner.check_output("whoami")
-            ports_string = ",".join([str(port) for port in all_ports])
-            addresses_string = " ".join(all_ips)
-            logging.info("Executing scan...")
-            command = (
-                "nmap --max-retries 2 -T5 --max-rtt-timeout 100ms "
-                + "-Pn -oX /scan-results.xml "
-                + f"-p{ports_string} {addresses_string}"
-            )
-            logging.info(f"running command: {command}")
-            start = time()
-            scanner.check_output(command)
-            duration = time() - start
-            logging.info(f"Command took {duration} seconds")
-            result = scanner.check_output("cat /scan-results.xml")
-        root = xml_parser.fromstring(result)
-        open_ports = {}
-        for child in root:
-            if child.tag == "host":
-                ip_address = None
-                for grandchild in child:
-                    if grandchild.tag == "address":
-                        ip_address = grandchild.attrib["addr"]
-                    if grandchild.tag == "ports":
-                        # sample XML at the "ports" level:
-                        # <ports>
-                        #   <port protocol="tcp" portid="53">
-                        #     <state state="closed" reason="reset" reason_ttl="253"/>
-                        #     <service name="domain" method="table" conf="3"/>
-                        #   </port>
-                        #   <port protocol="tcp" portid="61678">
-                        #     <state state="closed" reason="reset" reason_ttl="253"/>
-                        #   </port>
-                        # </ports>
-                        for port in grandchild:
-                            is_open = False
-                            for state in port:
-                                if state.tag != "state":
-                                    continue
-                                is_open = state.attrib["state"] == "open"
-                            if is_open:
-                                if ip_address not in open_ports:
-                                    open_ports[ip_address] = []
-                                open_ports[ip_address].append(
-                                    int(port.attrib["portid"])
-                                )
+            names.setdefault(target.ip_address, f"{target._type}/{target.name}")
+        plan = self.scan_plan()
         result = ScanResult()
-        # def __init__(self, name, ip_address, ports=[]):
-        for address, value in open_ports.items():
-            if not open_ports[address]:
-                continue
-            scan_finding = ScanFinding()
-            scan_finding.ip_address = address
-            for target in self.targets:
-                if target.ip_address == address:
-                    scan_finding.name = f"{target._type}/{target.name}"
-                    print(f"{target._type} {target.name} ({address}):")
-                    break
-            for port in value:
-                scan_finding.add_port(port)
-                print(f"  {port}")
-            result.add_finding(scan_finding)
+        with self._scanning_pod() as scanner, ThreadPoolExecutor(
+            self.max_parallel_scans
+        ) as executor:
+            logging.info(f"Executing {len(plan)} scans...")
+
+            def submit(namespace, addresses, ports):
+                return executor.submit(self._scan, scanner, namespace, addresses, ports)
+
+            for (namespace, addresses, ports), future in self.schedule(plan, submit):
+                try:
+                    scan_xml, duration = future.result()
+                except Exception as error:
+                    result.add_scan(namespace, addresses, ports, 0, str(error))
+                    if report_path:
+                        result.write_report(report_path)
+                    raise
+                logging.info(f"Scan of {namespace} took {duration} seconds")
+                result.add_scan(namespace, addresses, ports, duration)
+                open_ports = open_ports_by_address(scan_xml)
+                for address, address_ports in open_ports.items():
+                    finding = ScanFinding(names.get(address, ""), address)
+                    print(f"{finding.name} ({address}):")
+                    for port in address_ports:
+                        finding.add_port(port)
+                        print(f"  {port}")
+                    result.add_finding(finding)
+                if report_path:
+                    result.write_report(report_path)
         return result
 
 
@@ -222,7 +339,9 @@ def test_network(kube_client):
     network_assessment = KubernetesNetworkChecker()
     network_assessment.collect_scan_targets()
     logging.info(f"Collected {len(network_assessment.targets)} scan targets")
-    scan_result = network_assessment.scan_all_targets()
+    scan_result = network_assessment.scan_all_targets(
+        report_path=getenv("NETWORK_SCAN_REPORT", "test-results/network-scan.json")
+    )
     allow_list = [
         "pod/coredns-",
         "service/kube-dns",
@@ -0,0 +1,71 @@
+"""Find the docker images in rendered chart objects.
+
+Images are taken from parsed objects rather than from `image:` lines in the
+helm output: the containers and initContainers of every pod spec, including
+CronJob job templates, and the images set in the YAML config of
+ConfigMaps, like the logging sidecar that houston adds to airflow
+deployments. It lives outside tests/chart_tests, whose package init needs
+the chart test requirements, and only needs pyyaml and gitpython, so
+.circleci/generate_circleci_config.py can use it from its pre-commit hook.
+"""
+
+from typing import Iterator
+
+import yaml
+
+from tests import get_pod_spec
+
+yaml_loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def image_values(value) -> Iterator[str]:
+    """Yield every string under an 'image' key in nested dicts and lists."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "image" and isinstance(item, str):
+                yield item
+            else:
+                yield from image_values(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from image_values(item)
+
+
+def container_images(docs: list[dict]) -> set[str]:
+    """Return the images of the containers and initContainers of every pod
+    spec."""
+    images = set()
+    for doc in docs:
+        pod_spec = get_pod_spec(doc) or {}
+        for container in (pod_spec.get("initContainers") or []) + (
+            pod_spec.get("containers") or []
+        ):
+            if container.get("image"):
+                images.add(container["image"])
+    return images
+
+
+def configured_images(docs: list[dict]) -> set[str]:
+    """Return the images set in the YAML config of ConfigMaps."""
+    images = set()
+    for doc in docs:
+        if doc.get("kind") != "ConfigMap":
+            continue
+        for data in (doc.get("data") or {}).values():
+            if "image:" not in data:
+                continue
+            try:
+                images |= set(image_values(yaml.load(data, Loader=yaml_loader)))
+            except yaml.YAMLError:
+                continue
+    return images
+
+
+def manifest_images(docs: list[dict]) -> list[str]:
+    """Return every image in docs, sorted and deduplicated."""
+    return sorted(container_images(docs) | configured_images(docs))
+
+
+def load_docs(output: str) -> list[dict]:
+    """Parse helm template output into a list of objects."""
+    return [doc for doc in yaml.load_all(output, Loader=yaml_loader) if doc]